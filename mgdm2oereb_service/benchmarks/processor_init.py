@@ -0,0 +1,55 @@
+"""
+Measures what instantiating a processor costs. pygeoapi creates one for every request touching a process (e.g.
+the process description or the job listing), not only for executions.
+
+    PYTHONPATH=src python benchmarks/processor_init.py [--rounds 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault('PYGEOAPI_CONFIG', os.path.join(CONFIG_PATH, 'pygeoapi_config.yml'))
+        os.environ.setdefault('PYGEOAPI_OPENAPI', os.path.join(CONFIG_PATH, 'pygeoapi_openapi.yml'))
+        os.environ.setdefault('MGDM2OEREB_TRAFO_CONFIG', os.path.join(CONFIG_PATH, 'mgdm2oereb.yml'))
+        os.environ['MGDM2OEREB_JOB'] = os.path.join(tmp, 'job')
+        os.environ['MGDM2OEREB_DATA'] = os.path.join(tmp, 'data')
+
+        started = time.perf_counter()
+        from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.processors import \
+            Mgdm2OerebTransformator, Mgdm2OerebTransformatorOereblex
+        print('import: {:.1f} ms'.format((time.perf_counter() - started) * 1000))
+
+        for processor_class in [Mgdm2OerebTransformator, Mgdm2OerebTransformatorOereblex]:
+            processor_def = {'name': '{}.{}'.format(processor_class.__module__, processor_class.__name__)}
+            started = time.perf_counter()
+            processor_class(processor_def)
+            first = time.perf_counter() - started
+            started = time.perf_counter()
+            for _ in range(args.rounds):
+                processor_class(processor_def)
+            per_instance = (time.perf_counter() - started) / args.rounds
+            print('{}: first {:.2f} ms, then {:.3f} ms per instance'.format(
+                processor_class.__name__,
+                first * 1000,
+                per_instance * 1000
+            ))
+
+        job_dir = os.environ['MGDM2OEREB_JOB']
+        working_dirs = [name for name in os.listdir(job_dir) if name.startswith('working_')] \
+            if os.path.isdir(job_dir) else []
+        print('working dirs created: {}'.format(len(working_dirs)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
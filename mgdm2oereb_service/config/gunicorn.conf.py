@@ -1,2 +1,35 @@
+import os
+
 bind = "0.0.0.0:5000"
-timeout = 1200
\ No newline at end of file
+timeout = 1200
+
+
+def post_worker_init(worker):
+    # compile the mgdm2oereb stylesheets and derive their revision once per worker instead of once per job
+    if os.environ.get('MGDM2OEREB_XSLT_PREWARM', 'false').lower() in ['true', '1']:
+        from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.run_cache import get_directory_revision
+        from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.xslt_cache import XSLT_CACHE
+        xsl_path = os.path.join(os.environ.get('MGDM2OEREB_PATH', '/mgdm2oereb'), 'xsl')
+        XSLT_CACHE.prewarm(xsl_path)
+        get_directory_revision(xsl_path)
+    # every worker checks, the lock file of the sweeper lets one of them sweep per interval (a thread of the
+    # master would not survive the forks of the workers)
+    retention_interval = float(os.environ.get('MGDM2OEREB_RETENTION_INTERVAL', '0'))
+    if retention_interval > 0:
+        from mgdm2oereb_service.flask_app import api_
+        from mgdm2oereb_service.retention import start_background_sweeper
+        start_background_sweeper(retention_interval, api_.manager)
+
+
+def on_starting(server):
+    # the workers write their metrics to this folder, /metrics aggregates them (see mgdm2oereb_service.metrics)
+    metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/mgdm2oereb_metrics')
+    os.makedirs(metrics_dir, exist_ok=True)
+    for file_name in os.listdir(metrics_dir):
+        if file_name.endswith('.db'):
+            os.remove(os.path.join(metrics_dir, file_name))
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
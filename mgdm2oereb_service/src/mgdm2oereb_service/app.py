@@ -1,22 +1,37 @@
+import hashlib
 import json
+import math
 
 import os
-import glob
+import time
+
+import click
 from mgdm2oereb_service.flask_app import BLUEPRINT
 from mgdm2oereb_service.flask_app import STATIC_FOLDER
+from mgdm2oereb_service.job_queue import get_job_queue
+from mgdm2oereb_service.metrics import generate_metrics
+from mgdm2oereb_service.result_index import get_result_index
 from lxml import etree
-from lxml.etree import XMLSyntaxError
-from flask import Flask, send_file, render_template, request, Response
-from urllib.parse import urlparse
+from prometheus_client import CONTENT_TYPE_LATEST
+from flask import Flask, abort, jsonify, send_from_directory, render_template, request, Response
+from urllib.parse import quote, urlparse
 
 parser = etree.XMLParser(remove_blank_text=True)
 
 
 RESULTS_PATH = "mgdm2oereb_results"
+DATA_PATH = os.environ.get('MGDM2OEREB_DATA', '/data')
+FEED_WINDOW = int(os.environ.get('MGDM2OEREB_FEED_WINDOW', '200'))
+# how result files are delivered: by the worker (empty), via nginx (x-accel-redirect) or via X-Sendfile
+RESULTS_OFFLOAD = os.environ.get('MGDM2OEREB_RESULTS_OFFLOAD', '').lower()
+# the nginx internal location which maps to the results folder
+RESULTS_ACCEL_PREFIX = os.environ.get('MGDM2OEREB_RESULTS_ACCEL_PREFIX', '/internal_results')
+RESULTS_MAX_AGE = int(os.environ.get('MGDM2OEREB_RESULTS_MAX_AGE', '31536000'))
 
 app = Flask(__name__, static_folder=STATIC_FOLDER, static_url_path='/static')
 
 app.register_blueprint(BLUEPRINT, url_prefix='/oapi')
+app.config['USE_X_SENDFILE'] = RESULTS_OFFLOAD == 'x-sendfile'
 
 
 
@@ -25,8 +40,22 @@ def upgrade_url_to_https(url):
     no = o._replace(scheme='https')
     return no.geturl()
 
+
+def job_response(response):
+    """
+    Adds cache headers to a response describing a job. Clients have to revalidate it on every use (answered
+    with 304 while it is unchanged): a running job still publishes files and the retention sweep removes
+    finished jobs eventually.
+    """
+    response.set_etag(hashlib.sha256(response.get_data()).hexdigest())
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
 @app.route(f'/{RESULTS_PATH}/<path:file_name>')
 def mgdm2oereb_results_xtf(file_name):
+    if file_name.startswith('.') or '/' in file_name:
+        # the results folder also holds the result index, only job files are served
+        abort(404)
     if file_name.endswith('.log'):
         mimetype = "text/plain"
     elif file_name.endswith('.xtf'):
@@ -35,17 +64,33 @@ def mgdm2oereb_results_xtf(file_name):
         mimetype = "text/xml"
     else:
         mimetype = None
-    return send_file(
-        f'/data/{file_name}',
-        mimetype=mimetype,
-        download_name=file_name
-    )
+    if RESULTS_OFFLOAD == 'x-accel-redirect':
+        # nginx delivers the file (incl. conditional and range requests), the worker is free immediately
+        if not os.path.isfile(os.path.join(DATA_PATH, file_name)):
+            abort(404)
+        response = Response(content_type=mimetype or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = f"{RESULTS_ACCEL_PREFIX.rstrip('/')}/{quote(file_name)}"
+        response.headers.set('Content-Disposition', 'inline', filename=file_name)
+        response.cache_control.public = True
+        response.cache_control.max_age = RESULTS_MAX_AGE
+    else:
+        # conditional (ETag, Last-Modified) and range requests are answered by send_file, with
+        # USE_X_SENDFILE only the headers are sent and the fronting server delivers the file
+        response = send_from_directory(
+            DATA_PATH,
+            file_name,
+            mimetype=mimetype,
+            download_name=file_name,
+            max_age=RESULTS_MAX_AGE
+        )
+    # published files are never changed, a new result always gets a new name
+    response.cache_control.immutable = True
+    return response
 
 
 @app.route(f'/{RESULTS_PATH}/<path:uid>/index.html')
 def mgdm2oereb_results_index(uid):
-    file_paths = glob.glob(f"/data/*{uid}*")
-    file_paths.sort()
+    file_names = get_result_index().get_files(uid)
     if request.headers.get('X-Forwarded-Proto') == 'https':
         url = upgrade_url_to_https(request.host_url)
         base_url = upgrade_url_to_https(request.base_url)
@@ -53,15 +98,14 @@ def mgdm2oereb_results_index(uid):
         url = request.host_url
         base_url = request.base_url
     content = []
-    for file_path in file_paths:
-        content.append(f"{url}{RESULTS_PATH}/{os.path.basename(file_path)}")
-    return render_template("index.html", content=content)
+    for file_name in file_names:
+        content.append(f"{url}{RESULTS_PATH}/{file_name}")
+    return job_response(Response(render_template("index.html", content=content)))
 
 
 @app.route(f'/{RESULTS_PATH}/<path:uid>/index.json')
 def mgdm2oereb_results_index_json(uid):
-    file_paths = glob.glob(f"/data/*{uid}*")
-    file_paths.sort()
+    file_names = get_result_index().get_files(uid)
     if request.headers.get('X-Forwarded-Proto') == 'https':
         url = upgrade_url_to_https(request.host_url)
         base_url = upgrade_url_to_https(request.base_url)
@@ -69,24 +113,60 @@ def mgdm2oereb_results_index_json(uid):
         url = request.host_url
         base_url = request.base_url
     content = []
-    for file_path in file_paths:
-        content.append(f"{url}{RESULTS_PATH}/{os.path.basename(file_path)}")
-    return Response(response=json.dumps(content, indent=4), content_type='application/json')
+    for file_name in file_names:
+        content.append(f"{url}{RESULTS_PATH}/{file_name}")
+    return job_response(Response(response=json.dumps(content, indent=4), content_type='application/json'))
 
 
 @app.route(f'/{RESULTS_PATH}/<path:uid>/job.json')
 def mgdm2oereb_job_json(uid):
-    file_paths = glob.glob(f"/data/*{uid}*.json")
-    file_paths.sort()
-    with open(file_paths[0]) as fh:
-        return Response(response=fh.read(), content_type='application/json')
+    file_names = [file_name for file_name in get_result_index().get_files(uid) if file_name.endswith('.json')]
+    if len(file_names) == 0:
+        abort(404)
+    with open(os.path.join(DATA_PATH, file_names[0])) as fh:
+        return job_response(Response(response=fh.read(), content_type='application/json'))
+
+
+@app.route('/ready')
+def ready():
+    """
+    Readiness of the service: the state of the job queue. Answers 503 while the queue is full, so a load
+    balancer can send new jobs elsewhere.
+    """
+    job_queue = get_job_queue()
+    if job_queue is None:
+        return jsonify({'ready': True, 'queue': None})
+    stats = job_queue.stats()
+    is_ready = stats['queued'] < stats['max_depth']
+    response = jsonify({'ready': is_ready, 'queue': stats})
+    response.headers['Cache-Control'] = 'no-store'
+    if not is_ready:
+        response.status_code = 503
+        response.headers['Retry-After'] = str(job_queue.retry_after)
+    return response
+
+
+@app.route('/metrics')
+def metrics():
+    response = Response(generate_metrics(), content_type=CONTENT_TYPE_LATEST)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 
 @app.route("/published_feed")
 def pubished_feed():
-    content = []
-    file_paths = glob.glob("/data/*.rss.xml")
-    file_paths.sort()
+    """
+    Delivers the newest `MGDM2OEREB_FEED_WINDOW` items of the feed. Older items are reachable as paged feed
+    (RFC 5005) with `?page=2` and following. Unchanged polls are answered with 304.
+    """
+    page = request.args.get('page', 1, type=int)
+    if page < 1:
+        abort(404)
+    result_index = get_result_index()
+    count, sequence, last_added = result_index.get_feed_state()
+    last_page = max(1, math.ceil(count / FEED_WINDOW))
+    if page > last_page:
+        abort(404)
     if request.headers.get('X-Forwarded-Proto') == 'https':
         url = upgrade_url_to_https(request.host_url)
         base_url = upgrade_url_to_https(request.base_url)
@@ -94,24 +174,73 @@ def pubished_feed():
         url = request.host_url
         base_url = request.base_url
 
-    for file_path in file_paths:
-        with open(file_path, mode="r") as file_handler:
-            try:
-                root = etree.fromstring(file_handler.read())
-                for link in root.xpath('//link'):
-                    link.text = f'{url}{link.text}'
-                for guid in root.xpath('//guid'):
-                    guid.text = f'{url}{guid.text}'
-                content.append(etree.tostring(root, pretty_print=True).decode())
-            except XMLSyntaxError as e:
-                app.logger.info(f'Was not a valid XML file {file_path}. Skipping it...')
-                app.logger.info(file_handler.read())
-                continue
-    return Response(
-        render_template(
-            "feed.xml",
-            content=content,
-            url=base_url
-        ),
-        content_type='application/rss+xml'
-    )
+    response = Response(content_type='application/rss+xml')
+    response.set_etag(hashlib.sha256(
+        f'{count}:{sequence}:{FEED_WINDOW}:{page}:{base_url}'.encode('utf-8')
+    ).hexdigest())
+    if last_added is not None:
+        response.last_modified = last_added
+    response.headers['Cache-Control'] = 'no-cache'
+    response.make_conditional(request)
+    if response.status_code == 304:
+        return response
+
+    content = []
+    for item in result_index.get_feed_items(FEED_WINDOW, (page - 1) * FEED_WINDOW):
+        root = etree.fromstring(item)
+        for link in root.xpath('//link'):
+            link.text = f'{url}{link.text}'
+        for guid in root.xpath('//guid'):
+            guid.text = f'{url}{guid.text}'
+        content.append(etree.tostring(root, pretty_print=True).decode())
+    page_links = {'first': base_url}
+    if page > 1:
+        page_links['previous'] = base_url if page == 2 else f'{base_url}?page={page - 1}'
+    if page < last_page:
+        page_links['next'] = f'{base_url}?page={page + 1}'
+    page_links['last'] = base_url if last_page == 1 else f'{base_url}?page={last_page}'
+    response.set_data(render_template(
+        "feed.xml",
+        content=content,
+        url=base_url if page == 1 else f'{base_url}?page={page}',
+        page_links=page_links
+    ))
+    return response
+
+
+@app.cli.command('index-results')
+@click.option('--data-path', default=DATA_PATH, help='The results folder which is indexed.')
+def index_results(data_path):
+    """
+    Adds the job files of the results folder to the result index (needed once for results published before
+    the index existed).
+    """
+    count = get_result_index().index_directory(data_path)
+    click.echo(f'Indexed {count} files.')
+
+
+@app.cli.command('sweep')
+@click.option('--interval', default=0.0, help='Sweep every INTERVAL seconds instead of once.')
+@click.option('--dry-run', is_flag=True, help='Only report what would be removed.')
+def sweep(interval, dry_run):
+    """
+    Removes old working dirs, results and job outputs as configured by the `MGDM2OEREB_RETENTION_*`
+    variables. Run `index-results` first, so results published before the index existed are known and the
+    newest result of every basket is kept.
+    """
+    from mgdm2oereb_service.flask_app import api_
+    from mgdm2oereb_service.retention import get_retention_sweeper
+    sweeper = get_retention_sweeper(api_.manager)
+    while True:
+        stats = sweeper.sweep_if_due(interval, dry_run=dry_run)
+        if stats is not None:
+            for kind, kind_stats in stats.items():
+                click.echo(
+                    f'{kind}: {"would remove" if dry_run else "removed"} {kind_stats["removed"]} '
+                    f'({kind_stats["freed_bytes"]} bytes), kept {kind_stats["kept"]}'
+                )
+        elif not interval:
+            click.echo('Another sweep is running.')
+        if not interval:
+            break
+        time.sleep(interval)
@@ -35,21 +35,112 @@ import logging
 from datetime import datetime, timezone
 from http import HTTPStatus
 from typing import Union, Any, Tuple
+from urllib.parse import urlencode
 
 import click
 
 from flask import Flask, Blueprint, make_response, request, send_from_directory
 
 from pygeoapi.api import API, APIRequest, gzip, pre_process, SYSTEM_LOCALE, FORMAT_TYPES, F_JSON, F_HTML
+from mgdm2oereb_service.job_queue import QueueFull, QueueTimeout
 from pygeoapi.util import get_mimetype, yaml_load, get_api_rules, JobStatus, render_j2_template, \
     DATETIME_FORMAT, to_json, json_serial
 
 logger = logging.getLogger(__name__)
 
+JOBS_LIMIT = int(os.environ.get('MGDM2OEREB_JOBS_LIMIT', '100'))
+JOBS_MAX_LIMIT = int(os.environ.get('MGDM2OEREB_JOBS_MAX_LIMIT', '1000'))
+JOB_FILTERS = {
+    'processID': 'process_id',
+    'theme_code': 'theme_code',
+    'basket_id': 'target_basket_id'
+}
+RESULT_LINK_TITLES = [
+    ('used_catalog', 'text/xml', '[XTF] Catalogue used for this job'),
+    ('transformation_result', 'text/xml', '[XTF] Trafo result of this job'),
+    ('output_validation_log', 'text/plain', '[LOG] ILI-Validator Log for trafo result'),
+    ('input_xtf', 'text/xml', '[XTF] Input file which was used for transformation')
+]
+
+
+def parse_job_datetime(value: str) -> Union[str, None]:
+    """
+    Parses one end of the `datetime` filter of the job list
+
+    :param value: RFC 3339 timestamp or `..` for an open end
+
+    :returns: timestamp in `DATETIME_FORMAT` (UTC) or `None`
+    """
+
+    if value in ('', '..'):
+        return None
+    timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc).strftime(DATETIME_FORMAT)
+
 
 class CustomApi(API):
 
+    def get_job_filters(self, request: Union[APIRequest, Any]) -> dict:
+        """
+        Reads paging and filters of the job list from the query parameters
+
+        :param request: A request object
+
+        :returns: `dict` of `query_jobs` arguments
 
+        :raises: `ValueError` for invalid parameter values
+        """
+
+        params = request.params
+        filters = {
+            'limit': int(params.get('limit', JOBS_LIMIT)),
+            'offset': int(params.get('offset', 0))
+        }
+        if not 0 < filters['limit'] <= JOBS_MAX_LIMIT:
+            raise ValueError(f'limit must be between 1 and {JOBS_MAX_LIMIT}')
+        if filters['offset'] < 0:
+            raise ValueError('offset must not be negative')
+        if params.get('status'):
+            filters['status'] = JobStatus[params['status']]
+        for param, argument in JOB_FILTERS.items():
+            if params.get(param):
+                filters[argument] = params[param]
+        if params.get('datetime'):
+            start, _, end = params['datetime'].partition('/')
+            filters['start'] = parse_job_datetime(start)
+            filters['end'] = parse_job_datetime(end) if _ else filters['start']
+        return filters
+
+    def get_result_links(self, job_: dict) -> list:
+        """
+        Links the files of a finished mgdm2oereb job. Jobs finished before the links were stored with the
+        job are read from their result file.
+
+        :param job_: `dict` of job metadata
+
+        :returns: `list` of links
+        """
+
+        result_links = job_.get('links')
+        if result_links is None:
+            try:
+                mimetype, result = self.manager.get_job_result(job_['identifier'])
+                result_links = json.loads(result)
+            except (OSError, TypeError, ValueError):
+                logger.warning(f"Could not read the result of job {job_['identifier']}")
+                result_links = {}
+        links = []
+        for key, type_, title in RESULT_LINK_TITLES:
+            if result_links.get(key, False):
+                links.append({
+                    'href': result_links[key],
+                    'rel': 'about',
+                    'type': type_,
+                    'title': title
+                })
+        return links
 
     @gzip
     @pre_process
@@ -68,11 +159,18 @@ class CustomApi(API):
             return self.get_format_exception(request)
         headers = request.get_response_headers(SYSTEM_LOCALE,
                                                **self.api_headers)
+        filters = {}
         if self.manager:
             if job_id is None:
-                jobs = sorted(self.manager.get_jobs(),
-                              key=lambda k: k['job_start_datetime'],
-                              reverse=True)
+                try:
+                    filters = self.get_job_filters(request)
+                except (KeyError, ValueError) as err:
+                    msg = f'Invalid job list parameter: {err}'
+                    return self.get_exception(
+                        HTTPStatus.BAD_REQUEST, headers, request.format,
+                        'InvalidParameterValue', msg)
+                # one job more than requested tells whether there is a next page
+                jobs = self.manager.query_jobs(**dict(filters, limit=filters['limit'] + 1))
             else:
                 jobs = [self.manager.get_job(job_id)]
         else:
@@ -93,6 +191,25 @@ class CustomApi(API):
                 'title': 'Jobs list as JSON'
             }]
         }
+        if filters:
+            params = {key: value for key, value in request.params.items() if key != 'offset'}
+            if filters['offset'] > 0:
+                serialized_jobs['links'].append({
+                    'href': f"{self.base_url}/jobs?" + urlencode(
+                        dict(params, offset=max(filters['offset'] - filters['limit'], 0))),
+                    'rel': 'prev',
+                    'type': FORMAT_TYPES[request.format or F_JSON],
+                    'title': 'Previous jobs'
+                })
+            if len(jobs) > filters['limit']:
+                jobs = jobs[:filters['limit']]
+                serialized_jobs['links'].append({
+                    'href': f"{self.base_url}/jobs?" + urlencode(
+                        dict(params, offset=filters['offset'] + filters['limit'])),
+                    'rel': 'next',
+                    'type': FORMAT_TYPES[request.format or F_JSON],
+                    'title': 'Next jobs'
+                })
         for job_ in jobs:
             job2 = {
                 'processID': job_['process_id'],
@@ -133,37 +250,7 @@ class CustomApi(API):
                     })
                 if JobStatus[job_['status']] in (JobStatus.successful, JobStatus.failed):
                     if job_['process_id'] in ['mgdm2oereb', 'mgdm2oereb-oereblex']:
-                        job2['links'] = []
-                        mimetype, result = self.manager.get_job_result(job_['identifier'])
-                        result_dict = json.loads(result)
-                        if result_dict.get('used_catalog', False):
-                            job2['links'].append({
-                                'href': result_dict['used_catalog'],
-                                'rel': 'about',
-                                'type': 'text/xml',
-                                'title': "[XTF] Catalogue used for this job"  # noqa
-                            })
-                        if result_dict.get('transformation_result', False):
-                            job2['links'].append({
-                                'href': result_dict['transformation_result'],
-                                'rel': 'about',
-                                'type': 'text/xml',
-                                'title': "[XTF] Trafo result of this job"  # noqa
-                            })
-                        if result_dict.get('output_validation_log', False):
-                            job2['links'].append({
-                                'href': result_dict['output_validation_log'],
-                                'rel': 'about',
-                                'type': 'text/plain',
-                                'title': "[LOG] ILI-Validator Log for trafo result"  # noqa
-                            })
-                        if result_dict.get('input_xtf', False):
-                            job2['links'].append({
-                                'href': result_dict['input_xtf'],
-                                'rel': 'about',
-                                'type': 'text/xml',
-                                'title': "[XTF] Input file which was used for transformation"  # noqa
-                            })
+                        job2['links'] = self.get_result_links(job_)
                         job2['links'].append({
                             'href': f'{job_result_url}?f={F_JSON}',
                             'rel': 'about',
@@ -191,6 +278,37 @@ class CustomApi(API):
         return headers, HTTPStatus.OK, to_json(serialized_jobs,
                                                self.pretty_print)
 
+    def execute_process(self, request: Union[APIRequest, Any],
+                        process_id) -> Tuple[dict, int, str]:
+        """
+        Execute process, answering 429 while the job queue is full and 503
+        when a synchronous execution did not get a slot in time
+
+        :param request: A request object
+        :param process_id: id of process
+
+        :returns: tuple of headers, status code, content
+        """
+
+        try:
+            return super().execute_process(request, process_id)
+        except QueueFull as err:
+            api_request = APIRequest.with_data(request, self.locales)
+            headers = api_request.get_response_headers(SYSTEM_LOCALE,
+                                                       **self.api_headers)
+            headers['Retry-After'] = str(err.retry_after)
+            return self.get_exception(
+                HTTPStatus.TOO_MANY_REQUESTS, headers, api_request.format,
+                'ServerBusy', str(err))
+        except QueueTimeout as err:
+            api_request = APIRequest.with_data(request, self.locales)
+            headers = api_request.get_response_headers(SYSTEM_LOCALE,
+                                                       **self.api_headers)
+            headers['Retry-After'] = str(err.retry_after)
+            return self.get_exception(
+                HTTPStatus.SERVICE_UNAVAILABLE, headers, api_request.format,
+                'ServerBusy', str(err))
+
     @gzip
     @pre_process
     def get_job_result(self, request: Union[APIRequest, Any],
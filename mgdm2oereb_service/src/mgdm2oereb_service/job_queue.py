@@ -0,0 +1,284 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+
+logger = logging.getLogger(__name__)
+
+# lanes in the order they are served: single basket jobs of users before bulk resubmissions
+QUEUE_LANES = ['interactive', 'bulk']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS slots (
+    job_id TEXT PRIMARY KEY,
+    lane TEXT NOT NULL,
+    lane_rank INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    enqueued REAL NOT NULL,
+    started REAL
+);
+CREATE INDEX IF NOT EXISTS slots_state ON slots (state, lane_rank, enqueued);
+CREATE TABLE IF NOT EXISTS lane_stats (
+    lane TEXT PRIMARY KEY,
+    started_jobs INTEGER NOT NULL,
+    total_wait REAL NOT NULL,
+    last_wait REAL NOT NULL
+);
+"""
+
+
+class QueueFull(Exception):
+
+    def __init__(self, depth, retry_after):
+        """
+        Raised when a job is submitted while the queue is at its maximum depth.
+
+        Args:
+            depth (int): The number of queued jobs.
+            retry_after (int): The seconds a client should wait before submitting again.
+        """
+        super().__init__(f'The job queue is full ({depth} jobs waiting).')
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class QueueTimeout(Exception):
+
+    def __init__(self, wait, retry_after):
+        """
+        Raised when a job waited longer than allowed for a free slot.
+
+        Args:
+            wait (float): The seconds the job waited.
+            retry_after (int): The seconds a client should wait before submitting again.
+        """
+        super().__init__(f'No job slot became free within {round(wait)} seconds.')
+        self.wait = wait
+        self.retry_after = retry_after
+
+
+class JobQueue(object):
+
+    def __init__(self, path, concurrency, max_depth, retry_after=60, poll_interval=1.0, max_wait=None):
+        """
+        A job queue shared by all gunicorn workers through SQLite. At most `concurrency` jobs run at the same
+        time, the others wait in their lane. A job leaves the queue in lane order, within a lane first come
+        first served. Slots of processes which died (e.g. a worker killed by the gunicorn timeout) are freed
+        on the next admission.
+
+        Args:
+            path (str): The path of the SQLite file (the folder is created if missing).
+            concurrency (int): The number of jobs which run at the same time.
+            max_depth (int): The number of jobs which may wait. More submissions are rejected.
+            retry_after (int): The seconds a rejected client is asked to wait.
+            poll_interval (float): The maximum seconds a waiting job sleeps before checking for a free slot.
+            max_wait (float or None): The seconds a job waits for a slot when its client waits for the result
+                (see `acquire`). None waits without a limit.
+        """
+        self.path = path
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+        self.retry_after = retry_after
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self._schema_created = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connect(self):
+        if not self._schema_created:
+            with self._lock:
+                if not self._schema_created:
+                    os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                    with closing(sqlite3.connect(self.path, timeout=30)) as connection:
+                        connection.execute('PRAGMA journal_mode=WAL')
+                        connection.executescript(SCHEMA)
+                    self._schema_created = True
+        with closing(sqlite3.connect(self.path, timeout=30, isolation_level=None)) as connection:
+            connection.row_factory = sqlite3.Row
+            # the write lock is taken up front, so counting and claiming a slot cannot interleave
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+    @staticmethod
+    def lane_rank(lane):
+        return QUEUE_LANES.index(lane)
+
+    def enqueue(self, job_id, lane):
+        """
+        Puts a job into its lane. Enqueuing a job a second time does nothing.
+
+        Args:
+            job_id (str): The id of the job.
+            lane (str): One of `QUEUE_LANES`.
+        Raises:
+            QueueFull: The queue reached its maximum depth.
+        """
+        with self.connect() as connection:
+            if connection.execute('SELECT 1 FROM slots WHERE job_id = ?', (job_id,)).fetchone():
+                return
+            self._free_dead_slots(connection)
+            depth = connection.execute("SELECT COUNT(*) FROM slots WHERE state = 'queued'").fetchone()[0]
+            if depth >= self.max_depth:
+                raise QueueFull(depth, self.retry_after)
+            connection.execute(
+                "INSERT INTO slots (job_id, lane, lane_rank, state, pid, enqueued) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, lane, self.lane_rank(lane), os.getpid(), time.time())
+            )
+
+    def try_acquire(self, job_id):
+        """
+        Starts the job if a slot is free and it is the next job in the queue.
+
+        Args:
+            job_id (str): The id of an enqueued job.
+        Returns:
+            float or None: The seconds the job waited, None if it has to wait longer.
+        """
+        with self.connect() as connection:
+            self._free_dead_slots(connection)
+            running = connection.execute("SELECT COUNT(*) FROM slots WHERE state = 'running'").fetchone()[0]
+            if running >= self.concurrency:
+                return None
+            head = connection.execute(
+                "SELECT job_id, lane, enqueued FROM slots WHERE state = 'queued' "
+                "ORDER BY lane_rank, enqueued LIMIT 1"
+            ).fetchone()
+            if head is None or head['job_id'] != job_id:
+                return None
+            started = time.time()
+            wait = started - head['enqueued']
+            connection.execute(
+                "UPDATE slots SET state = 'running', started = ?, pid = ? WHERE job_id = ?",
+                (started, os.getpid(), job_id)
+            )
+            connection.execute(
+                'INSERT INTO lane_stats (lane, started_jobs, total_wait, last_wait) VALUES (?, 1, ?, ?) '
+                'ON CONFLICT (lane) DO UPDATE SET started_jobs = started_jobs + 1, '
+                'total_wait = total_wait + excluded.total_wait, last_wait = excluded.last_wait',
+                (head['lane'], wait, wait)
+            )
+        return wait
+
+    def acquire(self, job_id, max_wait=None):
+        """
+        Waits until the job may start.
+
+        Args:
+            job_id (str): The id of an enqueued job.
+            max_wait (float or None): The maximum seconds to wait, None waits without a limit.
+        Returns:
+            float: The seconds the job waited.
+        Raises:
+            QueueTimeout: No slot became free within `max_wait`. The job stays enqueued.
+        """
+        interval = min(0.05, self.poll_interval)
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire(job_id)
+            if wait is not None:
+                return wait
+            waited = time.monotonic() - started
+            if max_wait is not None and waited >= max_wait:
+                raise QueueTimeout(waited, self.retry_after)
+            time.sleep(interval if max_wait is None else min(interval, max_wait - waited))
+            interval = min(interval * 2, self.poll_interval)
+
+    def release(self, job_id):
+        """
+        Frees the slot of a finished job (or removes a job which never started).
+
+        Args:
+            job_id (str): The id of the job.
+        """
+        with self.connect() as connection:
+            connection.execute('DELETE FROM slots WHERE job_id = ?', (job_id,))
+
+    def stats(self):
+        """
+        Returns:
+            dict: The limits, the running jobs and per lane the queued jobs, the age of the oldest queued job
+                and the wait times of the started jobs in seconds.
+        """
+        now = time.time()
+        with self.connect() as connection:
+            self._free_dead_slots(connection)
+            running = connection.execute("SELECT COUNT(*) FROM slots WHERE state = 'running'").fetchone()[0]
+            queued = {
+                row['lane']: row for row in connection.execute(
+                    "SELECT lane, COUNT(*) AS depth, MIN(enqueued) AS oldest FROM slots WHERE state = 'queued' "
+                    "GROUP BY lane"
+                )
+            }
+            lane_stats = {row['lane']: row for row in connection.execute('SELECT * FROM lane_stats')}
+        lanes = {}
+        for lane in QUEUE_LANES:
+            lane_queued = queued.get(lane)
+            lane_stat = lane_stats.get(lane)
+            lanes[lane] = {
+                'queued': lane_queued['depth'] if lane_queued else 0,
+                'oldest_wait': round(now - lane_queued['oldest'], 3) if lane_queued else 0.0,
+                'started_jobs': lane_stat['started_jobs'] if lane_stat else 0,
+                'average_wait': round(lane_stat['total_wait'] / lane_stat['started_jobs'], 3) if lane_stat else 0.0,
+                'last_wait': round(lane_stat['last_wait'], 3) if lane_stat else 0.0
+            }
+        return {
+            'concurrency': self.concurrency,
+            'max_depth': self.max_depth,
+            'running': running,
+            'queued': sum(lane['queued'] for lane in lanes.values()),
+            'lanes': lanes
+        }
+
+    @staticmethod
+    def _free_dead_slots(connection):
+        for row in connection.execute('SELECT DISTINCT pid FROM slots').fetchall():
+            try:
+                os.kill(row['pid'], 0)
+            except ProcessLookupError:
+                logger.warning(f'Freeing the queue slots of the dead process {row["pid"]}')
+                connection.execute('DELETE FROM slots WHERE pid = ?', (row['pid'],))
+            except PermissionError:
+                pass
+
+
+_job_queues = {}
+_job_queues_lock = threading.Lock()
+
+
+def get_job_queue():
+    """
+    Delivers the job queue configured by `MGDM2OEREB_QUEUE` (default: `queue.sqlite` in the job folder),
+    `MGDM2OEREB_QUEUE_CONCURRENCY` (default: 0 = the queue is disabled), `MGDM2OEREB_QUEUE_MAX_DEPTH` (default:
+    50), `MGDM2OEREB_QUEUE_RETRY_AFTER` (default: 60 seconds) and `MGDM2OEREB_QUEUE_MAX_WAIT` (the seconds a
+    synchronous execution waits for a slot, default: 60, 0 waits without a limit).
+
+    Returns:
+        JobQueue or None: The job queue of this process or None if it is disabled.
+    """
+    concurrency = int(os.environ.get('MGDM2OEREB_QUEUE_CONCURRENCY', '0'))
+    if concurrency <= 0:
+        return None
+    path = os.environ.get(
+        'MGDM2OEREB_QUEUE',
+        os.path.join(os.environ.get('MGDM2OEREB_JOB', '/job'), 'queue.sqlite')
+    )
+    key = (path, concurrency)
+    with _job_queues_lock:
+        if key not in _job_queues:
+            _job_queues[key] = JobQueue(
+                path,
+                concurrency,
+                int(os.environ.get('MGDM2OEREB_QUEUE_MAX_DEPTH', '50')),
+                int(os.environ.get('MGDM2OEREB_QUEUE_RETRY_AFTER', '60')),
+                max_wait=float(os.environ.get('MGDM2OEREB_QUEUE_MAX_WAIT', '60')) or None
+            )
+        return _job_queues[key]
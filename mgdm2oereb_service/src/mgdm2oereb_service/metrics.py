@@ -0,0 +1,87 @@
+import os
+from urllib.parse import urlparse
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess
+
+# tasks range from milliseconds (snippets) to the better part of an hour (validating a large XTF)
+TASK_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 2400)
+HTTP_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+TASK_DURATION = Histogram(
+    'mgdm2oereb_task_duration_seconds',
+    'Duration of the tasks of a job.',
+    ['process_id', 'model_name', 'task', 'outcome'],
+    buckets=TASK_BUCKETS
+)
+INPUT_BYTES = Counter(
+    'mgdm2oereb_input_bytes',
+    'Bytes of the uploaded input files.',
+    ['process_id', 'file']
+)
+OUTPUT_BYTES = Counter(
+    'mgdm2oereb_output_bytes',
+    'Bytes of the published result files.',
+    ['file']
+)
+HTTP_REQUEST_DURATION = Histogram(
+    'mgdm2oereb_http_request_duration_seconds',
+    'Latency of the HTTP calls to external services until the response headers arrived.',
+    ['host', 'method', 'status'],
+    buckets=HTTP_BUCKETS
+)
+
+
+def task_outcome(task_name, task_result):
+    """
+    Args:
+        task_name (str): The name of the task.
+        task_result (dict): The result of the task.
+    Returns:
+        str: `failed`, `memoized` (the result was taken from the run cache) or `successful`.
+    """
+    if task_result.get('status', False) == 'failed':
+        return 'failed'
+    if task_result.get(f'{task_name}_memoized', False):
+        return 'memoized'
+    return 'successful'
+
+
+def observe_task(process_id, model_name, task_name, duration, task_result):
+    """
+    Args:
+        process_id (str): The id of the process which ran the task.
+        model_name (str): The model of the job.
+        task_name (str): The name of the task.
+        duration (float): The seconds the task ran.
+        task_result (dict): The result of the task.
+    """
+    TASK_DURATION.labels(process_id, model_name, task_name, task_outcome(task_name, task_result)).observe(duration)
+
+
+def observe_http_response(response, *args, **kwargs):
+    """
+    A `requests` response hook recording the latency of a call.
+
+    Args:
+        response (requests.Response): The response of the call.
+    """
+    HTTP_REQUEST_DURATION.labels(
+        urlparse(response.url).hostname or '',
+        response.request.method,
+        str(response.status_code)
+    ).observe(response.elapsed.total_seconds())
+
+
+def generate_metrics():
+    """
+    Renders the metrics in the Prometheus text format. When gunicorn runs with `PROMETHEUS_MULTIPROC_DIR`
+    (see `config/gunicorn.conf.py`) the metrics of all workers are aggregated.
+
+    Returns:
+        bytes: The rendered metrics.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
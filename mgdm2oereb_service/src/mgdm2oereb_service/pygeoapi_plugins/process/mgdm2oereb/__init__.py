@@ -1,3 +1,4 @@
+import copy
 import json
 import os
 import uuid
@@ -9,15 +10,71 @@ import zipfile
 import requests
 import time
 import datetime
+import string
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Any
 from lxml import etree as ET
 from email import utils
 from pygeoapi.process.base import BaseProcessor, ProcessorExecuteError
 from pygeoapi.util import JobStatus
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.catalogue_cache import CatalogueCache
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.chunked_trafo import transform_chunked
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.disk_cache import get_disk_cache
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.http_session import get_session
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.run_cache import RunCache
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.validation_cache import ValidationCache
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.files import publish_file
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.xslt_cache import XSLT_CACHE, write_result
+from mgdm2oereb_service.metrics import OUTPUT_BYTES
+from mgdm2oereb_service.result_index import get_result_index
+
+BASE64_NON_ALPHABET = bytes(
+    set(range(256)) - set((string.ascii_letters + string.digits + '+/=').encode('ascii'))
+)
+
+
+@dataclass
+class ValidationResult:
+    failed: bool
+    log_content: bytes
+    wait_time: float
+    # only logs actually delivered by the validator may be cached
+    cacheable: bool = False
+    log_path: str = None
+    cache_status: str = None
+
+
+class ValidationTimeout(ProcessorExecuteError):
+
+    def __init__(self, result_xtf_file_name, deadline_s, wait_time):
+        """
+        Raised when the validation service did not deliver its result within the deadline.
+
+        Args:
+            result_xtf_file_name (str): The file name of the validated XTF.
+            deadline_s (float): The deadline in seconds.
+            wait_time (float): The seconds spent waiting for the service.
+        """
+        super().__init__(f'Validation of {result_xtf_file_name} did not finish within {deadline_s}s.')
+        self.wait_time = wait_time
+
+
+@dataclass
+class JobContext:
+    """The state of one execution. A processor holds none, so one instance can run several jobs at once."""
+    job_id: str
+    timestamp: datetime.datetime
+    job_path: str
+    # the `JobFiles` of the job (see `prepare_job_files` of the processors)
+    files: Any = None
 
 
 class JobFile(object):
 
-    def __init__(self, name, job_id, job_folder, web_folder, theme_code, timestamp, target_basket_id):
+    def __init__(self, name, job_id, job_folder, web_folder, theme_code, timestamp, target_basket_id,
+                 publish_mode='link', result_index=None):
         """
 
         Args:
@@ -31,6 +88,10 @@ class JobFile(object):
             timestamp (datetime.datetime): The timestamp when this job was created.
             target_basket_id (str): The id bfs of a municipality which might be used as part of the name
                 (default: None).
+            publish_mode (str): How the runtime file is made available in the web folder by `publish` (link,
+                rename or copy). (default: link)
+            result_index (mgdm2oereb_service.result_index.ResultIndex): The index in which published files are
+                registered (default: None).
         """
         self.name = name
         self.job_id = job_id
@@ -39,6 +100,8 @@ class JobFile(object):
         self.theme_code = theme_code
         self.target_basket_id = target_basket_id
         self.time_string = timestamp.strftime('%Y-%m-%d_%H%M%S%s')
+        self.publish_mode = publish_mode
+        self.result_index = result_index
         self.runtime_content = None
         self.runtime_path = None
         self.result_content = None
@@ -81,6 +144,77 @@ class JobFile(object):
         self.runtime_path = path
         return path
 
+    def save_runtime_file_chunks(self, chunks):
+        """
+        Writes the content piece by piece so it never has to be held in memory as a whole. The content is
+        not kept as `runtime_content`. A partially written file is removed if producing the chunks fails.
+
+        Args:
+            chunks (iterable of bytes): The content which should be saved to the file.
+        Returns:
+            str: The absolute file system path to the persisted file.
+        """
+        path = os.path.join(
+            self.job_folder,
+            self.file_name()
+        )
+        try:
+            with open(path, mode="wb+") as file_handler:
+                for chunk in chunks:
+                    file_handler.write(chunk)
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        self.runtime_content = None
+        self.runtime_path = path
+        return path
+
+    def save_runtime_file_with(self, writer):
+        """
+        Lets `writer` produce the runtime file directly at its path, e.g. to stream a result to disk. A
+        partially written file is removed if the writer fails.
+
+        Args:
+            writer (callable): Called with the path the file has to be written to.
+        Returns:
+            str: The absolute file system path to the persisted file.
+        """
+        path = os.path.join(
+            self.job_folder,
+            self.file_name()
+        )
+        try:
+            writer(path)
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        self.runtime_content = None
+        self.runtime_path = path
+        return path
+
+    def save_runtime_file_from(self, source_path):
+        """
+        Saves an existing file (e.g. from a cache) as runtime file. It is linked if possible, otherwise copied.
+        The content is not kept as `runtime_content`.
+
+        Args:
+            source_path (str): The path of the existing file.
+        Returns:
+            str: The absolute file system path to the persisted file.
+        """
+        path = publish_file(
+            source_path,
+            os.path.join(
+                self.job_folder,
+                self.file_name()
+            )
+        )
+        self.runtime_content = None
+        self.runtime_path = path
+        return path
+
     def save_result_file(self, content):
         """
         Args:
@@ -95,9 +229,72 @@ class JobFile(object):
         self.write_file(path, content)
         self.result_content = content
         self.result_path = path
+        OUTPUT_BYTES.labels(self.name).inc(os.path.getsize(path))
+        return path
+
+    def publish(self):
+        """
+        Publishes the already saved runtime file to the web folder. The content is written only once, the
+        published file is a hardlink, reflink or the moved runtime file (see `publish_file`).
+
+        Returns:
+            str: The absolute file system path to the published file.
+        """
+        path = publish_file(
+            self.runtime_path,
+            os.path.join(
+                self.web_folder,
+                self.file_name()
+            ),
+            self.publish_mode
+        )
+        if self.publish_mode == 'rename':
+            self.runtime_path = path
+        self.result_content = self.runtime_content
+        self.result_path = path
+        OUTPUT_BYTES.labels(self.name).inc(os.path.getsize(path))
+        if self.result_index is not None:
+            try:
+                self.result_index.register_file(self.job_id, self.file_name())
+            except sqlite3.Error as e:
+                # the file is published anyway, `flask index-results` can add it to the index later
+                logging.warning('Could not register {} in the result index: {}'.format(self.file_name(), e))
         return path
 
 
+_trafo_configurations = {}
+_trafo_configurations_lock = threading.Lock()
+
+
+def load_trafo_configuration(path):
+    """
+    Delivers the parsed processor configuration (`MGDM2OEREB_TRAFO_CONFIG`). It is parsed once per process and
+    again only if the file changed.
+
+    Args:
+        path (str): The path of the YAML file.
+    Returns:
+        dict: The configuration of every processor class. A copy, processors may change theirs.
+    Raises:
+        yaml.YAMLError: If the file is not valid YAML.
+    """
+    key = (os.path.abspath(path), os.stat(path).st_mtime_ns)
+    with _trafo_configurations_lock:
+        configuration = _trafo_configurations.get(key)
+    if configuration is None:
+        with open(path, "r") as stream:
+            try:
+                configuration = yaml.safe_load(stream)
+            except yaml.YAMLError as exc:
+                logging.error('Could not parse {}: {}'.format(path, exc))
+                raise
+        with _trafo_configurations_lock:
+            for stale_key in [k for k in _trafo_configurations if k[0] == key[0]]:
+                del _trafo_configurations[stale_key]
+            _trafo_configurations[key] = configuration
+    return copy.deepcopy(configuration)
+
+
 class Mgdm2OerebTransformatorBase(BaseProcessor):
     """MGDM2OEREB Processor for documents from oereblex"""
 
@@ -109,18 +306,15 @@ class Mgdm2OerebTransformatorBase(BaseProcessor):
         """
         from mgdm2oereb_service.app import RESULTS_PATH
         self.absolute_result_dir = RESULTS_PATH
-        with open(os.environ.get('MGDM2OEREB_TRAFO_CONFIG'), "r") as stream:
-            try:
-                self.configuration = yaml.safe_load(stream)[self.__class__.__name__]
-            except yaml.YAMLError as exc:
-                print(exc)
+        self.configuration = load_trafo_configuration(os.environ.get('MGDM2OEREB_TRAFO_CONFIG'))[
+            self.__class__.__name__
+        ]
         super().__init__(processor_def, self.configuration)
         self.ilivalidator_service_url = os.environ.get(
             'ILIVALIDATOR_SERVICE',
             'http://ilivalidator-service:8080/rest/jobs'
         )
         self.logger = logging.getLogger(__name__)
-        self.job_id = self.create_uuid()
         self.data_path = os.environ.get(
             'MGDM2OEREB_DATA',
             '/data'
@@ -129,7 +323,6 @@ class Mgdm2OerebTransformatorBase(BaseProcessor):
             'MGDM2OEREB_JOB',
             '/job'
         )
-        self.job_path = self.create_working_dir(self.job_id, self.logger, self.job_dir)
         self.mgdm2oereb_xsl_path = os.path.join(
             os.environ.get('MGDM2OEREB_PATH', '/mgdm2oereb'),
             'xsl'
@@ -142,23 +335,100 @@ class Mgdm2OerebTransformatorBase(BaseProcessor):
         self.rss_snippet_file_name = "rss.xml"
         self.json_snippet_file_name = "job.json"
         self.catalog_file_name = "supplement_catalog.xtf"
-        self.municipality_id = None
-        self.timestamp = datetime.datetime.now()
+        self.streaming_decode = os.environ.get('MGDM2OEREB_STREAMING_DECODE', 'true').lower() in ['true', '1']
+        self.decode_chunk_size = int(os.environ.get('MGDM2OEREB_DECODE_CHUNK_SIZE', str(1024 * 1024)))
+        self.max_xtf_size = int(os.environ.get('MGDM2OEREB_MAX_XTF_SIZE', str(4 * 1024 ** 3)))
+        self.max_zip_ratio = float(os.environ.get('MGDM2OEREB_MAX_ZIP_RATIO', '200'))
+        self.publish_mode = os.environ.get('MGDM2OEREB_PUBLISH_MODE', 'link')
+        self.validation_min_sleep_time_ms = int(os.environ.get('MGDM2OEREB_VALIDATION_MIN_SLEEP_TIME_MS', '100'))
+        self.validation_max_sleep_time_ms = int(os.environ.get('MGDM2OEREB_VALIDATION_MAX_SLEEP_TIME_MS', '5000'))
+        self.validation_deadline_s = float(os.environ.get('MGDM2OEREB_VALIDATION_DEADLINE', '1100'))
+        self.task_workers = int(os.environ.get('MGDM2OEREB_TASK_WORKERS', '3'))
+        # models whose trafo stylesheets map every object on its own, see `transform_chunked`
+        self.chunk_safe_models = [
+            m.strip() for m in os.environ.get('MGDM2OEREB_CHUNK_SAFE_MODELS', '').split(',') if m.strip()
+        ]
+        self.chunk_min_size = int(os.environ.get('MGDM2OEREB_CHUNK_MIN_SIZE', str(256 * 1024 ** 2)))
+        self.chunk_max_objects = int(os.environ.get('MGDM2OEREB_CHUNK_MAX_OBJECTS', '20000'))
+        self.catalogue_cache = None
+        if os.environ.get('MGDM2OEREB_CATALOGUE_CACHE', 'true').lower() in ['true', '1']:
+            self.catalogue_cache = CatalogueCache(
+                get_disk_cache(
+                    os.environ.get('MGDM2OEREB_CATALOGUE_CACHE_DIR', os.path.join(self.job_dir, 'cache', 'catalogue')),
+                    int(os.environ.get('MGDM2OEREB_CATALOGUE_CACHE_MAX_BYTES', str(256 * 1024 ** 2)))
+                ),
+                ttl=int(os.environ.get('MGDM2OEREB_CATALOGUE_CACHE_TTL', '600')),
+                stale_if_error=int(os.environ.get('MGDM2OEREB_CATALOGUE_CACHE_STALE_IF_ERROR', '86400'))
+            )
+        self.validation_cache = None
+        if os.environ.get('MGDM2OEREB_VALIDATION_CACHE', 'true').lower() in ['true', '1']:
+            self.validation_cache = ValidationCache(
+                get_disk_cache(
+                    os.environ.get('MGDM2OEREB_VALIDATION_CACHE_DIR', os.path.join(self.job_dir, 'cache', 'validation')),
+                    int(os.environ.get('MGDM2OEREB_VALIDATION_CACHE_MAX_BYTES', str(1024 ** 3)))
+                ),
+                ttl=int(os.environ.get('MGDM2OEREB_VALIDATION_CACHE_TTL', '604800'))
+            )
+        self.run_cache = None
+        if os.environ.get('MGDM2OEREB_MEMOIZE', 'false').lower() in ['true', '1']:
+            self.run_cache = RunCache(
+                get_disk_cache(
+                    os.environ.get('MGDM2OEREB_MEMOIZE_DIR', os.path.join(self.job_dir, 'cache', 'runs')),
+                    int(os.environ.get('MGDM2OEREB_MEMOIZE_MAX_BYTES', str(4 * 1024 ** 3)))
+                ),
+                ttl=int(os.environ.get('MGDM2OEREB_MEMOIZE_TTL', '604800'))
+            )
+        # a processor whose runs go stale sooner reuses them for a shorter time (None = the TTL of the run cache)
+        self.memoized_run_ttl = None
+        self.xsl_revision = os.environ.get('MGDM2OEREB_XSL_REVISION')
+        self.result_index = get_result_index()
+
+    def start_job(self):
+        """
+        Creates the state of a new job: its id, its timestamp and its working dir. pygeoapi instantiates a
+        processor for every request touching the process, so this only happens when a job is executed.
+
+        Returns:
+            JobContext: The context of the job.
+        """
+        job_id = self.create_uuid()
+        return JobContext(
+            job_id,
+            datetime.datetime.now(),
+            self.create_working_dir(job_id, self.logger, self.job_dir)
+        )
 
-    def create_job_file(self, name, theme_code, target_basket_id):
+    def create_job_file(self, job, name, theme_code, target_basket_id):
         return JobFile(
             name,
-            self.job_id,
-            self.job_path,
+            job.job_id,
+            job.job_path,
             self.data_path,
             theme_code,
-            self.timestamp,
-            target_basket_id
+            job.timestamp,
+            target_basket_id,
+            self.publish_mode,
+            self.result_index
         )
 
     def execute(self, data):
         raise NotImplementedError('This is a abstract base class and cant be used as is.')
 
+    def metric_model_name(self, model_name):
+        """
+        The model name is supplied by the client, the metrics only distinguish the models which can be
+        transformed so their number of label values stays bounded.
+
+        Args:
+            model_name (str): The model name of a job.
+        Returns:
+            str: The model name if there is a `<model_name>.trafo.xsl`, `other` otherwise.
+        """
+        if model_name and os.path.basename(model_name) == model_name and os.path.isfile(
+                os.path.join(self.mgdm2oereb_xsl_path, '{}.trafo.xsl'.format(model_name))):
+            return model_name
+        return 'other'
+
     @staticmethod
     def create_xsl_trafo_path(self, mgdm2oereb_xsl_path, model_name):
         return os.path.join(
@@ -213,72 +483,170 @@ class Mgdm2OerebTransformatorBase(BaseProcessor):
         return base64.b64decode(bytes(input_file_string, 'utf-8'))
 
     @staticmethod
-    def unzip_input_file(zip_file_path, target_dir):
+    def iter_decode_input_file(input_file_string, chunk_size=1024 * 1024):
+        """
+        Decodes a base64 encoded string piece by piece. Like `decode_input_file` characters outside the
+        base64 alphabet (e.g. line breaks) are skipped. Only one chunk is held in memory at a time.
+
+        Args:
+            input_file_string (str): A base64 encoded string.
+            chunk_size (int): The number of characters which are decoded at once.
+        Returns:
+            generator of bytes: The decoded content in chunks.
+        """
+        rest = b''
+        for start in range(0, len(input_file_string), chunk_size):
+            chunk = rest + input_file_string[start:start + chunk_size].encode('utf-8').translate(
+                None,
+                BASE64_NON_ALPHABET
+            )
+            usable = len(chunk) - len(chunk) % 4
+            rest = chunk[usable:]
+            if usable:
+                yield base64.b64decode(chunk[:usable])
+        if rest:
+            yield base64.b64decode(rest)
+
+    @staticmethod
+    def iter_unzip_input_file(zip_file_path, max_size=None, max_ratio=None, chunk_size=1024 * 1024):
         """
-        Inflates a zip to a target dir.
+        Inflates the single XTF contained in a zip piece by piece. The uncompressed size and the compression
+        ratio are checked against the declared sizes before and against the inflated bytes while reading, so
+        a zip bomb is rejected before it fills memory or disk. The CRC is checked when the end of the member
+        is reached.
 
         Args:
             zip_file_path (str): The path of to the zip file.
-            target_dir (str): The path to the directory where the zip should be extracted.
+            max_size (int): The maximum uncompressed size of the XTF in bytes (default: None = unlimited).
+            max_ratio (float): The maximum ratio of uncompressed to compressed size (default: None =
+                unlimited).
+            chunk_size (int): The number of bytes which are inflated at once.
         Returns:
-            str: The valid path of the extracted XTF which was contained in the zip.
+            generator of bytes: The content of the XTF which was contained in the zip in chunks.
+        Raises:
+            ProcessorExecuteError
         """
 
         if not zipfile.is_zipfile(zip_file_path):
             raise ProcessorExecuteError('The sent file was not a valid zip.')
         with zipfile.ZipFile(zip_file_path, "r") as zip_ref:
-            count_xtf = 0
-            xtf_index = None
-            for i, name in enumerate(zip_ref.namelist()):
-                if name.endswith('.xtf'):
-                    count_xtf += 1
-                    xtf_index = i
-            if count_xtf == 0:
+            xtf_infos = [info for info in zip_ref.infolist() if info.filename.endswith('.xtf')]
+            if len(xtf_infos) == 0:
                 raise ProcessorExecuteError('The sent zip does not contain an XTF.')
-            if count_xtf > 1:
+            if len(xtf_infos) > 1:
                 raise ProcessorExecuteError('The sent zip container more than 1 XTF.')
-            xtf_file_name = zip_ref.namelist()[xtf_index]
-            zip_ref.extract(xtf_file_name, path=target_dir)
-            with open(os.path.join(target_dir, xtf_file_name), mode="rb") as xtf_file:
-                return xtf_file.read()
+            xtf_info = xtf_infos[0]
+            compress_size = max(xtf_info.compress_size, 1)
+            if max_size is not None and xtf_info.file_size > max_size:
+                raise ProcessorExecuteError(
+                    f'The XTF in the sent zip is larger than {max_size} bytes.'
+                )
+            if max_ratio is not None and xtf_info.file_size / compress_size > max_ratio:
+                raise ProcessorExecuteError(
+                    f'The compression ratio of the XTF in the sent zip exceeds {max_ratio}.'
+                )
+            inflated = 0
+            try:
+                with zip_ref.open(xtf_info) as xtf_file:
+                    while True:
+                        chunk = xtf_file.read(chunk_size)
+                        if not chunk:
+                            break
+                        inflated += len(chunk)
+                        if max_size is not None and inflated > max_size:
+                            raise ProcessorExecuteError(
+                                f'The XTF in the sent zip is larger than {max_size} bytes.'
+                            )
+                        if max_ratio is not None and inflated / compress_size > max_ratio:
+                            raise ProcessorExecuteError(
+                                f'The compression ratio of the XTF in the sent zip exceeds {max_ratio}.'
+                            )
+                        yield chunk
+            except zipfile.BadZipFile as e:
+                raise ProcessorExecuteError(f'The XTF in the sent zip is corrupt: {e}')
 
     @staticmethod
-    def validate(xtf_content, ilivalidator_service_url, result_xtf_file_name, sleep_time_ms=1000,
-                 all_objects_accessible=True):
+    def poll_intervals(min_sleep_time_ms=100, max_sleep_time_ms=5000, factor=1.5, size_hint=None,
+                       bytes_per_second_hint=10 * 1024 ** 2):
+        """
+        Delivers the wait times between two status checks of an async validation. It starts short and grows
+        exponentially up to a cap. If the size of the validated file is known, the first wait time is the
+        expected validation time (bounded by min and max).
+
+        Args:
+            min_sleep_time_ms (int): The shortest wait time in milliseconds.
+            max_sleep_time_ms (int): The longest wait time in milliseconds.
+            factor (float): The factor each wait time grows by.
+            size_hint (int): The size of the validated file in bytes (default: None = unknown).
+            bytes_per_second_hint (int): The expected speed of the validation service.
+        Returns:
+            generator of float: The wait times in seconds.
+        """
+        sleep_time_ms = min_sleep_time_ms
+        if size_hint:
+            sleep_time_ms = max(min_sleep_time_ms, min(max_sleep_time_ms, size_hint / bytes_per_second_hint * 1000))
+        while True:
+            yield sleep_time_ms / 1000
+            sleep_time_ms = min(max_sleep_time_ms, sleep_time_ms * factor)
+
+    @staticmethod
+    def validate(xtf_path, ilivalidator_service_url, result_xtf_file_name, min_sleep_time_ms=100,
+                 max_sleep_time_ms=5000, deadline_s=None, all_objects_accessible=True, session=None):
         """
         Uses the external ILI validator service to validate an XTF.
 
         Args:
-            xtf_content (bin): The XTF content which should be validated (not the file!).
+            xtf_path (str): The local file path of the XTF which should be validated.
             ilivalidator_service_url (str): The URI to the validation service.
-            result_xtf_file_name (str): The file name corresponding to xtf_content (for logging reasons).
-            sleep_time_ms (int): Validation runs async. So we need to check when our job was ready. This
-                defines the wait time in milliseconds for next ready check. (default=1000)
+            result_xtf_file_name (str): The file name corresponding to xtf_path (for logging reasons).
+            min_sleep_time_ms (int): Validation runs async. So we need to check when our job was ready. The
+                wait time for the next ready check starts with this many milliseconds and grows exponentially
+                (see `poll_intervals`). (default=100)
+            max_sleep_time_ms (int): The longest wait time in milliseconds between two ready checks.
+                (default=5000)
+            deadline_s (float): The maximum time in seconds to wait for the validation result (default: None =
+                wait forever).
             all_objects_accessible (bool): If the switch should be on or off.
+            session (requests.Session): The session used to talk to the service (default: the pooled session
+                of this process).
         Returns:
-            (bool, bytes): The status (failed True/False) and the validation log content as binary encoded
-                as delivered by service.
+            ValidationResult: The status (failed True/False), the validation log content as binary encoded
+                as delivered by service and the time spent waiting for the service.
         Raises:
             ProcessorExecuteError
+            ValidationTimeout: The result was not delivered within `deadline_s`.
         """
         VERSION='1'
-
-        files = {
-            'file': (result_xtf_file_name, xtf_content)
-        }
-        create_job_response = requests.post(
-            f'{ilivalidator_service_url}/api/v{VERSION}/upload',
-            files=files
-        )
+        session = session or get_session()
+        started = time.monotonic()
+
+        with open(xtf_path, mode="rb") as xtf_file:
+            files = {
+                'file': (result_xtf_file_name, xtf_file)
+            }
+            create_job_response = session.post(
+                f'{ilivalidator_service_url}/api/v{VERSION}/upload',
+                files=files
+            )
 
         if create_job_response.status_code == 201:
             # job was created successfully
             job_status = create_job_response.json()
             status_url = f'{ilivalidator_service_url}{job_status["statusUrl"]}'
             last_log = None
+            sleep_times = Mgdm2OerebTransformatorBase.poll_intervals(
+                min_sleep_time_ms,
+                max_sleep_time_ms,
+                size_hint=os.path.getsize(xtf_path)
+            )
 
             while True:
-                status_response = requests.get(status_url)
+                status_response = session.get(status_url)
+                if status_response.status_code != 200:
+                    raise ProcessorExecuteError(
+                        f'Status of the validation of {result_xtf_file_name} could not be read. '
+                        f'HTTP code was {status_response.status_code}'
+                    )
                 body = status_response.json()
                 if last_log != body["status"]:
                     # logging.info(body)
@@ -286,30 +654,139 @@ class Mgdm2OerebTransformatorBase(BaseProcessor):
                 if body["status"] in ["completedWithErrors", "completed"]:
                     ili_log_path = body['logUrl']
                     logging.info(ili_log_path)
-                    response = requests.get(f'{ilivalidator_service_url}{ili_log_path}')
+                    response = session.get(f'{ilivalidator_service_url}{ili_log_path}')
+                    if response.status_code != 200:
+                        # an error page does not say "...validation failed", it must not pass as a log
+                        raise ProcessorExecuteError(
+                            f'Log of the validation of {result_xtf_file_name} could not be downloaded. '
+                            f'HTTP code was {response.status_code}'
+                        )
                     log_content = response.text
                     # logging.info(log_content)
-                    return "...validation failed" in log_content, bytes(log_content, 'utf-8')
+                    return ValidationResult(
+                        "...validation failed" in log_content,
+                        bytes(log_content, 'utf-8'),
+                        time.monotonic() - started,
+                        cacheable=True
+                    )
                 elif body["status"] in ["processing", "enqueued"]:
-                    time.sleep(sleep_time_ms / 1000)
+                    sleep_time = next(sleep_times)
+                    if deadline_s is not None and time.monotonic() - started + sleep_time > deadline_s:
+                        raise ValidationTimeout(result_xtf_file_name, deadline_s, time.monotonic() - started)
+                    time.sleep(sleep_time)
                 else:
                     logging.error("unknown status")
                     raise AttributeError(
                         "unknown STATUS of ilivalidator service {}".format(body["status"])
                     )
         elif create_job_response.status_code == 400:
-            return True, bytes(
+            return ValidationResult(True, bytes(
                 f'Some error happened: P code was {create_job_response.status_code}', 'utf-8'
-            )
+            ), time.monotonic() - started)
         elif create_job_response.status_code == 413:
-            return True, bytes(
+            return ValidationResult(True, bytes(
                 f'File was too large. See details: P code was {create_job_response.status_code}', 'utf-8'
-            )
+            ), time.monotonic() - started)
         else:
-            return True, bytes(
+            return ValidationResult(True, bytes(
                 f'could not talk to ilivalidator HTTP code was {create_job_response.status_code}', 'utf-8'
+            ), time.monotonic() - started)
+
+    def run_validation(self, xtf_path, all_objects_accessible=True):
+        """
+        Validates an XTF with the configured validation service and polling settings. If the same bytes were
+        validated with the same switches before, the cached log is delivered instead (`log_path` is set then).
+
+        Args:
+            xtf_path (str): The local file path of the XTF which should be validated.
+            all_objects_accessible (bool): If the switch should be on or off.
+        Returns:
+            ValidationResult: The result of `validate`.
+        Raises:
+            ProcessorExecuteError
+        """
+        cache_key = None
+        if self.validation_cache is not None:
+            cache_key = self.validation_cache.create_key(
+                xtf_path,
+                self.ilivalidator_service_url,
+                all_objects_accessible
             )
+            cached = self.validation_cache.get(cache_key)
+            if cached is not None:
+                log_path, failed = cached
+                try:
+                    # kept in case the entry is evicted before the log is linked into the job
+                    with open(log_path, mode="rb") as fh:
+                        log_content = fh.read()
+                    return ValidationResult(failed, log_content, 0.0, log_path=log_path, cache_status='hit')
+                except FileNotFoundError:
+                    # another worker evicted the entry meanwhile, same as a miss
+                    pass
+        validation_result = self.validate(
+            xtf_path,
+            self.ilivalidator_service_url,
+            self.result_xtf_file_name,
+            min_sleep_time_ms=self.validation_min_sleep_time_ms,
+            max_sleep_time_ms=self.validation_max_sleep_time_ms,
+            deadline_s=self.validation_deadline_s,
+            all_objects_accessible=all_objects_accessible
+        )
+        if cache_key is not None:
+            validation_result.cache_status = 'miss'
+            if validation_result.cacheable:
+                validation_result.log_path = self.validation_cache.put(
+                    cache_key,
+                    validation_result.log_content,
+                    validation_result.failed
+                )
+        return validation_result
+
+    @staticmethod
+    def save_validation_log(job_file, validation_result):
+        """
+        Stores the log of a validation as runtime file of `job_file`. A cached log is linked instead of
+        written again, unless it was evicted meanwhile.
+
+        Args:
+            job_file (JobFile): The job file which receives the log.
+            validation_result (ValidationResult): The result of `run_validation`.
+        """
+        if validation_result.log_path is not None:
+            try:
+                job_file.save_runtime_file_from(validation_result.log_path)
+                return
+            except FileNotFoundError:
+                pass
+        job_file.save_runtime_file(validation_result.log_content)
+
+    @staticmethod
+    def validation_summary(task_name, validation_result):
+        """
+        Args:
+            task_name (str): The name of the task which ran the validation.
+            validation_result (ValidationResult): The result of `run_validation`.
+        Returns:
+            dict: The validation details which are added to the job result.
+        """
+        summary = {f"{task_name}_validator_wait": round(validation_result.wait_time, 3)}
+        if validation_result.cache_status is not None:
+            summary[f"{task_name}_validation_cache"] = validation_result.cache_status
+        return summary
 
+    @staticmethod
+    def validation_error_summary(task_name, error):
+        """
+        Args:
+            task_name (str): The name of the task which ran the validation.
+            error (Exception): The error raised by `run_validation`.
+        Returns:
+            dict: The validation details which are added to the job result, the time spent waiting if the
+                validation timed out.
+        """
+        if isinstance(error, ValidationTimeout):
+            return {f"{task_name}_validator_wait": round(error.wait_time, 3)}
+        return {}
 
     @staticmethod
     def download_catalogue(catalogue_url):
@@ -333,45 +810,78 @@ class Mgdm2OerebTransformatorBase(BaseProcessor):
         ))
 
     @staticmethod
-    def transform(xsl_trafo_path, xtf_path, params):
+    def transform_to_file(xsl_trafo_path, xtf_path, params, output_path):
         """
-        Executes a transformation of a given XML with a given XSL. The transformation receives XSL string
-        parameters.
+        Executes a transformation of a given XML with a given XSL and serializes the result straight to
+        `output_path` (honouring the `xsl:output` of the stylesheet). The transformation receives XSL string
+        parameters. The compiled XSL is taken from the process wide XSLT cache. Neither the input nor the
+        result tree outlive the call.
 
         Args:
             xsl_trafo_path (str): The local file path where the XSL is located.
             xtf_path (str): The local file path where the XML is located.
             params (dict): The params which are applied as XSL string parameters to the transformation.
+            output_path (str): The local file path the result is written to.
         Returns:
-            bin: The transformed result XML encoded as binary.
+            str: The path of the written result.
         """
-        xsl = ET.parse(xsl_trafo_path)
-        transform = ET.XSLT(xsl)
         xml = ET.parse(xtf_path)
+        with XSLT_CACHE.checkout(xsl_trafo_path) as transform:
+            result = transform(xml, **{k: ET.XSLT.strparam(v) for k, v in params.items()})
+            del xml
+            # serializing reads the output settings of the stylesheet, so it is done while it is checked out
+            write_result(result, output_path)
+        return output_path
+
+    def use_chunked_trafo(self, model_name, xtf_path):
+        """
+        Args:
+            model_name (str): The model of the XTF.
+            xtf_path (str): The local file path where the XTF is located.
+        Returns:
+            bool: True if the XTF is transformed in chunks: its model is listed in
+                `MGDM2OEREB_CHUNK_SAFE_MODELS` and it is at least `MGDM2OEREB_CHUNK_MIN_SIZE` bytes large.
+        """
+        return model_name in self.chunk_safe_models and os.path.getsize(xtf_path) >= self.chunk_min_size
 
-        result = transform(xml, **{k: ET.XSLT.strparam(v) for k, v in params.items()})
-        return result
+    def transform_trafo_result(self, model_name, xsl_trafo_path, xtf_path, params, output_path):
+        """
+        Writes the transformation of an XTF to `output_path`, in chunks if `use_chunked_trafo` says so.
+
+        Args:
+            model_name (str): The model of the XTF.
+            xsl_trafo_path (str): The local file path where the XSL is located.
+            xtf_path (str): The local file path where the XTF is located.
+            params (dict): The params which are applied as XSL string parameters to the transformation.
+            output_path (str): The local file path the result is written to.
+        Returns:
+            str: The path of the written result.
+        """
+        if self.use_chunked_trafo(model_name, xtf_path):
+            transform_chunked(xsl_trafo_path, xtf_path, params, output_path, self.chunk_max_objects)
+            return output_path
+        return self.transform_to_file(xsl_trafo_path, xtf_path, params, output_path)
 
-    def create_rss_snippet(self, theme_code, model, target_basket_id, output_validation_failed):
+    def create_rss_snippet(self, job, theme_code, model, target_basket_id, output_validation_failed):
         published_string = "failed and was NOT published" if output_validation_failed == JobStatus.failed.value else "was successful and is published now"
         return f"""
         <item>
-          <guid isPermaLink="true">mgdm2oereb_results/{self.job_id}/index.html</guid>
+          <guid isPermaLink="true">mgdm2oereb_results/{job.job_id}/index.html</guid>
           <title>Transformation {output_validation_failed} (theme: {theme_code}, model: {model})</title>
           <description>The MGDM2OERB Trafo from MGDM {model} to OeREBKRM_V2_0 for {theme_code} (Basket ID: {target_basket_id}) {published_string}.</description>
-          <link>mgdm2oereb_results/{self.job_id}/index.html</link>
-          <pubDate>{utils.format_datetime(self.timestamp)}</pubDate>
+          <link>mgdm2oereb_results/{job.job_id}/index.html</link>
+          <pubDate>{utils.format_datetime(job.timestamp)}</pubDate>
         </item>
         """.encode(encoding="utf-8")
 
-    def create_json_snippet(self, theme_code, model, target_basket_id, output_validation_failed):
+    def create_json_snippet(self, job, theme_code, model, target_basket_id, output_validation_failed):
         return bytes(json.dumps(
             {
-                "job_id": self.job_id,
+                "job_id": job.job_id,
                 "theme_code": theme_code,
                 "target_basket_id": target_basket_id,
                 "model": model,
-                "time_stamp": self.timestamp.isoformat(),
+                "time_stamp": job.timestamp.isoformat(),
                 "successful": not output_validation_failed == JobStatus.failed.value
             },
             indent=4
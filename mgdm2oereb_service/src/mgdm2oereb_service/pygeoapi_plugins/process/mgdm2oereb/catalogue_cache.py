@@ -0,0 +1,87 @@
+import logging
+import time
+
+import requests
+from pygeoapi.process.base import ProcessorExecuteError
+
+
+logger = logging.getLogger(__name__)
+
+CATALOGUE_FILE_NAME = 'catalogue.xml'
+
+
+class CatalogueCache(object):
+
+    def __init__(self, cache, ttl=600, stale_if_error=86400):
+        """
+        Caches downloaded supplement catalogues on disk. Within `ttl` a cached catalogue is used as is. After
+        that it is revalidated with ETag/If-Modified-Since. If the catalogue host fails, a cached catalogue
+        which is not older than `stale_if_error` is used instead.
+
+        Args:
+            cache (mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.disk_cache.DiskCache): The cache
+                storage.
+            ttl (int): Seconds a cached catalogue is used without asking the host.
+            stale_if_error (int): Seconds a cached catalogue may be used when the host fails.
+        """
+        self.cache = cache
+        self.ttl = ttl
+        self.stale_if_error = stale_if_error
+
+    def fetch(self, catalogue_url, session=requests):
+        """
+        Delivers the catalogue from the cache or downloads it.
+
+        Args:
+            catalogue_url (str): The URI to the catalogue.
+            session (requests.Session): The session used for downloading.
+        Returns:
+            (str, str): The path of the cached catalogue file and how it was obtained (`hit`, `revalidated`,
+                `stale` or `miss`).
+        Raises:
+            ProcessorExecuteError
+        """
+        entry = self.cache.get(catalogue_url)
+        if entry is not None and entry.age() < self.ttl:
+            return entry.file_path(CATALOGUE_FILE_NAME), 'hit'
+        headers = {}
+        if entry is not None:
+            if entry.meta.get('etag'):
+                headers['If-None-Match'] = entry.meta['etag']
+            if entry.meta.get('last_modified'):
+                headers['If-Modified-Since'] = entry.meta['last_modified']
+        try:
+            response = session.get(catalogue_url, headers=headers)
+        except requests.exceptions.RequestException as e:
+            if self.usable_when_failing(entry):
+                logger.warning('Catalogue host failed ({}), using cached {}'.format(e, catalogue_url))
+                return entry.file_path(CATALOGUE_FILE_NAME), 'stale'
+            raise
+        if response.status_code == 304 and entry is not None:
+            if self.cache.update_meta(entry, stored=time.time()) is not None:
+                return entry.file_path(CATALOGUE_FILE_NAME), 'revalidated'
+            # another worker evicted the entry meanwhile, same as a miss
+            entry = None
+            response = session.get(catalogue_url)
+        if response.status_code == 200:
+            entry = self.cache.put(
+                catalogue_url,
+                {CATALOGUE_FILE_NAME: response.content},
+                {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')
+                }
+            )
+            return entry.file_path(CATALOGUE_FILE_NAME), 'miss'
+        if response.status_code >= 500 and self.usable_when_failing(entry):
+            logger.warning('Catalogue host answered {}, using cached {}'.format(
+                response.status_code,
+                catalogue_url
+            ))
+            return entry.file_path(CATALOGUE_FILE_NAME), 'stale'
+        raise ProcessorExecuteError('Catalogue could not be downloaded. Response was:\n{}'.format(
+            response.text
+        ))
+
+    def usable_when_failing(self, entry):
+        return entry is not None and entry.age() < self.stale_if_error
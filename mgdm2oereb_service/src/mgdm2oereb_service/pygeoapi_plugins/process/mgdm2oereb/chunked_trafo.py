@@ -0,0 +1,362 @@
+import copy
+import itertools
+import logging
+import os
+import shutil
+import tempfile
+
+from lxml import etree as ET
+
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.xslt_cache import XSLT_CACHE, write_result
+
+
+logger = logging.getLogger(__name__)
+
+# depth of the elements below the TRANSFER root: HEADERSECTION/DATASECTION, baskets, objects
+SECTION_DEPTH = 1
+BASKET_DEPTH = 2
+OBJECT_DEPTH = 3
+# placeholder of the content of an element while its tags are serialized
+CONTENT_MARKER = 'mgdm2oereb:content'
+
+
+def local_name(element):
+    return ET.QName(element).localname
+
+
+def object_id(element):
+    """
+    Args:
+        element (lxml.etree._Element): An object of a basket.
+    Returns:
+        str: The TID of the object (INTERLIS 2.3 `TID` or INTERLIS 2.4 `ili:tid`), None if it has none.
+    """
+    tid = element.get('TID')
+    if tid is not None:
+        return tid
+    for name, value in element.attrib.items():
+        if ET.QName(name).localname == 'tid':
+            return value
+    return None
+
+
+def basket_id(element):
+    bid = element.get('BID')
+    if bid is not None:
+        return bid
+    for name, value in element.attrib.items():
+        if ET.QName(name).localname == 'bid':
+            return value
+    return None
+
+
+def iter_xtf(xtf_path):
+    """
+    Streams the objects of an XTF. Objects are released after they were consumed (unless the consumer
+    detached them from their basket), so only the header and the current object are held in memory.
+
+    Args:
+        xtf_path (str): The path of the XTF.
+    Yields:
+        (str, lxml.etree._Element): The kind of element (`root`, `header`, `datasection`, `basket`, `object`
+            or `basket_end`) and the element. `root`, `datasection` and `basket` are delivered when they
+            start, so only their tag and attributes are complete.
+    """
+    depth = -1
+    in_datasection = False
+    for event, element in ET.iterparse(xtf_path, events=('start', 'end'), remove_comments=True):
+        if event == 'start':
+            depth += 1
+            if depth == 0:
+                yield 'root', element
+            elif depth == SECTION_DEPTH and local_name(element).upper() == 'DATASECTION':
+                in_datasection = True
+                yield 'datasection', element
+            elif depth == BASKET_DEPTH and in_datasection:
+                yield 'basket', element
+            continue
+        if depth == SECTION_DEPTH:
+            if local_name(element).upper() == 'HEADERSECTION':
+                yield 'header', element
+            in_datasection = False
+            element.clear()
+        elif depth == BASKET_DEPTH and in_datasection:
+            yield 'basket_end', element
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+        elif depth == OBJECT_DEPTH and in_datasection:
+            basket = element.getparent()
+            yield 'object', element
+            # a consumer keeping the object detaches it from the basket
+            if element.getparent() is basket:
+                element.clear()
+                while element.getprevious() is not None:
+                    del basket[0]
+        depth -= 1
+
+
+def create_chunk(root, header, datasection, basket, objects):
+    chunk_root = ET.Element(root.tag, attrib=dict(root.attrib), nsmap=root.nsmap)
+    if header is not None:
+        chunk_root.append(copy.copy(header))
+    chunk_datasection = ET.SubElement(chunk_root, datasection.tag, attrib=dict(datasection.attrib))
+    if basket is not None:
+        chunk_basket = ET.SubElement(chunk_datasection, basket.tag, attrib=dict(basket.attrib))
+        chunk_basket.extend(objects)
+    return ET.ElementTree(chunk_root)
+
+
+def iter_chunks(xtf_path, max_objects):
+    """
+    Splits an XTF into small XTF documents. Every chunk has the root and the HEADERSECTION of the input and
+    a DATASECTION with a part of one basket of at most `max_objects` objects.
+
+    Args:
+        xtf_path (str): The path of the XTF.
+        max_objects (int): The maximum number of objects in a chunk.
+    Yields:
+        lxml.etree._ElementTree: The chunks.
+    """
+    root = header = datasection = basket = None
+    objects = []
+    basket_chunks = 0
+    chunks = 0
+    for kind, element in iter_xtf(xtf_path):
+        if kind == 'root':
+            root = element
+        elif kind == 'header':
+            header = copy.copy(element)
+        elif kind == 'datasection':
+            datasection = element
+        elif kind == 'basket':
+            basket = element
+            basket_chunks = 0
+        elif kind == 'object':
+            # detaching is cheaper than copying and releases the object from the parsed tree
+            element.getparent().remove(element)
+            objects.append(element)
+            if len(objects) >= max_objects:
+                yield create_chunk(root, header, datasection, basket, objects)
+                objects = []
+                basket_chunks += 1
+                chunks += 1
+        elif kind == 'basket_end':
+            # an empty basket is passed on as well, the stylesheet may rely on it
+            if objects or basket_chunks == 0:
+                yield create_chunk(root, header, datasection, basket, objects)
+                objects = []
+                chunks += 1
+    if chunks == 0 and root is not None and datasection is not None:
+        yield create_chunk(root, header, datasection, None, [])
+
+
+def transfer_sections(root):
+    """
+    Args:
+        root (lxml.etree._Element): The root of a transfer.
+    Returns:
+        (lxml.etree._Element, lxml.etree._Element): The HEADERSECTION and the DATASECTION (None if missing).
+    """
+    header = datasection = None
+    for section in root:
+        if not isinstance(section.tag, str):
+            continue
+        if local_name(section).upper() == 'HEADERSECTION':
+            header = section
+        elif local_name(section).upper() == 'DATASECTION':
+            datasection = section
+    return header, datasection
+
+
+def basket_key(element):
+    return element.tag, basket_id(element)
+
+
+def split_at_marker(element, **kwargs):
+    """
+    Serializes an element which has `CONTENT_MARKER` as placeholder of its content.
+
+    Returns:
+        (bytes, bytes): The serialization before and after the placeholder.
+    """
+    before, after = ET.tostring(element, encoding='UTF-8', **kwargs).split(CONTENT_MARKER.encode('UTF-8'))
+    return before, after
+
+
+def transfer_frame(root):
+    """
+    Args:
+        root (lxml.etree._Element): The root of a transformed chunk.
+    Returns:
+        (bytes, bytes): The serialized transfer before and after the content of the DATASECTION.
+    """
+    header, datasection = transfer_sections(root)
+    frame = ET.Element(root.tag, attrib=dict(root.attrib), nsmap=root.nsmap)
+    if header is not None:
+        frame.append(copy.copy(header))
+    ET.SubElement(frame, datasection.tag, attrib=dict(datasection.attrib)).text = CONTENT_MARKER
+    return split_at_marker(frame, xml_declaration=True)
+
+
+def basket_frame(basket):
+    """
+    Args:
+        basket (lxml.etree._Element): A basket of a transformed chunk.
+    Returns:
+        (bytes, bytes): The serialized start and end tag of the basket. The start tag declares all
+            namespaces in scope of the basket, so its serialized content can be put in between.
+    """
+    frame = ET.Element(basket.tag, attrib=dict(basket.attrib), nsmap=basket.nsmap)
+    frame.text = CONTENT_MARKER
+    return split_at_marker(frame)
+
+
+def basket_content(basket):
+    """
+    Args:
+        basket (lxml.etree._Element): A basket of a transformed chunk.
+    Returns:
+        bytes: The serialized objects of the basket. Serializing them together instead of one by one keeps
+            them free of namespace declarations.
+    """
+    serialized = ET.tostring(basket, encoding='UTF-8', xml_declaration=False, with_tail=False)
+    # lxml escapes '>' in attribute values, the start tag ends at the first one
+    start_tag_end = serialized.index(b'>') + 1
+    if serialized[start_tag_end - 2:start_tag_end] == b'/>':
+        return b''
+    return serialized[start_tag_end:serialized.rindex(b'</')]
+
+
+def drop_duplicates(basket, written_ids):
+    """
+    Removes the objects with a TID which was already written from a basket.
+
+    Args:
+        basket (lxml.etree._Element): A basket of a transformed chunk.
+        written_ids (set of str): The TIDs written so far, updated.
+    Returns:
+        int: The number of dropped duplicates.
+    """
+    duplicates = 0
+    for element in list(basket):
+        if not isinstance(element.tag, str):
+            continue
+        tid = object_id(element)
+        if tid is None:
+            continue
+        if tid in written_ids:
+            basket.remove(element)
+            duplicates += 1
+        else:
+            written_ids.add(tid)
+    return duplicates
+
+
+def iter_baskets(root):
+    for basket in transfer_sections(root)[1]:
+        if isinstance(basket.tag, str):
+            yield basket
+
+
+def transform_chunked(xsl_trafo_path, xtf_path, params, output_path, max_objects):
+    """
+    Transforms a large XTF chunk by chunk, so the peak memory depends on `max_objects` instead of the size
+    of the XTF. Only stylesheets which map every object on its own (without looking at other objects of
+    the input) deliver the same result as a transformation of the whole XTF. Objects they create for
+    several chunks need the same TID and content in every chunk.
+
+    The transformed chunks are merged into one XTF. Root and HEADERSECTION are taken from the first chunk,
+    the objects are grouped by basket in the order the baskets first appear. Objects with a TID which was
+    already written are dropped, so objects every chunk creates (e.g. offices or documents referenced from
+    several chunks) appear once. The objects of the first basket (usually the only one, the target basket)
+    are written as soon as their chunk is transformed. Chunks with objects of other baskets are kept on
+    disk until the first basket is complete.
+
+    Args:
+        xsl_trafo_path (str): The local file path where the XSL is located.
+        xtf_path (str): The local file path where the XML is located.
+        params (dict): The params which are applied as XSL string parameters to the transformation.
+        output_path (str): The local file path the merged result is written to.
+        max_objects (int): The maximum number of input objects transformed at once.
+    Returns:
+        int: The number of chunks.
+    """
+    with XSLT_CACHE.checkout(xsl_trafo_path) as transform:
+        return merge_transformed_chunks(transform, xtf_path, params, output_path, max_objects)
+
+
+def merge_transformed_chunks(transform, xtf_path, params, output_path, max_objects):
+    """
+    Does the work of `transform_chunked` with a compiled stylesheet checked out of the `XSLT_CACHE`.
+    """
+    xsl_params = {k: ET.XSLT.strparam(v) for k, v in params.items()}
+
+    def transformed_chunks():
+        for chunk in iter_chunks(xtf_path, max_objects):
+            # relative references of the stylesheet are resolved as for the whole XTF
+            chunk.docinfo.URL = os.path.abspath(xtf_path)
+            result = transform(chunk, **xsl_params)
+            if result.getroot() is None or transfer_sections(result.getroot())[1] is None:
+                raise ValueError('The transformation of a chunk of {} did not deliver an XTF'.format(xtf_path))
+            yield result
+
+    results = transformed_chunks()
+    first_result = next(results, None)
+    if first_result is None:
+        raise ValueError('{} has no DATASECTION'.format(xtf_path))
+    transfer_start, transfer_end = transfer_frame(first_result.getroot())
+    streamed_key = next((basket_key(basket) for basket in iter_baskets(first_result.getroot())), None)
+    streamed_end = None
+    spilled_baskets = {}
+    spilled_chunks = []
+    written_ids = set()
+    duplicates = 0
+    chunks = 0
+    spill_dir = tempfile.mkdtemp(prefix='chunks.', dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        with open(output_path, mode='wb') as output:
+            output.write(transfer_start)
+            for result in itertools.chain([first_result], results):
+                chunks += 1
+                other_keys = set()
+                for basket in iter_baskets(result.getroot()):
+                    key = basket_key(basket)
+                    if key != streamed_key:
+                        spilled_baskets.setdefault(key, None)
+                        other_keys.add(key)
+                        continue
+                    if streamed_end is None:
+                        streamed_start, streamed_end = basket_frame(basket)
+                        output.write(streamed_start)
+                    duplicates += drop_duplicates(basket, written_ids)
+                    output.write(basket_content(basket))
+                if other_keys:
+                    spill_path = os.path.join(spill_dir, '{}.xtf'.format(chunks))
+                    write_result(result, spill_path)
+                    spilled_chunks.append((spill_path, other_keys))
+            if streamed_end is not None:
+                output.write(streamed_end)
+            for key in spilled_baskets:
+                basket_end = None
+                for spill_path, keys in spilled_chunks:
+                    if key not in keys:
+                        continue
+                    for basket in iter_baskets(ET.parse(spill_path).getroot()):
+                        if basket_key(basket) != key:
+                            continue
+                        if basket_end is None:
+                            basket_start, basket_end = basket_frame(basket)
+                            output.write(basket_start)
+                        duplicates += drop_duplicates(basket, written_ids)
+                        output.write(basket_content(basket))
+                output.write(basket_end)
+            output.write(transfer_end)
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+    logger.info('Transformed {} in {} chunks ({} duplicate objects dropped)'.format(
+        xtf_path,
+        chunks,
+        duplicates
+    ))
+    return chunks
@@ -0,0 +1,213 @@
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.files import publish_file
+
+
+logger = logging.getLogger(__name__)
+
+META_FILE_NAME = 'meta.json'
+# how often a writer tries to replace an entry other writers of the same key replace at the same time
+PUT_ATTEMPTS = 5
+
+
+@dataclass
+class CacheEntry:
+    path: str
+    meta: dict
+
+    def file_path(self, name):
+        return os.path.join(self.path, name)
+
+    def age(self):
+        return time.time() - self.meta.get('stored', 0)
+
+
+class DiskCache(object):
+
+    def __init__(self, root, max_bytes=None):
+        """
+        A file system cache which can be shared between processes. Each entry is a folder holding any number
+        of files plus a `meta.json`. Entries are created in a temporary folder and renamed into place, so
+        readers never see a half written entry. The least recently used entries are evicted when the cache
+        grows beyond `max_bytes`.
+
+        Args:
+            root (str): The folder which holds the cache entries (created if missing).
+            max_bytes (int): The maximum size of all entries together (default: None = unlimited).
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def hash_key(key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.root, self.hash_key(key))
+
+    def get(self, key):
+        """
+        Args:
+            key (str): The key of the entry.
+        Returns:
+            CacheEntry or None: The entry if it exists.
+        """
+        path = self.entry_path(key)
+        try:
+            with open(os.path.join(path, META_FILE_NAME), mode="r", encoding="utf-8") as fh:
+                meta = json.load(fh)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return CacheEntry(path, meta)
+
+    def put(self, key, files, meta=None):
+        """
+        Stores an entry, replacing an existing one with the same key.
+
+        Args:
+            key (str): The key of the entry.
+            files (dict): The file names of the entry mapped to their content (bytes) or to the path of an
+                existing file which is linked or copied into the entry.
+            meta (dict): Additional JSON serializable information stored with the entry.
+        Returns:
+            CacheEntry: The stored entry. If another writer stored the same key at the same time, the entry
+                of the writer which won is delivered.
+        """
+        meta = dict(meta or {})
+        meta['key'] = key
+        meta['stored'] = time.time()
+        path = self.entry_path(key)
+        temporary_path = os.path.join(self.root, '.{}.part'.format(uuid.uuid4().hex))
+        os.makedirs(temporary_path)
+        try:
+            for name, content in files.items():
+                if isinstance(content, str):
+                    publish_file(content, os.path.join(temporary_path, name))
+                else:
+                    with open(os.path.join(temporary_path, name), mode="wb") as fh:
+                        fh.write(content)
+            with open(os.path.join(temporary_path, META_FILE_NAME), mode="w", encoding="utf-8") as fh:
+                json.dump(meta, fh)
+            for attempt in range(PUT_ATTEMPTS):
+                self._remove(path)
+                try:
+                    os.rename(temporary_path, path)
+                    break
+                except OSError as e:
+                    if e.errno not in [errno.ENOTEMPTY, errno.EEXIST] or attempt == PUT_ATTEMPTS - 1:
+                        raise
+                # another writer put the same key in between, its entry is as good as ours
+                entry = self.get(key)
+                if entry is not None:
+                    logger.debug('Cache entry {} was stored concurrently'.format(path))
+                    return entry
+        finally:
+            if os.path.exists(temporary_path):
+                shutil.rmtree(temporary_path, ignore_errors=True)
+        self.evict()
+        return CacheEntry(path, meta)
+
+    def update_meta(self, entry, **values):
+        """
+        Updates the meta information of an existing entry in place.
+
+        Args:
+            entry (CacheEntry): The entry to update.
+            values: The meta values to set.
+        Returns:
+            CacheEntry or None: The updated entry, None if another process evicted it meanwhile.
+        """
+        entry.meta.update(values)
+        temporary_meta_path = os.path.join(entry.path, '.{}.part'.format(uuid.uuid4().hex))
+        try:
+            with open(temporary_meta_path, mode="w", encoding="utf-8") as fh:
+                json.dump(entry.meta, fh)
+            os.replace(temporary_meta_path, os.path.join(entry.path, META_FILE_NAME))
+        except FileNotFoundError:
+            return None
+        return entry
+
+    def delete(self, key):
+        self._remove(self.entry_path(key))
+
+    def _remove(self, path):
+        if os.path.exists(path):
+            trash_path = os.path.join(self.root, '.{}.trash'.format(uuid.uuid4().hex))
+            try:
+                os.rename(path, trash_path)
+            except OSError:
+                return
+            shutil.rmtree(trash_path, ignore_errors=True)
+
+    @staticmethod
+    def _size(path):
+        size = 0
+        for dir_path, dir_names, file_names in os.walk(path):
+            for file_name in file_names:
+                try:
+                    size += os.stat(os.path.join(dir_path, file_name)).st_size
+                except OSError:
+                    pass
+        return size
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits into `max_bytes`.
+
+        Returns:
+            int: The number of removed entries.
+        """
+        if self.max_bytes is None:
+            return 0
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith('.'):
+                continue
+            try:
+                entries.append((os.stat(path).st_mtime, path, self._size(path)))
+            except OSError:
+                continue
+        total = sum(entry[2] for entry in entries)
+        removed = 0
+        for mtime, path, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            removed += 1
+            logger.debug('Evicted cache entry {}'.format(path))
+        return removed
+
+
+_disk_caches = {}
+_disk_caches_lock = threading.Lock()
+
+
+def get_disk_cache(root, max_bytes=None):
+    """
+    Delivers the cache of `root` shared by all processors of this process, so its folder is created once and
+    not for every processor instance.
+
+    Args:
+        root (str): The folder which holds the cache entries (created if missing).
+        max_bytes (int): The maximum size of all entries together (default: None = unlimited).
+    Returns:
+        DiskCache: The cache.
+    """
+    key = (os.path.abspath(root), max_bytes)
+    with _disk_caches_lock:
+        if key not in _disk_caches:
+            _disk_caches[key] = DiskCache(root, max_bytes)
+        return _disk_caches[key]
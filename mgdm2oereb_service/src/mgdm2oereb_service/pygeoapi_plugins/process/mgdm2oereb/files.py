@@ -0,0 +1,78 @@
+import errno
+import fcntl
+import hashlib
+import os
+import shutil
+import uuid
+
+# ioctl request number to clone (reflink) a file on Linux file systems like btrfs and xfs
+FICLONE = 0x40049409
+PUBLISH_MODES = ['link', 'rename', 'copy']
+
+
+def reflink_file(source, target):
+    with open(source, mode="rb") as source_handler, open(target, mode="wb") as target_handler:
+        fcntl.ioctl(target_handler.fileno(), FICLONE, source_handler.fileno())
+
+
+def publish_file(source, target, mode='link'):
+    """
+    Makes `source` available under `target` atomically: the file is first put beside `target` under a hidden
+    temporary name and then renamed. Readers of the target folder therefore never see a half written file.
+
+    Args:
+        source (str): The path of the file which should be published.
+        target (str): The path under which the file should be published.
+        mode (str): `link` hardlinks (or reflinks) the source, `rename` moves it and `copy` copies it. Link
+            and rename fall back to a copy when source and target are on different file systems.
+    Returns:
+        str: The path of the published file.
+    """
+    if mode not in PUBLISH_MODES:
+        raise ValueError('Unknown publish mode {}'.format(mode))
+    if mode == 'rename':
+        try:
+            os.replace(source, target)
+            return target
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    temporary_target = os.path.join(
+        os.path.dirname(target),
+        '.{}.{}.part'.format(os.path.basename(target), uuid.uuid4().hex)
+    )
+    try:
+        if mode == 'copy':
+            shutil.copyfile(source, temporary_target)
+        else:
+            try:
+                os.link(source, temporary_target)
+            except OSError:
+                try:
+                    reflink_file(source, temporary_target)
+                except OSError:
+                    shutil.copyfile(source, temporary_target)
+        os.replace(temporary_target, target)
+    finally:
+        if os.path.exists(temporary_target):
+            os.remove(temporary_target)
+    if mode == 'rename':
+        os.remove(source)
+    return target
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    Calculates the SHA-256 of a file without loading it into memory.
+
+    Args:
+        path (str): The path of the file.
+        chunk_size (int): The number of bytes read at once.
+    Returns:
+        str: The hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, mode="rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,85 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from mgdm2oereb_service.metrics import observe_http_response
+
+
+class TimeoutSession(requests.Session):
+
+    def __init__(self, timeout):
+        """
+        A requests session which applies a default timeout to every request.
+
+        Args:
+            timeout (tuple of float): The connect and read timeout in seconds.
+        """
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def create_session(pool_size=10, connect_timeout=10.0, read_timeout=300.0, retries=3, backoff_factor=0.5):
+    """
+    Creates a session with keep-alive connection pools. Connection errors are retried for every request, read
+    errors and 5xx answers only for idempotent methods (so an upload is never sent twice).
+
+    Args:
+        pool_size (int): The number of connections kept open per host.
+        connect_timeout (float): Seconds to wait for a connection.
+        read_timeout (float): Seconds to wait for data from the server.
+        retries (int): How often a failed request is retried.
+        backoff_factor (float): The base of the exponential wait between retries in seconds.
+    Returns:
+        TimeoutSession: The configured session.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = TimeoutSession((connect_timeout, read_timeout))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.hooks['response'].append(observe_http_response)
+    return session
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Delivers the long-lived session of the current process. Sessions are not shared over a fork, so each
+    gunicorn worker gets its own pool.
+
+    Returns:
+        TimeoutSession: The session of this process.
+    """
+    pid = os.getpid()
+    with _sessions_lock:
+        session = _sessions.get(pid)
+        if session is None:
+            _sessions.clear()
+            session = create_session(
+                pool_size=int(os.environ.get('MGDM2OEREB_HTTP_POOL_SIZE', '10')),
+                connect_timeout=float(os.environ.get('MGDM2OEREB_HTTP_CONNECT_TIMEOUT', '10')),
+                read_timeout=float(os.environ.get('MGDM2OEREB_HTTP_READ_TIMEOUT', '300')),
+                retries=int(os.environ.get('MGDM2OEREB_HTTP_RETRIES', '3')),
+                backoff_factor=float(os.environ.get('MGDM2OEREB_HTTP_RETRY_BACKOFF', '0.5'))
+            )
+            _sessions[pid] = session
+    return session
@@ -1,9 +1,18 @@
+import functools
 import os
 import subprocess
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Callable
 from dataclasses import dataclass, field
+from mgdm2oereb_service.job_queue import QUEUE_LANES
+from mgdm2oereb_service.metrics import INPUT_BYTES, observe_task
 from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb import \
-    Mgdm2OerebTransformatorBase, JobFile
+    Mgdm2OerebTransformatorBase, JobContext, JobFile
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.http_session import get_session
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.run_cache import OUTPUT_LOG_FILE_NAME, \
+    TRAFO_RESULT_FILE_NAME, get_directory_revision
+from pygeoapi.process.base import ProcessorExecuteError
 from pygeoapi.util import JobStatus
 
 
@@ -15,6 +24,8 @@ class Parameters:
     model_name: str = field()
     catalog: str = field()
     input_validation: bool = field()
+    force_rerun: bool = field()
+    priority: str = field()
 
 
 @dataclass
@@ -23,6 +34,7 @@ class OereblexParameters(Parameters):
     oereblex_canton: str = field()
     dummy_office_name: str = field()
     dummy_office_url: str = field()
+    refresh_geolinks: bool = field()
 
 
 @dataclass
@@ -42,9 +54,122 @@ class OereblexJobFiles(JobFiles):
     oereblex_trafo_result_file: JobFile
 
 
+@dataclass
+class Task:
+    handler: Callable[[Parameters | OereblexParameters, JobContext, dict, str], dict]
+    depends_on: list[str] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return self.handler.__name__
+
+
 @dataclass
 class TaskOrder:
-    tasks: list[Callable[[Parameters | OereblexParameters, JobFiles | OereblexJobFiles, dict, str], dict]]
+    tasks: list[Task]
+
+    def dependency_closure(self, task: Task) -> set[str]:
+        tasks_by_name = {t.name: t for t in self.tasks}
+        closure = set()
+        open_names = list(task.depends_on)
+        while open_names:
+            name = open_names.pop()
+            if name not in closure:
+                closure.add(name)
+                open_names.extend(tasks_by_name[name].depends_on)
+        return closure
+
+    def check(self):
+        known = set()
+        for task in self.tasks:
+            for dependency in task.depends_on:
+                if dependency not in known:
+                    raise ValueError(f'{task.name} depends on {dependency} which is not listed before it.')
+            known.add(task.name)
+
+    def execute(
+            self,
+            parameters: Parameters | OereblexParameters,
+            job: JobContext,
+            result: dict,
+            max_workers: int = 1,
+            on_task_done: Callable[[str, float, dict], None] | None = None
+    ) -> dict:
+        """
+        Runs the tasks on a thread pool. A task starts as soon as all tasks it depends on are done and
+        receives their results. Once a task failed no further task is started. The results are merged in
+        the order of `tasks` up to the first failed task, so the outcome does not depend on which task
+        finished first. The seconds every task ran are added as `task_durations`.
+
+        Args:
+            parameters: The parameters of the job.
+            job: The context of the job.
+            result: The result collected before the tasks run.
+            max_workers: How many tasks may run at the same time.
+            on_task_done: Called with name, duration and result of every finished task.
+        Returns:
+            dict: The merged result.
+        """
+        self.check()
+        task_results = {}
+        task_durations = {}
+        pending = list(self.tasks)
+        running = {}
+        failed = False
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                if not failed:
+                    for task in list(pending):
+                        if len(running) >= max_workers:
+                            break
+                        if all(dependency in task_results for dependency in task.depends_on):
+                            dependencies = self.dependency_closure(task)
+                            task_input = result.copy()
+                            for done_task in self.tasks:
+                                if done_task.name in dependencies:
+                                    task_input.update(task_results[done_task.name])
+                            running[executor.submit(
+                                self.run_task,
+                                task,
+                                parameters,
+                                job,
+                                task_input
+                            )] = task
+                            pending.remove(task)
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    task_results[task.name], duration = future.result()
+                    task_durations[task.name] = round(duration, 3)
+                    if on_task_done is not None:
+                        on_task_done(task.name, duration, task_results[task.name])
+                    if task_results[task.name].get('status', False) == JobStatus.failed.value:
+                        failed = True
+        merged_result = result.copy()
+        for task in self.tasks:
+            if task.name not in task_results:
+                continue
+            merged_result.update(task_results[task.name])
+            if task_results[task.name].get('status', False) == JobStatus.failed.value:
+                # we stop merging since a task in the row was failing.
+                break
+        merged_result['task_durations'] = {
+            task.name: task_durations[task.name] for task in self.tasks if task.name in task_durations
+        }
+        return merged_result
+
+    @staticmethod
+    def run_task(
+            task: Task,
+            parameters: Parameters | OereblexParameters,
+            job: JobContext,
+            task_input: dict
+    ) -> tuple[dict, float]:
+        started = time.perf_counter()
+        task_result = task.handler(parameters, job, task_input, task.name)
+        return task_result, time.perf_counter() - started
 
 
 class Mgdm2OerebTransformator(Mgdm2OerebTransformatorBase):
@@ -62,48 +187,60 @@ class Mgdm2OerebTransformator(Mgdm2OerebTransformatorBase):
     def check_params(self, data: dict) -> Parameters | OereblexParameters:
         input_validation = data.get('input_validation', False) in [True, 'true', 1, '1', 'True']
         data['input_validation'] = input_validation
+        data['force_rerun'] = data.get('force_rerun', False) in [True, 'true', 1, '1', 'True']
+        data['priority'] = data.get('priority') or QUEUE_LANES[0]
+        if data['priority'] not in QUEUE_LANES:
+            raise ProcessorExecuteError(f'The priority must be one of {", ".join(QUEUE_LANES)}.')
         params = self.extract_parameters(data)
         self.logger.info('All params are there. Starting with the process.')
         return params
 
-    def prepare_job_files(self, parameters: Parameters) -> JobFiles:
+    def prepare_job_files(self, job: JobContext, parameters: Parameters) -> JobFiles:
         return JobFiles(
             input_zip_file=self.create_job_file(
+                job,
                 self.zip_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
             ),
             input_xtf_file=self.create_job_file(
+                job,
                 self.input_xtf_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
             ),
             input_log_file=self.create_job_file(
+                job,
                 self.input_log_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
             ),
             output_log_file=self.create_job_file(
+                job,
                 self.output_log_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
             ),
             trafo_result_file=self.create_job_file(
+                job,
                 self.result_xtf_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
             ),
             rss_snippet_file=self.create_job_file(
+                job,
                 self.rss_snippet_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
             ),
             json_snippet_file=self.create_job_file(
+                job,
                 self.json_snippet_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
             ),
             catalog_file=self.create_job_file(
+                job,
                 self.catalog_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
@@ -113,30 +250,47 @@ class Mgdm2OerebTransformator(Mgdm2OerebTransformatorBase):
     def obtain_task_order(self):
         return TaskOrder(
             tasks=[
-                self.task_handle_input_zip,
-                self.task_handle_input_validation,
-                self.task_handle_catalogue,
-                self.task_handle_trafo,
-                self.task_handle_output_validation,
-                self.task_handle_rss_snippet,
-                self.task_handle_json_snippet
+                Task(self.task_handle_input_zip),
+                Task(self.task_handle_input_validation, ['task_handle_input_zip']),
+                Task(self.task_handle_catalogue),
+                Task(self.task_handle_memoize_lookup, ['task_handle_input_zip', 'task_handle_catalogue']),
+                Task(self.task_handle_trafo, [
+                    'task_handle_input_zip',
+                    'task_handle_input_validation',
+                    'task_handle_catalogue',
+                    'task_handle_memoize_lookup'
+                ]),
+                Task(self.task_handle_output_validation, ['task_handle_trafo']),
+                Task(self.task_handle_memoize_store, ['task_handle_output_validation']),
+                # job.json has to be published before the feed announces the job
+                Task(self.task_handle_json_snippet, ['task_handle_output_validation']),
+                Task(self.task_handle_rss_snippet, ['task_handle_output_validation', 'task_handle_json_snippet'])
             ]
         )
 
     def task_handle_input_zip(
             self,
             parameters: Parameters | OereblexParameters,
-            job_files: JobFiles | OereblexJobFiles,
+            job: JobContext,
             result: dict,
             task_name: str
     ) -> dict:
-        input_zip_file_path = job_files.input_zip_file.save_runtime_file(
-            self.decode_input_file(parameters.zip_file)
-        )
+        if self.streaming_decode:
+            input_zip_file_path = job.files.input_zip_file.save_runtime_file_chunks(
+                self.iter_decode_input_file(parameters.zip_file, self.decode_chunk_size)
+            )
+        else:
+            input_zip_file_path = job.files.input_zip_file.save_runtime_file(
+                self.decode_input_file(parameters.zip_file)
+            )
+        INPUT_BYTES.labels(self.metadata['id'], 'zip').inc(os.path.getsize(input_zip_file_path))
         try:
-            input_xtf_content = self.unzip_input_file(
-                input_zip_file_path,
-                self.job_path
+            job.files.input_xtf_file.save_runtime_file_chunks(
+                self.iter_unzip_input_file(
+                    input_zip_file_path,
+                    self.max_xtf_size,
+                    self.max_zip_ratio
+                )
             )
             self.logger.info('Input-Zip extracted')
         except Exception as e:
@@ -147,14 +301,11 @@ class Mgdm2OerebTransformator(Mgdm2OerebTransformatorBase):
                 'step': 'unzip'
             }
         try:
-            job_files.input_xtf_file.save_runtime_file(
-                input_xtf_content
-            )
-            job_files.input_xtf_file.save_result_file(input_xtf_content)
+            job.files.input_xtf_file.publish()
             self.logger.info('Input-XTF Created')
             return {
                 f"{task_name}_status": JobStatus.successful.value,
-                "input_xtf": f"/{self.absolute_result_dir}/{job_files.input_xtf_file.file_name()}"
+                "input_xtf": f"/{self.absolute_result_dir}/{job.files.input_xtf_file.file_name()}"
             }
         except Exception as e:
             return {
@@ -167,32 +318,38 @@ class Mgdm2OerebTransformator(Mgdm2OerebTransformatorBase):
     def task_handle_input_validation(
             self,
             parameters: Parameters | OereblexParameters,
-            job_files: JobFiles | OereblexJobFiles,
+            job: JobContext,
             result: dict,
             task_name: str
     ) -> dict:
         if parameters.input_validation:
-            if job_files.input_xtf_file.result_content:
-                input_validation_failed, input_validation_result = self.validate(
-                    job_files.input_xtf_file.result_content,
-                    self.ilivalidator_service_url,
-                    self.result_xtf_file_name,
-                    all_objects_accessible=False
-                )
-                job_files.input_log_file.save_runtime_file(
-                    input_validation_result
-                )
-                job_files.input_log_file.save_result_file(input_validation_result)
+            if job.files.input_xtf_file.runtime_path:
+                try:
+                    input_validation = self.run_validation(
+                        job.files.input_xtf_file.runtime_path,
+                        all_objects_accessible=False
+                    )
+                    self.save_validation_log(job.files.input_log_file, input_validation)
+                    job.files.input_log_file.publish()
+                except Exception as e:
+                    return {
+                        'status': JobStatus.failed.value,
+                        'msg': self.format_exception(e),
+                        'task': task_name,
+                        **self.validation_error_summary(task_name, e)
+                    }
                 self.logger.info('Input-Validation done')
-                if input_validation_failed:
+                if input_validation.failed:
                     return {
                         'status': JobStatus.failed.value,
                         'msg': 'Validation of input file failed.',
-                        'task': task_name
+                        'task': task_name,
+                        **self.validation_summary(task_name, input_validation)
                     }
                 return {
                     f"{task_name}_status": JobStatus.successful.value,
-                    "input_validation_log": f"/{self.absolute_result_dir}/{job_files.input_log_file.file_name()}"
+                    **self.validation_summary(task_name, input_validation),
+                    "input_validation_log": f"/{self.absolute_result_dir}/{job.files.input_log_file.file_name()}"
                 }
             else:
                 return {
@@ -206,21 +363,36 @@ class Mgdm2OerebTransformator(Mgdm2OerebTransformatorBase):
     def task_handle_catalogue(
             self,
             parameters: Parameters | OereblexParameters,
-            job_files: JobFiles | OereblexJobFiles,
+            job: JobContext,
             result: dict,
             task_name: str
     ) -> dict:
         try:
-            catalog_content = self.download_catalogue(parameters.catalog)
-            job_files.catalog_file.save_runtime_file(
-                catalog_content
-            )
-            job_files.catalog_file.save_result_file(catalog_content)
+            task_result = {}
+            if self.catalogue_cache is not None:
+                catalog_path, catalog_cache_status = self.catalogue_cache.fetch(
+                    parameters.catalog,
+                    get_session()
+                )
+                try:
+                    job.files.catalog_file.save_runtime_file_from(catalog_path)
+                except FileNotFoundError:
+                    # another worker evicted the entry meanwhile, same as a miss
+                    job.files.catalog_file.save_runtime_file(self.download_catalogue(parameters.catalog))
+                    catalog_cache_status = 'miss'
+                task_result['catalog_cache'] = catalog_cache_status
+            else:
+                catalog_content = self.download_catalogue(parameters.catalog)
+                job.files.catalog_file.save_runtime_file(
+                    catalog_content
+                )
+            job.files.catalog_file.publish()
             self.logger.info('Catalogue created')
-            return {
+            task_result.update({
                 f"{task_name}_status": JobStatus.successful.value,
-                "used_catalog": f"/{self.absolute_result_dir}/{job_files.catalog_file.file_name()}"
-            }
+                "used_catalog": f"/{self.absolute_result_dir}/{job.files.catalog_file.file_name()}"
+            })
+            return task_result
         except Exception as e:
             return {
                 'status': JobStatus.failed.value,
@@ -231,12 +403,14 @@ class Mgdm2OerebTransformator(Mgdm2OerebTransformatorBase):
     def task_handle_trafo(
             self,
             parameters: Parameters | OereblexParameters,
-            job_files: JobFiles | OereblexJobFiles,
+            job: JobContext,
             result: dict,
             task_name: str
     ) -> dict:
+        if self.is_memoized(result):
+            return self.publish_memoized_trafo_result(job, task_name)
         trafo_params = {
-            "catalog": job_files.catalog_file.result_path,
+            "catalog": job.files.catalog_file.result_path,
             "theme_code": parameters.theme_code,
             "model": parameters.model_name,
             "target_basket_id": parameters.target_basket_id,
@@ -247,18 +421,24 @@ class Mgdm2OerebTransformator(Mgdm2OerebTransformatorBase):
                 self.mgdm2oereb_xsl_path,
                 '{}.trafo.xsl'.format(parameters.model_name)
             )
-            trafo_result_content = self.transform(
-                xsl_trafo_path,
-                job_files.input_xtf_file.result_path,
-                trafo_params
-            )
-            job_files.trafo_result_file.save_runtime_file(
-                trafo_result_content
+            # the result goes to disk right away, later tasks read the file instead of a result tree in memory
+            job.files.trafo_result_file.save_runtime_file_with(
+                lambda path: self.transform_trafo_result(
+                    parameters.model_name,
+                    xsl_trafo_path,
+                    job.files.input_xtf_file.result_path,
+                    trafo_params,
+                    path
+                )
             )
-            job_files.trafo_result_file.save_result_file(trafo_result_content)
+            job.files.trafo_result_file.publish()
             return {
                 f"{task_name}_status": JobStatus.successful.value,
-                "transformation_result": f"/{self.absolute_result_dir}/{job_files.trafo_result_file.file_name()}"
+                f"{task_name}_chunked": self.use_chunked_trafo(
+                    parameters.model_name,
+                    job.files.input_xtf_file.result_path
+                ),
+                "transformation_result": f"/{self.absolute_result_dir}/{job.files.trafo_result_file.file_name()}"
             }
         except Exception as e:
             return {
@@ -270,76 +450,217 @@ class Mgdm2OerebTransformator(Mgdm2OerebTransformatorBase):
     def task_handle_output_validation(
             self,
             parameters: Parameters | OereblexParameters,
-            job_files: JobFiles | OereblexJobFiles,
+            job: JobContext,
             result: dict,
             task_name: str
     ) -> dict:
-        output_validation_failed, output_validation_result = self.validate(
-            job_files.trafo_result_file.result_content,
-            self.ilivalidator_service_url,
-            self.result_xtf_file_name,
-            all_objects_accessible=True
-        )
-        job_files.output_log_file.save_runtime_file(
-            output_validation_result
-        )
-        job_files.output_log_file.save_result_file(output_validation_result)
-        if output_validation_failed:
+        if self.is_memoized(result):
+            job.files.output_log_file.publish()
+            return {
+                f"{task_name}_status": JobStatus.successful.value,
+                f"{task_name}_memoized": True,
+                "output_validation_log": f"/{self.absolute_result_dir}/{job.files.output_log_file.file_name()}"
+            }
+        try:
+            output_validation = self.run_validation(
+                job.files.trafo_result_file.runtime_path,
+                all_objects_accessible=True
+            )
+            self.save_validation_log(job.files.output_log_file, output_validation)
+            job.files.output_log_file.publish()
+        except Exception as e:
+            return {
+                'status': JobStatus.failed.value,
+                'msg': self.format_exception(e),
+                'task': task_name,
+                **self.validation_error_summary(task_name, e)
+            }
+        if output_validation.failed:
             return {
                 'status': JobStatus.failed.value,
                 'msg': 'Validation of output file failed.',
                 'task': task_name,
-                "output_validation_log": f"/{self.absolute_result_dir}/{job_files.output_log_file.file_name()}"
+                **self.validation_summary(task_name, output_validation),
+                "output_validation_log": f"/{self.absolute_result_dir}/{job.files.output_log_file.file_name()}"
             }
         return {
             f"{task_name}_status": JobStatus.successful.value,
-            "output_validation_log": f"/{self.absolute_result_dir}/{job_files.output_log_file.file_name()}"
+            **self.validation_summary(task_name, output_validation),
+            "output_validation_log": f"/{self.absolute_result_dir}/{job.files.output_log_file.file_name()}"
         }
 
     def task_handle_rss_snippet(
             self,
             parameters: Parameters | OereblexParameters,
-            job_files: JobFiles | OereblexJobFiles,
+            job: JobContext,
             result: dict,
             task_name: str
     ) -> dict:
         rss_snippet_content = self.create_rss_snippet(
+            job,
             parameters.theme_code,
             parameters.model_name,
             parameters.target_basket_id,
             result[f"{self.task_handle_output_validation.__name__}_status"]
         )
-        job_files.rss_snippet_file.save_runtime_file(
+        job.files.rss_snippet_file.save_runtime_file(
             rss_snippet_content
         )
-        job_files.rss_snippet_file.save_result_file(rss_snippet_content)
+        job.files.rss_snippet_file.publish()
+        try:
+            self.result_index.add_feed_item(job.job_id, rss_snippet_content.decode('utf-8'), job.timestamp)
+        except Exception as e:
+            self.logger.warning(f'Could not add job {job.job_id} to the feed: {e}')
         return {
             f"{task_name}_status": JobStatus.successful.value,
-            "rss_snippet": f"/{self.absolute_result_dir}/{job_files.rss_snippet_file.file_name()}"
+            "rss_snippet": f"/{self.absolute_result_dir}/{job.files.rss_snippet_file.file_name()}"
         }
 
     def task_handle_json_snippet(
             self,
             parameters: Parameters | OereblexParameters,
-            job_files: JobFiles | OereblexJobFiles,
+            job: JobContext,
             result: dict,
             task_name: str
     ) -> dict:
         json_snippet_content = self.create_json_snippet(
+            job,
             parameters.theme_code,
             parameters.model_name,
             parameters.target_basket_id,
             result[f"{self.task_handle_output_validation.__name__}_status"]
         )
-        job_files.json_snippet_file.save_runtime_file(
+        job.files.json_snippet_file.save_runtime_file(
             json_snippet_content
         )
-        job_files.json_snippet_file.save_result_file(json_snippet_content)
+        job.files.json_snippet_file.publish()
+        return {
+            f"{task_name}_status": JobStatus.successful.value,
+            "json_snippet": f"/{self.absolute_result_dir}/{job.files.json_snippet_file.file_name()}"
+        }
+
+    def memoize_fingerprint_parts(self, parameters: Parameters | OereblexParameters) -> dict:
+        return {
+            "model_name": parameters.model_name,
+            "theme_code": parameters.theme_code,
+            "target_basket_id": parameters.target_basket_id,
+            "xsl_revision": self.xsl_revision or get_directory_revision(self.mgdm2oereb_xsl_path),
+            "result_xtf_file_name": self.result_xtf_file_name
+        }
+
+    def bypasses_memoized_run(self, parameters: Parameters | OereblexParameters) -> bool:
+        """
+        Args:
+            parameters: The parameters of the job.
+        Returns:
+            bool: Whether the job has to run even if an identical run is memoized.
+        """
+        return parameters.force_rerun
+
+    @staticmethod
+    def is_memoized(result: dict) -> bool:
+        """
+        Args:
+            result (dict): The result passed to the task.
+        Returns:
+            bool: Whether the lookup task linked a memoized run into the job, so the job must not do the work
+                itself.
+        """
+        return result.get('memoize') == 'hit'
+
+    @staticmethod
+    def link_memoized_run(job: JobContext, memoized_run) -> bool:
+        """
+        Links the files of a memoized run into the job, so later tasks do not depend on the cache entry, which
+        may be evicted meanwhile.
+
+        Args:
+            job: The context of the job.
+            memoized_run (mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.disk_cache.CacheEntry): The
+                memoized run.
+        Returns:
+            bool: Whether the run could be linked, False if it was evicted in the meantime.
+        """
+        job_files = [
+            (job.files.trafo_result_file, TRAFO_RESULT_FILE_NAME),
+            (job.files.output_log_file, OUTPUT_LOG_FILE_NAME)
+        ]
+        try:
+            for job_file, name in job_files:
+                job_file.save_runtime_file_from(memoized_run.file_path(name))
+        except FileNotFoundError:
+            for job_file, name in job_files:
+                # the links share the inode with the cache entry, they must not be written by the job
+                if job_file.runtime_path is not None and os.path.exists(job_file.runtime_path):
+                    os.remove(job_file.runtime_path)
+                job_file.runtime_path = None
+            return False
+        return True
+
+    def publish_memoized_trafo_result(self, job: JobContext, task_name: str):
+        try:
+            job.files.trafo_result_file.publish()
+            return {
+                f"{task_name}_status": JobStatus.successful.value,
+                f"{task_name}_memoized": True,
+                "transformation_result": f"/{self.absolute_result_dir}/{job.files.trafo_result_file.file_name()}"
+            }
+        except Exception as e:
+            return {'status': JobStatus.failed.value, 'msg': self.format_exception(e), 'task': task_name}
+
+    def task_handle_memoize_lookup(
+            self,
+            parameters: Parameters | OereblexParameters,
+            job: JobContext,
+            result: dict,
+            task_name: str
+    ) -> dict:
+        if self.run_cache is None:
+            return {}
+        try:
+            fingerprint = self.run_cache.create_fingerprint(
+                job.files.input_xtf_file.result_path,
+                job.files.catalog_file.result_path,
+                self.memoize_fingerprint_parts(parameters)
+            )
+        except Exception as e:
+            return {'status': JobStatus.failed.value, 'msg': self.format_exception(e), 'task': task_name}
+        memoize_status = 'miss'
+        if self.bypasses_memoized_run(parameters):
+            memoize_status = 'forced'
+        else:
+            memoized_run = self.run_cache.get(fingerprint, self.memoized_run_ttl)
+            if memoized_run is not None and self.link_memoized_run(job, memoized_run):
+                memoize_status = 'hit'
+        self.logger.info(f'Memoized run lookup: {memoize_status}')
         return {
             f"{task_name}_status": JobStatus.successful.value,
-            "rss_snippet": f"/{self.absolute_result_dir}/{job_files.json_snippet_file.file_name()}"
+            "memoize": memoize_status,
+            "memoize_fingerprint": fingerprint
         }
 
+    def task_handle_memoize_store(
+            self,
+            parameters: Parameters | OereblexParameters,
+            job: JobContext,
+            result: dict,
+            task_name: str
+    ) -> dict:
+        if self.run_cache is None or result.get('memoize') not in ['miss', 'forced']:
+            return {}
+        try:
+            self.run_cache.put(
+                result['memoize_fingerprint'],
+                job.files.trafo_result_file.result_path,
+                job.files.output_log_file.result_path,
+                {'job_id': job.job_id}
+            )
+        except Exception as e:
+            # the job itself is done, a run which could not be memoized is simply computed again next time
+            self.logger.warning(f'Run could not be memoized: {self.format_exception(e)}')
+            return {}
+        return {f"{task_name}_status": JobStatus.successful.value}
+
     def execute(self, data):
         result = {}
         try:
@@ -357,7 +678,8 @@ class Mgdm2OerebTransformator(Mgdm2OerebTransformatorBase):
             return self.mimetype, result
 
         try:
-            job_files = self.prepare_job_files(parameters)
+            job = self.start_job()
+            job.files = self.prepare_job_files(job, parameters)
         except Exception as e:
             result.update({
                 'status': JobStatus.failed.value,
@@ -365,20 +687,33 @@ class Mgdm2OerebTransformator(Mgdm2OerebTransformatorBase):
                 'task': 'preparing job files'
             })
             return self.mimetype, result
+        try:
+            self.result_index.register_job(
+                job.job_id,
+                parameters.theme_code,
+                parameters.target_basket_id,
+                job.timestamp
+            )
+        except Exception as e:
+            self.logger.warning(f'Could not register job {job.job_id} in the result index: {e}')
 
         task_order = self.obtain_task_order()
-        for task in task_order.tasks:
-            task_result = task(
-                parameters,
-                job_files,
-                result.copy(),
-                task.__name__
+        result = task_order.execute(
+            parameters,
+            job,
+            result,
+            self.task_workers,
+            functools.partial(observe_task, self.metadata['id'], self.metric_model_name(parameters.model_name))
+        )
+        try:
+            self.result_index.finish_job(
+                job.job_id,
+                result.get('status', False) != JobStatus.failed.value
             )
-            result.update(task_result)
-            if task_result.get('status', False):
-                if task_result['status'] == JobStatus.failed.value:
-                    # we break the loop and stop since a task in the row was failing.
-                    return self.mimetype, result
+        except Exception as e:
+            self.logger.warning(f'Could not mark job {job.job_id} as finished in the result index: {e}')
+        if result.get('status', False) == JobStatus.failed.value:
+            return self.mimetype, result
 
         self.logger.info(result)
         return self.mimetype, result
@@ -396,61 +731,86 @@ class Mgdm2OerebTransformatorOereblex(Mgdm2OerebTransformator):
             'MGDM2OEREB_RESULT_OEREBLEX_XML_NAME',
             'oereblex.xml'
         )
-        self.result_oereblex_xml_path = os.path.join(
-            self.job_path,
-            self.result_oereblex_xml_file_name
-        )
+        # the download script is part of the mgdm2oereb checkout, like the stylesheets
         self.mgdm2oereb_oereblex_python_trafo_path = os.path.join(
-            self.job_path,
+            os.environ.get('MGDM2OEREB_PATH', '/mgdm2oereb'),
             os.environ.get('MGDM2OEREB_OEREBLEX_TRAFO_PY', 'oereblex.download.py')
         )
+        # a memoized run brings its geolinks along, so changed ÖREBlex documents are only picked up after this
+        self.memoized_run_ttl = int(os.environ.get('MGDM2OEREB_OEREBLEX_MEMOIZE_TTL', '86400'))
+
+    def check_params(self, data: dict) -> OereblexParameters:
+        data['refresh_geolinks'] = data.get('refresh_geolinks', False) in [True, 'true', 1, '1', 'True']
+        return super().check_params(data)
 
     def extract_parameters(self, data: dict) -> OereblexParameters:
         return OereblexParameters(**data)
 
-    def prepare_job_files(self, parameters: OereblexParameters) -> OereblexJobFiles:
+    def bypasses_memoized_run(self, parameters: OereblexParameters) -> bool:
+        return super().bypasses_memoized_run(parameters) or parameters.refresh_geolinks
+
+    def memoize_fingerprint_parts(self, parameters: OereblexParameters) -> dict:
+        parts = super().memoize_fingerprint_parts(parameters)
+        parts.update({
+            "oereblex_host": parameters.oereblex_host,
+            "oereblex_canton": parameters.oereblex_canton,
+            "dummy_office_name": parameters.dummy_office_name,
+            "dummy_office_url": parameters.dummy_office_url
+        })
+        return parts
+
+    def prepare_job_files(self, job: JobContext, parameters: OereblexParameters) -> OereblexJobFiles:
         return OereblexJobFiles(
             input_zip_file=self.create_job_file(
+                job,
                 self.zip_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
             ),
             input_xtf_file=self.create_job_file(
+                job,
                 self.input_xtf_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
             ),
             input_log_file=self.create_job_file(
+                job,
                 self.input_log_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
             ),
             output_log_file=self.create_job_file(
+                job,
                 self.output_log_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
             ),
             trafo_result_file=self.create_job_file(
+                job,
                 self.result_xtf_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
             ),
             rss_snippet_file=self.create_job_file(
+                job,
                 self.rss_snippet_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
             ),
             json_snippet_file=self.create_job_file(
+                job,
                 self.json_snippet_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
             ),
             catalog_file=self.create_job_file(
+                job,
                 self.catalog_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
             ),
             oereblex_trafo_result_file=self.create_job_file(
+                job,
                 self.result_oereblex_xml_file_name,
                 parameters.theme_code,
                 parameters.target_basket_id
@@ -460,46 +820,61 @@ class Mgdm2OerebTransformatorOereblex(Mgdm2OerebTransformator):
     def obtain_task_order(self):
         return TaskOrder(
             tasks=[
-                self.task_handle_input_zip,
-                self.task_handle_input_validation,
-                self.task_handle_oereblex,
-                self.task_handle_catalogue,
-                self.task_handle_trafo,
-                self.task_handle_output_validation,
-                self.task_handle_rss_snippet,
-                self.task_handle_json_snippet
+                Task(self.task_handle_input_zip),
+                Task(self.task_handle_input_validation, ['task_handle_input_zip']),
+                Task(self.task_handle_catalogue),
+                Task(self.task_handle_memoize_lookup, ['task_handle_input_zip', 'task_handle_catalogue']),
+                # a memoized run needs no geolinks, so only wait for the lookup when memoizing at all
+                Task(
+                    self.task_handle_oereblex,
+                    ['task_handle_input_zip', 'task_handle_memoize_lookup'] if self.run_cache is not None
+                    else ['task_handle_input_zip']
+                ),
+                Task(self.task_handle_trafo, [
+                    'task_handle_input_zip',
+                    'task_handle_input_validation',
+                    'task_handle_oereblex',
+                    'task_handle_catalogue',
+                    'task_handle_memoize_lookup'
+                ]),
+                Task(self.task_handle_output_validation, ['task_handle_trafo']),
+                Task(self.task_handle_memoize_store, ['task_handle_output_validation']),
+                # job.json has to be published before the feed announces the job
+                Task(self.task_handle_json_snippet, ['task_handle_output_validation']),
+                Task(self.task_handle_rss_snippet, ['task_handle_output_validation', 'task_handle_json_snippet'])
             ]
         )
 
     def task_handle_oereblex(
             self,
             parameters: Parameters | OereblexParameters,
-            job_files: JobFiles | OereblexJobFiles,
+            job: JobContext,
             result: dict,
             task_name: str
     ) -> dict:
+        if self.is_memoized(result):
+            return {f"{task_name}_memoized": True}
         try:
             mgdm2oereb_oereblex_geolink_list_path = os.path.join(
                 self.mgdm2oereb_xsl_path,
                 "{}.oereblex.geolink_list.xsl".format(parameters.model_name)
             )
-
-            oereblex_trafo_result = self.run_oereblex_trafo(
+            result_oereblex_xml_path = os.path.join(job.job_path, self.result_oereblex_xml_file_name)
+            self.run_oereblex_trafo(
                 mgdm2oereb_oereblex_geolink_list_path,
-                job_files.input_xtf_file.result_path,
-                self.result_oereblex_xml_path,
+                job.files.input_xtf_file.result_path,
+                result_oereblex_xml_path,
                 parameters.oereblex_host,
                 parameters.dummy_office_name,
                 parameters.dummy_office_url,
-                self.logger
-            )
-
-            job_files.oereblex_trafo_result_file.save_runtime_file(
-                oereblex_trafo_result
+                self.logger,
+                self.mgdm2oereb_oereblex_python_trafo_path
             )
+            job.files.oereblex_trafo_result_file.save_runtime_file_from(result_oereblex_xml_path)
+            job.files.oereblex_trafo_result_file.publish()
             return {
                 f"{task_name}_status": JobStatus.successful.value,
-                "oereblex_trafo_result": f"/{self.absolute_result_dir}/{job_files.oereblex_trafo_result_file.file_name()}"
+                "oereblex_trafo_result": f"/{self.absolute_result_dir}/{job.files.oereblex_trafo_result_file.file_name()}"
             }
         except Exception as e:
             return {'status': JobStatus.failed.value, 'msg': self.format_exception(e), 'task': task_name}
@@ -507,16 +882,18 @@ class Mgdm2OerebTransformatorOereblex(Mgdm2OerebTransformator):
     def task_handle_trafo(
             self,
             parameters: OereblexParameters,
-            job_files: OereblexJobFiles,
+            job: JobContext,
             result: dict,
             task_name: str
     ) -> dict:
+        if self.is_memoized(result):
+            return self.publish_memoized_trafo_result(job, task_name)
         try:
             trafo_params = {
-                "catalog": job_files.catalog_file.result_path,
+                "catalog": job.files.catalog_file.result_path,
                 "theme_code": parameters.theme_code,
                 "model": parameters.model_name,
-                "oereblex_output": job_files.oereblex_trafo_result_file.result_path,
+                "oereblex_output": job.files.oereblex_trafo_result_file.result_path,
                 "oereblex_host": parameters.oereblex_host,
                 "target_basket_id": parameters.target_basket_id,
                 'xsl_path': self.mgdm2oereb_xsl_path
@@ -525,24 +902,31 @@ class Mgdm2OerebTransformatorOereblex(Mgdm2OerebTransformator):
                 self.mgdm2oereb_xsl_path,
                 '{}.trafo.xsl'.format(parameters.model_name)
             )
-            trafo_result_content = self.transform(
-                xsl_trafo_path,
-                job_files.input_xtf_file.result_path,
-                trafo_params
-            )
-            job_files.trafo_result_file.save_runtime_file(
-                trafo_result_content
+            # the result goes to disk right away, later tasks read the file instead of a result tree in memory
+            job.files.trafo_result_file.save_runtime_file_with(
+                lambda path: self.transform_trafo_result(
+                    parameters.model_name,
+                    xsl_trafo_path,
+                    job.files.input_xtf_file.result_path,
+                    trafo_params,
+                    path
+                )
             )
-            job_files.trafo_result_file.save_result_file(trafo_result_content)
+            job.files.trafo_result_file.publish()
             return {
                 f"{task_name}_status": JobStatus.successful.value,
-                "transformation_result": f"/{self.absolute_result_dir}/{job_files.trafo_result_file.file_name()}"
+                f"{task_name}_chunked": self.use_chunked_trafo(
+                    parameters.model_name,
+                    job.files.input_xtf_file.result_path
+                ),
+                "transformation_result": f"/{self.absolute_result_dir}/{job.files.trafo_result_file.file_name()}"
             }
         except Exception as e:
             return {'status': JobStatus.failed.value, 'msg': self.format_exception(e), 'task': task_name}
 
     def run_oereblex_trafo(self, mgdm2oereb_oereblex_geolink_list_path, xtf_path, result_oereblex_xml_path,
-                           oereblex_host, dummy_office_name, dummy_office_url, logger):
+                           oereblex_host, dummy_office_name, dummy_office_url, logger,
+                           mgdm2oereb_oereblex_python_trafo_path):
         envars = {
             "GEOLINK_LIST_TRAFO_PATH": mgdm2oereb_oereblex_geolink_list_path,
             "XTF_PATH": xtf_path,
@@ -552,7 +936,7 @@ class Mgdm2OerebTransformatorOereblex(Mgdm2OerebTransformator):
             "DUMMY_OFFICE_URL": dummy_office_url,
         }
         envars.update(os.environ)
-        call_args = ["python3", self.mgdm2oereb_oereblex_python_trafo_path]
+        call_args = ["python3", mgdm2oereb_oereblex_python_trafo_path]
         try:
             sub = subprocess.run(
                 call_args,
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.files import file_sha256
+
+
+logger = logging.getLogger(__name__)
+
+TRAFO_RESULT_FILE_NAME = 'trafo_result.xtf'
+OUTPUT_LOG_FILE_NAME = 'output.ili.log'
+
+
+def directory_revision(path):
+    """
+    Derives a revision string from the names, sizes and modification times of all files below `path`. It
+    changes whenever a file is added, removed or touched.
+
+    Args:
+        path (str): The folder, e.g. the mgdm2oereb XSL folder.
+    Returns:
+        str: The revision as hex digest.
+    """
+    digest = hashlib.sha256()
+    for dir_path, dir_names, file_names in sorted(os.walk(path)):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            file_path = os.path.join(dir_path, file_name)
+            stat = os.stat(file_path)
+            digest.update('{}:{}:{}\n'.format(
+                os.path.relpath(file_path, path),
+                stat.st_size,
+                stat.st_mtime_ns
+            ).encode('utf-8'))
+    return digest.hexdigest()
+
+
+_directory_revisions = {}
+_directory_revisions_lock = threading.Lock()
+
+
+def get_directory_revision(path):
+    """
+    Delivers the `directory_revision` of `path`, which is computed once per process instead of walking the
+    folder for every job. A changed folder is picked up when the workers are restarted.
+
+    Args:
+        path (str): The folder, e.g. the mgdm2oereb XSL folder.
+    Returns:
+        str: The revision as hex digest.
+    """
+    with _directory_revisions_lock:
+        if path not in _directory_revisions:
+            _directory_revisions[path] = directory_revision(path)
+        return _directory_revisions[path]
+
+
+class RunCache(object):
+
+    def __init__(self, cache, ttl=604800):
+        """
+        Memoizes successful transformation runs. The trafo result and the output validation log are stored
+        under a fingerprint of everything the transformation depends on (see `create_fingerprint`), so an
+        unchanged resubmission can publish them without running XSLT or the output validation again.
+
+        Args:
+            cache (mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.disk_cache.DiskCache): The cache
+                storage.
+            ttl (int): Seconds a memoized run is reused.
+        """
+        self.cache = cache
+        self.ttl = ttl
+
+    @staticmethod
+    def create_fingerprint(input_xtf_path, catalog_path, parts):
+        """
+        Args:
+            input_xtf_path (str): The local file path of the input XTF.
+            catalog_path (str): The local file path of the used supplement catalogue.
+            parts (dict): All further JSON serializable values the transformation depends on (parameters,
+                XSL revision, ...).
+        Returns:
+            str: The fingerprint of the run.
+        """
+        fingerprint_parts = dict(parts)
+        fingerprint_parts['input_xtf'] = file_sha256(input_xtf_path)
+        fingerprint_parts['catalog'] = file_sha256(catalog_path)
+        return hashlib.sha256(
+            json.dumps(fingerprint_parts, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+
+    def get(self, fingerprint, ttl=None):
+        """
+        Args:
+            fingerprint (str): The fingerprint created by `create_fingerprint`.
+            ttl (int): Seconds the run is reused if this is shorter than the TTL of the cache (default: None =
+                the TTL of the cache).
+        Returns:
+            mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.disk_cache.CacheEntry or None: The memoized
+                run, None if there is no valid one.
+        """
+        if ttl is None or ttl > self.ttl:
+            ttl = self.ttl
+        entry = self.cache.get(fingerprint)
+        if entry is None or entry.age() >= ttl:
+            return None
+        return entry
+
+    def put(self, fingerprint, trafo_result_path, output_log_path, meta=None):
+        """
+        Args:
+            fingerprint (str): The fingerprint created by `create_fingerprint`.
+            trafo_result_path (str): The local file path of the transformation result.
+            output_log_path (str): The local file path of the output validation log.
+            meta (dict): Additional information about the run (e.g. the job which produced it).
+        Returns:
+            mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.disk_cache.CacheEntry: The stored run.
+        """
+        entry = self.cache.put(
+            fingerprint,
+            {
+                TRAFO_RESULT_FILE_NAME: trafo_result_path,
+                OUTPUT_LOG_FILE_NAME: output_log_path
+            },
+            meta
+        )
+        logger.debug('Memoized run {}'.format(fingerprint))
+        return entry
@@ -0,0 +1,66 @@
+import logging
+
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.files import file_sha256
+
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE_NAME = 'validation.log'
+
+
+class ValidationCache(object):
+
+    def __init__(self, cache, ttl=604800):
+        """
+        Caches the logs of the ILI validator by the SHA-256 of the validated XTF and the validation flags.
+        Submitting the same bytes again then does not upload them to the validator a second time.
+
+        Args:
+            cache (mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.disk_cache.DiskCache): The cache
+                storage.
+            ttl (int): Seconds a cached validation result is used.
+        """
+        self.cache = cache
+        self.ttl = ttl
+
+    @staticmethod
+    def create_key(xtf_path, ilivalidator_service_url, all_objects_accessible):
+        """
+        Args:
+            xtf_path (str): The local file path of the XTF which is validated.
+            ilivalidator_service_url (str): The URI to the validation service.
+            all_objects_accessible (bool): The switch passed to the validator.
+        Returns:
+            str: The key identifying the validation.
+        """
+        return 'validation:{}:{}:all_objects_accessible={}'.format(
+            ilivalidator_service_url,
+            file_sha256(xtf_path),
+            bool(all_objects_accessible)
+        )
+
+    def get(self, key):
+        """
+        Args:
+            key (str): The key created by `create_key`.
+        Returns:
+            (str, bool) or None: The path of the cached log and whether the validation failed, None if there
+                is no valid entry.
+        """
+        entry = self.cache.get(key)
+        if entry is None or entry.age() >= self.ttl:
+            return None
+        return entry.file_path(LOG_FILE_NAME), entry.meta.get('failed', True)
+
+    def put(self, key, log_content, failed):
+        """
+        Args:
+            key (str): The key created by `create_key`.
+            log_content (bytes): The log delivered by the validator.
+            failed (bool): Whether the validation failed.
+        Returns:
+            str: The path of the cached log.
+        """
+        entry = self.cache.put(key, {LOG_FILE_NAME: log_content}, {'failed': failed})
+        logger.debug('Cached validation result {}'.format(key))
+        return entry.file_path(LOG_FILE_NAME)
@@ -0,0 +1,163 @@
+import glob
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from lxml import etree as ET
+
+
+logger = logging.getLogger(__name__)
+
+XSL_NAMESPACE = 'http://www.w3.org/1999/XSL/Transform'
+
+
+def stylesheet_dependencies(xsl_path):
+    """
+    Args:
+        xsl_path (str): The local file path of a stylesheet.
+    Returns:
+        list of str: The absolute paths of all stylesheets it includes or imports (also indirectly).
+    """
+    dependencies = []
+    pending = [os.path.abspath(xsl_path)]
+    while pending:
+        path = pending.pop()
+        for element in ET.parse(path).iter('{%s}include' % XSL_NAMESPACE, '{%s}import' % XSL_NAMESPACE):
+            href = element.get('href')
+            if not href or '://' in href:
+                continue
+            dependency = os.path.normpath(os.path.join(os.path.dirname(path), href))
+            if dependency not in dependencies:
+                dependencies.append(dependency)
+                pending.append(dependency)
+    return dependencies
+
+
+class XsltCacheEntry(object):
+
+    def __init__(self, path, dependencies, signature):
+        self.path = path
+        self.dependencies = dependencies
+        self.signature = signature
+        # compiled stylesheets which are not in use by any thread
+        self.idle = []
+
+
+class XsltCache(object):
+
+    def __init__(self, max_size=64):
+        """
+        A process wide cache of compiled XSLT objects. Entries are keyed by the stylesheet path and checked
+        against the modification times of the stylesheet and of all stylesheets it includes or imports, so a
+        changed stylesheet is compiled again on next access. The least recently used entries are evicted when
+        the cache grows beyond `max_size`.
+
+        lxml does not support calling one XSLT object from several threads at once. A compiled stylesheet is
+        therefore checked out for exclusive use (see `checkout`); a thread which finds none idle compiles
+        another one, which is kept for later use.
+
+        Args:
+            max_size (int): The maximum number of stylesheets kept in the cache.
+        """
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def signature(paths):
+        return tuple(os.stat(path).st_mtime_ns for path in paths)
+
+    def is_current(self, entry):
+        try:
+            return self.signature([entry.path] + entry.dependencies) == entry.signature
+        except FileNotFoundError:
+            return False
+
+    @contextmanager
+    def checkout(self, xsl_path):
+        """
+        Delivers a compiled XSLT for a stylesheet for the exclusive use of the calling thread until the
+        context is left. It is compiled if no idle one is cached.
+
+        Args:
+            xsl_path (str): The local file path where the XSL is located.
+        Yields:
+            lxml.etree.XSLT: The compiled stylesheet.
+        """
+        path = os.path.abspath(xsl_path)
+        transform = None
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is not None and self.is_current(entry):
+            with self._lock:
+                self._entries.move_to_end(path)
+                if entry.idle:
+                    transform = entry.idle.pop()
+        else:
+            dependencies = stylesheet_dependencies(path)
+            entry = XsltCacheEntry(path, dependencies, self.signature([path] + dependencies))
+            with self._lock:
+                self._entries[path] = entry
+                self._entries.move_to_end(path)
+                while len(self._entries) > self.max_size:
+                    evicted_path, _ = self._entries.popitem(last=False)
+                    logger.debug('Evicted compiled XSLT {}'.format(evicted_path))
+        if transform is None:
+            transform = ET.XSLT(ET.parse(path))
+        try:
+            yield transform
+        finally:
+            with self._lock:
+                # a stylesheet which changed or was evicted meanwhile is dropped
+                if self._entries.get(path) is entry:
+                    entry.idle.append(transform)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def prewarm(self, xsl_dir, patterns=('*.trafo.xsl',)):
+        """
+        Compiles all stylesheets in `xsl_dir` matching one of the patterns so the first job does not pay
+        for it.
+
+        Args:
+            xsl_dir (str): The folder containing the mgdm2oereb stylesheets.
+            patterns (tuple of str): The glob patterns of the stylesheets which should be compiled.
+        Returns:
+            int: The number of stylesheets which were compiled successfully.
+        """
+        count = 0
+        for pattern in patterns:
+            for xsl_path in sorted(glob.glob(os.path.join(xsl_dir, pattern))):
+                try:
+                    with self.checkout(xsl_path):
+                        count += 1
+                except (OSError, ET.XSLTParseError, ET.XMLSyntaxError) as e:
+                    logger.warning('Could not precompile {}: {}'.format(xsl_path, e))
+        logger.info('Precompiled {} stylesheets from {}'.format(count, xsl_dir))
+        return count
+
+
+def write_result(result, output_path):
+    """
+    Serializes an XSLT result straight to a file, honouring the `xsl:output` of the stylesheet.
+
+    Args:
+        result (lxml.etree._XSLTResultTree): The result of a transformation.
+        output_path (str): The local file path the result is written to.
+    """
+    try:
+        result.write_output(output_path)
+    except LookupError:
+        # lxml cannot stream results of stylesheets without an `xsl:output` encoding
+        with open(output_path, mode='wb') as f:
+            f.write(bytes(result))
+
+
+XSLT_CACHE = XsltCache(int(os.environ.get('MGDM2OEREB_XSLT_CACHE_SIZE', '64')))
@@ -0,0 +1,295 @@
+import io
+import json
+import logging
+from datetime import datetime
+from multiprocessing import dummy
+from typing import Tuple, Any
+
+from pygeoapi.process.base import BaseProcessor
+from pygeoapi.util import JobStatus, DATETIME_FORMAT
+
+from mgdm2oereb_service.job_queue import QUEUE_LANES, QueueTimeout, get_job_queue
+
+
+logger = logging.getLogger(__name__)
+
+# outputs of the mgdm2oereb processes which are stored with the finished job to link its files in the job list
+RESULT_LINK_KEYS = ['used_catalog', 'transformation_result', 'output_validation_log', 'input_xtf']
+
+
+class CustomManagerMixin(object):
+    """
+    The job lifecycle shared by the mgdm2oereb process managers: the job result is delivered as stored (also
+    for failed jobs) and a failing job reports its message through the `status` and `msg` outputs.
+    """
+
+    def query_jobs(self, status: JobStatus = None, process_id: str = None, theme_code: str = None,
+                   target_basket_id: str = None, start: str = None, end: str = None, limit: int = None,
+                   offset: int = 0) -> list:
+        """
+        Get a filtered page of jobs, newest first. This implementation filters the result of `get_jobs`,
+        managers with an indexed storage should override it.
+
+        :param status: job status (default is all)
+        :param process_id: process identifier (default is all)
+        :param theme_code: theme code of the job (default is all)
+        :param target_basket_id: basket id of the job (default is all)
+        :param start: earliest job start (`DATETIME_FORMAT`, inclusive)
+        :param end: latest job start (`DATETIME_FORMAT`, inclusive)
+        :param limit: maximum number of jobs (default is all)
+        :param offset: number of newer jobs which are skipped
+
+        :returns: `list` of jobs
+        """
+
+        criteria = {
+            'process_id': process_id,
+            'theme_code': theme_code,
+            'target_basket_id': target_basket_id
+        }
+        jobs = [
+            job for job in self.get_jobs(status)
+            if all(value is None or job.get(key) == value for key, value in criteria.items())
+            and (start is None or job['job_start_datetime'] >= start)
+            and (end is None or job['job_start_datetime'] <= end)
+        ]
+        jobs.sort(key=lambda k: k['job_start_datetime'], reverse=True)
+        if limit is None:
+            return jobs[offset:]
+        return jobs[offset:offset + limit]
+
+    @staticmethod
+    def result_links(outputs: dict) -> dict:
+        """
+        Picks the file links of a mgdm2oereb result, so the job list does not have to read the result file.
+
+        :param outputs: `dict` of process outputs
+
+        :returns: `dict` of output name and link
+        """
+
+        return {key: outputs[key] for key in RESULT_LINK_KEYS if outputs.get(key)}
+
+    @property
+    def job_queue(self):
+        return get_job_queue()
+
+    @staticmethod
+    def queue_lane(data_dict: dict) -> str:
+        """
+        The queue lane requested by the `priority` input of a job (default is the first lane)
+
+        :param data_dict: `dict` of data parameters
+
+        :returns: name of the lane
+        """
+
+        priority = data_dict.get('priority')
+        return priority if priority in QUEUE_LANES else QUEUE_LANES[0]
+
+    def _execute_handler_async(self, p: BaseProcessor, job_id: str,
+                               data_dict: dict) -> Tuple[str, None, JobStatus]:
+        """
+        Asynchronous execution handler, which admits the job to the queue
+        before it is accepted. The job waits for a slot without a limit.
+
+        :param p: `pygeoapi.process` object
+        :param job_id: job identifier
+        :param data_dict: `dict` of data parameters
+
+        :returns: tuple of None (i.e. initial response payload)
+                  and JobStatus.accepted (i.e. initial job status)
+
+        :raises: `mgdm2oereb_service.job_queue.QueueFull` if the queue is full
+        """
+
+        if self.job_queue is not None:
+            self.job_queue.enqueue(job_id, self.queue_lane(data_dict))
+        _process = dummy.Process(
+            target=self._execute_handler_sync,
+            args=(p, job_id, data_dict),
+            kwargs={'bounded_wait': False}
+        )
+        _process.start()
+        return 'application/json', None, JobStatus.accepted
+
+    def get_job_result(self, job_id):
+        """
+                Get a job's status, and actual output of executing the process
+                :param jobid: job identifier
+                :returns: `tuple` of mimetype and raw output
+                """
+
+        job_result = self.get_job(job_id)
+        if not job_result:
+            # job does not exist
+            return None
+
+        location = job_result.get('location', None)
+        mimetype = job_result.get('mimetype', None)
+
+        if not location:
+            # Job data was not written for some reason
+            # TODO log/raise exception?
+            return (None,)
+        with io.open(location, 'r', encoding='utf-8') as filehandler:
+            result = filehandler.read()
+        return mimetype, result
+
+    def _execute_handler_sync(self, p: BaseProcessor, job_id: str,
+                              data_dict: dict,
+                              bounded_wait: bool = True) -> Tuple[str, Any, JobStatus]:
+        """
+        Synchronous execution handler
+
+        If the manager has defined `output_dir`, then the result
+        will be written to disk
+        output store. There is no clean-up of old process outputs.
+
+        :param p: `pygeoapi.process` object
+        :param job_id: job identifier
+        :param data_dict: `dict` of data parameters
+        :param bounded_wait: whether the job waits for a slot at most
+                             `max_wait` of the queue (a client is waiting
+                             for the response)
+
+        :returns: tuple of MIME type, response payload and status
+
+        :raises: `mgdm2oereb_service.job_queue.QueueFull` if the queue is full,
+                 `mgdm2oereb_service.job_queue.QueueTimeout` if no slot became
+                 free in time
+        """
+
+        process_id = p.metadata['id']
+        current_status = JobStatus.accepted
+        job_queue = self.job_queue
+        lane = self.queue_lane(data_dict)
+        if job_queue is not None:
+            # a job submitted asynchronously was admitted already
+            job_queue.enqueue(job_id, lane)
+
+        job_metadata = {
+            'identifier': job_id,
+            'process_id': process_id,
+            'job_start_datetime': datetime.utcnow().strftime(
+                DATETIME_FORMAT),
+            'job_end_datetime': None,
+            'status': current_status.value,
+            'location': None,
+            'mimetype': None,
+            'message': 'Job accepted and queued' if job_queue is not None else
+                       'Job accepted and ready for execution',
+            'progress': 5,
+            'theme_code': data_dict.get('theme_code'),
+            'target_basket_id': data_dict.get('target_basket_id'),
+            'queue_lane': lane
+        }
+
+        try:
+            self.add_job(job_metadata)
+        except Exception:
+            if job_queue is not None:
+                job_queue.release(job_id)
+            raise
+
+        try:
+            if job_queue is not None:
+                try:
+                    queue_wait = job_queue.acquire(
+                        job_id, job_queue.max_wait if bounded_wait else None)
+                except QueueTimeout as err:
+                    self.update_job(job_id, {
+                        'job_end_datetime': datetime.utcnow().strftime(
+                            DATETIME_FORMAT),
+                        'status': JobStatus.failed.value,
+                        'message': str(err),
+                        'queue_wait': round(err.wait, 3)
+                    })
+                    raise
+                self.update_job(job_id, {
+                    'status': JobStatus.running.value,
+                    'message': 'Job running',
+                    'progress': 10,
+                    'queue_wait': round(queue_wait, 3)
+                })
+
+            if self.output_dir is not None:
+                filename = f"{p.metadata['id']}-{job_id}"
+                job_filename = self.output_dir / filename
+            else:
+                job_filename = None
+
+            current_status = JobStatus.running
+            jfmt, outputs = p.execute(data_dict)
+
+            self.update_job(job_id, {
+                'status': current_status.value,
+                'message': 'Writing job output',
+                'progress': 95
+            })
+
+            if self.output_dir is not None:
+                logger.debug(f'writing output to {job_filename}')
+                mode = 'w'
+                data = json.dumps(outputs, sort_keys=True, indent=4)
+                encoding = 'utf-8'
+                with job_filename.open(mode=mode, encoding=encoding) as fh:
+                    fh.write(data)
+            if outputs.get('status', False):
+                current_status = JobStatus[outputs['status']]
+                message = outputs['msg']
+            else:
+                current_status = JobStatus.successful
+                message = 'Job complete'
+
+            job_update_metadata = {
+                'job_end_datetime': datetime.utcnow().strftime(
+                    DATETIME_FORMAT),
+                'status': current_status.value,
+                'location': str(job_filename),
+                'mimetype': jfmt,
+                'message': message,
+                'progress': 100,
+                'links': self.result_links(outputs)
+            }
+
+            self.update_job(job_id, job_update_metadata)
+
+        except QueueTimeout:
+            raise
+        except Exception as err:
+            # TODO assess correct exception type and description to help users
+            # NOTE, the /results endpoint should return the error HTTP status
+            # for jobs that failed, ths specification says that failing jobs
+            # must still be able to be retrieved with their error message
+            # intact, and the correct HTTP error status at the /results
+            # endpoint, even if the /result endpoint correctly returns the
+            # failure information (i.e. what one might assume is a 200
+            # response).
+
+            current_status = JobStatus.failed
+            code = 'InvalidParameterValue'
+            outputs = {
+                'code': code,
+                'description': 'Error updating job'
+            }
+            logger.error(err)
+            job_metadata = {
+                'job_end_datetime': datetime.utcnow().strftime(
+                    DATETIME_FORMAT),
+                'status': current_status.value,
+                'location': None,
+                'mimetype': None,
+                'message': f'{code}: {outputs["description"]}',
+                'links': {}
+            }
+
+            jfmt = 'application/json'
+
+            self.update_job(job_id, job_metadata)
+
+        finally:
+            if job_queue is not None:
+                job_queue.release(job_id)
+
+        return jfmt, outputs, current_status
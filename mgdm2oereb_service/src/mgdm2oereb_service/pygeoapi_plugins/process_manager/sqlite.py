@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+from pygeoapi.process.manager.base import BaseManager
+from pygeoapi.util import JobStatus
+
+from mgdm2oereb_service.pygeoapi_plugins.process_manager.base import CustomManagerMixin
+
+
+logger = logging.getLogger(__name__)
+
+JOB_COLUMNS = [
+    'identifier',
+    'process_id',
+    'job_start_datetime',
+    'job_end_datetime',
+    'status',
+    'location',
+    'mimetype',
+    'message',
+    'progress',
+    'theme_code',
+    'target_basket_id'
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    identifier TEXT PRIMARY KEY,
+    process_id TEXT,
+    job_start_datetime TEXT,
+    job_end_datetime TEXT,
+    status TEXT,
+    location TEXT,
+    mimetype TEXT,
+    message TEXT,
+    progress INTEGER,
+    theme_code TEXT,
+    target_basket_id TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE INDEX IF NOT EXISTS jobs_process_id ON jobs (process_id);
+CREATE INDEX IF NOT EXISTS jobs_job_start_datetime ON jobs (job_start_datetime);
+CREATE INDEX IF NOT EXISTS jobs_theme_code ON jobs (theme_code, job_start_datetime);
+CREATE INDEX IF NOT EXISTS jobs_target_basket_id ON jobs (target_basket_id, job_start_datetime);
+"""
+
+
+class SQLiteManager(CustomManagerMixin, BaseManager):
+
+    def __init__(self, manager_def: dict):
+        """
+        A process manager which keeps the jobs in SQLite. The database runs in WAL mode, so the job list can
+        be read by all gunicorn workers while a job is written. Updating a job only touches its own row.
+
+        :param manager_def: manager definition
+
+        :returns: `pygeoapi.process.manager.base.BaseManager`
+        """
+
+        super().__init__(manager_def)
+        self.is_async = True
+        self._schema_created = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        if not self._schema_created:
+            with self._lock:
+                if not self._schema_created:
+                    os.makedirs(os.path.dirname(self.connection) or '.', exist_ok=True)
+                    with closing(sqlite3.connect(self.connection, timeout=30)) as connection:
+                        connection.execute('PRAGMA journal_mode=WAL')
+                        self._migrate(connection)
+                        connection.executescript(SCHEMA)
+                    self._schema_created = True
+        with closing(sqlite3.connect(self.connection, timeout=30)) as connection:
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with connection:
+                yield connection
+
+    @staticmethod
+    def _migrate(connection: sqlite3.Connection):
+        # job tables created before theme code and basket id got their own columns
+        columns = [row[1] for row in connection.execute('PRAGMA table_info(jobs)')]
+        if columns:
+            for column in ['theme_code', 'target_basket_id']:
+                if column not in columns:
+                    connection.execute(f'ALTER TABLE jobs ADD COLUMN {column} TEXT')
+
+    @staticmethod
+    def _split(job_metadata: dict) -> dict:
+        row = {column: job_metadata[column] for column in JOB_COLUMNS if column in job_metadata}
+        extra = {key: value for key, value in job_metadata.items() if key not in JOB_COLUMNS}
+        if extra:
+            row['extra'] = json.dumps(extra)
+        return row
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> dict:
+        job = {column: row[column] for column in JOB_COLUMNS}
+        if row['extra']:
+            job.update(json.loads(row['extra']))
+        return job
+
+    def get_jobs(self, status: JobStatus = None) -> list:
+        """
+        Get jobs
+
+        :param status: job status (accepted, running, successful,
+                       failed, results) (default is all)
+
+        :returns: 'list` of jobs (identifier, status, process identifier)
+        """
+
+        return self.query_jobs(status)
+
+    def query_jobs(self, status: JobStatus = None, process_id: str = None, theme_code: str = None,
+                   target_basket_id: str = None, start: str = None, end: str = None, limit: int = None,
+                   offset: int = 0) -> list:
+        """
+        Get a filtered page of jobs, newest first, from the indexed columns
+
+        :param status: job status (default is all)
+        :param process_id: process identifier (default is all)
+        :param theme_code: theme code of the job (default is all)
+        :param target_basket_id: basket id of the job (default is all)
+        :param start: earliest job start (`DATETIME_FORMAT`, inclusive)
+        :param end: latest job start (`DATETIME_FORMAT`, inclusive)
+        :param limit: maximum number of jobs (default is all)
+        :param offset: number of newer jobs which are skipped
+
+        :returns: `list` of jobs
+        """
+
+        conditions = []
+        parameters = []
+        for column, value in [
+            ('status', JobStatus(status).value if status is not None else None),
+            ('process_id', process_id),
+            ('theme_code', theme_code),
+            ('target_basket_id', target_basket_id)
+        ]:
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                parameters.append(value)
+        if start is not None:
+            conditions.append('job_start_datetime >= ?')
+            parameters.append(start)
+        if end is not None:
+            conditions.append('job_start_datetime <= ?')
+            parameters.append(end)
+        query = 'SELECT * FROM jobs'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY job_start_datetime DESC, identifier LIMIT ? OFFSET ?'
+        parameters += [-1 if limit is None else limit, offset]
+        with self._connect() as connection:
+            rows = connection.execute(query, parameters).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def add_job(self, job_metadata: dict) -> str:
+        """
+        Add a job
+
+        :param job_metadata: `dict` of job metadata
+
+        :returns: identifier of added job
+        """
+
+        row = self._split(job_metadata)
+        with self._connect() as connection:
+            connection.execute(
+                'INSERT INTO jobs ({}) VALUES ({})'.format(
+                    ', '.join(row.keys()),
+                    ', '.join('?' for column in row)
+                ),
+                list(row.values())
+            )
+        return job_metadata['identifier']
+
+    def update_job(self, job_id: str, update_dict: dict) -> bool:
+        """
+        Updates a job
+
+        :param job_id: job identifier
+        :param update_dict: `dict` of property updates
+
+        :returns: `bool` of status result
+        """
+
+        with self._connect() as connection:
+            row = connection.execute('SELECT extra FROM jobs WHERE identifier = ?', (job_id,)).fetchone()
+            if row is None:
+                return False
+            update = self._split(update_dict)
+            if 'extra' in update:
+                extra = json.loads(row['extra']) if row['extra'] else {}
+                extra.update(json.loads(update['extra']))
+                update['extra'] = json.dumps(extra)
+            if update:
+                connection.execute(
+                    'UPDATE jobs SET {} WHERE identifier = ?'.format(
+                        ', '.join(f'{column} = ?' for column in update)
+                    ),
+                    list(update.values()) + [job_id]
+                )
+        return True
+
+    def delete_job(self, job_id: str) -> bool:
+        """
+        Deletes a job
+
+        :param job_id: job identifier
+
+        :return `bool` of status result
+        """
+
+        job_result = self.get_job(job_id)
+        if job_result:
+            location = job_result.get('location')
+            if location and self.output_dir is not None:
+                Path(location).unlink(missing_ok=True)
+        with self._connect() as connection:
+            removed = connection.execute('DELETE FROM jobs WHERE identifier = ?', (job_id,)).rowcount
+        return bool(removed)
+
+    def get_job(self, job_id: str) -> dict:
+        """
+        Get a single job
+
+        :param job_id: job identifier
+
+        :returns: `dict`  # `pygeoapi.process.manager.Job`
+        """
+
+        with self._connect() as connection:
+            row = connection.execute('SELECT * FROM jobs WHERE identifier = ?', (job_id,)).fetchone()
+        return self._to_job(row) if row is not None else None
+
+    def __repr__(self):
+        return '<SQLiteManager> {}'.format(self.name)
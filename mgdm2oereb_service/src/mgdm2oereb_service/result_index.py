@@ -0,0 +1,340 @@
+import datetime
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+JOB_FILE_NAME_PATTERN = re.compile(
+    r'^[^.]+\..+\.(?P<job_id>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})\.(?P<name>[^/]+)$'
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    theme_code TEXT,
+    target_basket_id TEXT,
+    created TEXT,
+    finished TEXT,
+    successful INTEGER
+);
+CREATE TABLE IF NOT EXISTS files (
+    job_id TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    PRIMARY KEY (job_id, file_name)
+);
+CREATE TABLE IF NOT EXISTS feed_items (
+    sequence INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL UNIQUE,
+    item TEXT NOT NULL,
+    published TEXT NOT NULL,
+    added TEXT
+);
+CREATE INDEX IF NOT EXISTS feed_items_published ON feed_items (published);
+"""
+
+
+class ResultIndex(object):
+
+    def __init__(self, path):
+        """
+        A small SQLite index of the published job files, so the result routes do not have to scan the whole
+        results folder. A connection is opened per operation, which keeps the index usable from the task
+        threads of a job and from every gunicorn worker.
+
+        Args:
+            path (str): The path of the SQLite file (the folder is created if missing).
+        """
+        self.path = path
+        self._schema_created = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connect(self):
+        if not self._schema_created:
+            with self._lock:
+                if not self._schema_created:
+                    os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                    with closing(sqlite3.connect(self.path, timeout=30)) as connection:
+                        connection.execute('PRAGMA journal_mode=WAL')
+                        self._migrate(connection)
+                        connection.executescript(SCHEMA)
+                    self._schema_created = True
+        with closing(sqlite3.connect(self.path, timeout=30)) as connection:
+            connection.row_factory = sqlite3.Row
+            with connection:
+                yield connection
+
+    @staticmethod
+    def _migrate(connection):
+        # feed items stored before the insertion time got its own column
+        columns = [row[1] for row in connection.execute('PRAGMA table_info(feed_items)')]
+        if columns and 'added' not in columns:
+            connection.execute('ALTER TABLE feed_items ADD COLUMN added TEXT')
+
+    def register_job(self, job_id, theme_code, target_basket_id, created):
+        """
+        Args:
+            job_id (str): The id of the job.
+            theme_code (str): The theme code of the job.
+            target_basket_id (str): The basket id of the job.
+            created (datetime.datetime): The timestamp when the job was created.
+        """
+        with self.connect() as connection:
+            connection.execute(
+                'INSERT OR IGNORE INTO jobs (job_id, theme_code, target_basket_id, created) VALUES (?, ?, ?, ?)',
+                (job_id, theme_code, target_basket_id, created.isoformat())
+            )
+
+    def register_file(self, job_id, file_name):
+        """
+        Args:
+            job_id (str): The id of the job.
+            file_name (str): The name of the published file in the results folder.
+        """
+        with self.connect() as connection:
+            connection.execute('INSERT OR IGNORE INTO jobs (job_id) VALUES (?)', (job_id,))
+            connection.execute(
+                'INSERT OR IGNORE INTO files (job_id, file_name) VALUES (?, ?)',
+                (job_id, file_name)
+            )
+
+    def finish_job(self, job_id, successful, finished=None):
+        """
+        Marks a job as finished. The files of a finished job do not change anymore.
+
+        Args:
+            job_id (str): The id of the job.
+            successful (bool): Whether the job was successful.
+            finished (datetime.datetime): When the job finished (default: now).
+        """
+        finished = finished or datetime.datetime.now()
+        with self.connect() as connection:
+            connection.execute('INSERT OR IGNORE INTO jobs (job_id) VALUES (?)', (job_id,))
+            connection.execute(
+                'UPDATE jobs SET finished = ?, successful = ? WHERE job_id = ?',
+                (finished.isoformat(), int(bool(successful)), job_id)
+            )
+
+    def get_job(self, job_id):
+        """
+        Args:
+            job_id (str): The id of the job.
+        Returns:
+            dict or None: The indexed job or None if it is unknown.
+        """
+        with self.connect() as connection:
+            row = connection.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def get_files(self, job_id):
+        """
+        Args:
+            job_id (str): The id of the job.
+        Returns:
+            list of str: The sorted names of the published files of the job.
+        """
+        with self.connect() as connection:
+            rows = connection.execute(
+                'SELECT file_name FROM files WHERE job_id = ? ORDER BY file_name',
+                (job_id,)
+            ).fetchall()
+        return [row['file_name'] for row in rows]
+
+    def get_latest_successful_jobs(self):
+        """
+        Returns:
+            set of str: The ids of the newest successful job of every theme code and basket id.
+        """
+        with self.connect() as connection:
+            # SQLite takes the bare job_id from the row holding the MAX
+            rows = connection.execute(
+                'SELECT job_id, MAX(finished) FROM jobs '
+                'WHERE successful = 1 AND theme_code IS NOT NULL AND target_basket_id IS NOT NULL '
+                'GROUP BY theme_code, target_basket_id'
+            ).fetchall()
+        return {row['job_id'] for row in rows}
+
+    def get_unfinished_jobs(self):
+        """
+        Returns:
+            set of str: The ids of the jobs which are not finished (running or died before they finished).
+        """
+        with self.connect() as connection:
+            rows = connection.execute('SELECT job_id FROM jobs WHERE finished IS NULL').fetchall()
+        return {row['job_id'] for row in rows}
+
+    def remove_job(self, job_id):
+        """
+        Removes a job with its files and its feed item from the index. The files themselves are not touched.
+
+        Args:
+            job_id (str): The id of the job.
+        """
+        with self.connect() as connection:
+            connection.execute('DELETE FROM files WHERE job_id = ?', (job_id,))
+            connection.execute('DELETE FROM feed_items WHERE job_id = ?', (job_id,))
+            connection.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+
+    def add_feed_item(self, job_id, item, published):
+        """
+        Adds the RSS item of a job to the feed. Items are stored as published by the job (with links relative
+        to the service root). Besides `published` (the pubDate, which orders the feed) the time the item is
+        added is stored, a job which started earlier may finish later.
+
+        Args:
+            job_id (str): The id of the job.
+            item (str): The RSS `<item>` of the job.
+            published (datetime.datetime): When the job was published.
+        """
+        with self.connect() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO feed_items (job_id, item, published, added) VALUES (?, ?, ?, ?)',
+                (
+                    job_id,
+                    item,
+                    self.utc(published).isoformat(),
+                    datetime.datetime.now(datetime.timezone.utc).isoformat()
+                )
+            )
+
+    def get_feed_state(self):
+        """
+        Delivers a cheap summary of the feed which changes whenever an item is added or removed.
+
+        Returns:
+            (int, int, datetime.datetime): The number of items, the highest item sequence and when the last
+                item was added (None for an empty feed).
+        """
+        with self.connect() as connection:
+            count, sequence, added = connection.execute(
+                'SELECT COUNT(*), MAX(sequence), MAX(COALESCE(added, published)) FROM feed_items'
+            ).fetchone()
+        if added is not None:
+            added = datetime.datetime.fromisoformat(added)
+        return count, sequence or 0, added
+
+    def get_feed_items(self, limit, offset=0):
+        """
+        Args:
+            limit (int): The maximum number of items.
+            offset (int): The number of newer items which are skipped.
+        Returns:
+            list of str: The RSS items, newest first.
+        """
+        with self.connect() as connection:
+            rows = connection.execute(
+                'SELECT item FROM feed_items ORDER BY published DESC, sequence DESC LIMIT ? OFFSET ?',
+                (limit, offset)
+            ).fetchall()
+        return [row['item'] for row in rows]
+
+    @staticmethod
+    def utc(timestamp):
+        return timestamp.astimezone(datetime.timezone.utc)
+
+    def index_directory(self, data_path):
+        """
+        Indexes the job files of a flat results folder (the layout used before this index existed). The jobs
+        found are marked as finished. Theme code and basket id are taken from the job's `job.json` if present.
+        The jobs' `rss.xml` snippets are added to the feed.
+
+        Args:
+            data_path (str): The results folder.
+        Returns:
+            int: The number of indexed files.
+        """
+        jobs = {}
+        count = 0
+        with os.scandir(data_path) as entries:
+            for entry in entries:
+                match = JOB_FILE_NAME_PATTERN.match(entry.name)
+                if match is None or not entry.is_file():
+                    continue
+                job = jobs.setdefault(
+                    match.group('job_id'),
+                    {'files': [], 'mtime': 0, 'job_json': None, 'rss_xml': None}
+                )
+                job['files'].append(entry.name)
+                job['mtime'] = max(job['mtime'], entry.stat().st_mtime)
+                if match.group('name') == 'job.json':
+                    job['job_json'] = entry.path
+                elif match.group('name') == 'rss.xml':
+                    job['rss_xml'] = entry.path
+        for job_id, job in jobs.items():
+            job_info = {}
+            if job['job_json'] is not None:
+                try:
+                    with open(job['job_json'], encoding='utf-8') as fh:
+                        job_info = json.load(fh)
+                except (OSError, ValueError):
+                    logger.warning(f'Could not read {job["job_json"]}')
+            timestamp = datetime.datetime.fromtimestamp(job['mtime'])
+            with self.connect() as connection:
+                connection.execute(
+                    'INSERT OR IGNORE INTO jobs (job_id, theme_code, target_basket_id, created) '
+                    'VALUES (?, ?, ?, ?)',
+                    (
+                        job_id,
+                        job_info.get('theme_code'),
+                        job_info.get('target_basket_id'),
+                        job_info.get('time_stamp', timestamp.isoformat())
+                    )
+                )
+                connection.execute(
+                    'UPDATE jobs SET finished = COALESCE(finished, ?), successful = COALESCE(successful, ?) '
+                    'WHERE job_id = ?',
+                    (timestamp.isoformat(), job_info.get('successful'), job_id)
+                )
+                connection.executemany(
+                    'INSERT OR IGNORE INTO files (job_id, file_name) VALUES (?, ?)',
+                    [(job_id, file_name) for file_name in job['files']]
+                )
+            if job['rss_xml'] is not None:
+                item = self.read_feed_item(job['rss_xml'])
+                if item is not None:
+                    published = timestamp
+                    if job_info.get('time_stamp'):
+                        published = datetime.datetime.fromisoformat(job_info['time_stamp'])
+                    self.add_feed_item(job_id, item, published)
+            count += len(job['files'])
+        return count
+
+    @staticmethod
+    def read_feed_item(path):
+        try:
+            with open(path, encoding='utf-8') as fh:
+                item = fh.read()
+            etree.fromstring(item)
+        except (OSError, etree.XMLSyntaxError):
+            logger.warning(f'Was not a valid XML file {path}. Skipping it...')
+            return None
+        return item
+
+
+_result_indexes = {}
+_result_indexes_lock = threading.Lock()
+
+
+def get_result_index():
+    """
+    Delivers the result index configured by `MGDM2OEREB_RESULT_INDEX` (default: `.index/results.sqlite` in the
+    results folder, so it lives on the same volume as the files it describes).
+
+    Returns:
+        ResultIndex: The result index of this process.
+    """
+    path = os.environ.get(
+        'MGDM2OEREB_RESULT_INDEX',
+        os.path.join(os.environ.get('MGDM2OEREB_DATA', '/data'), '.index', 'results.sqlite')
+    )
+    with _result_indexes_lock:
+        if path not in _result_indexes:
+            _result_indexes[path] = ResultIndex(path)
+        return _result_indexes[path]
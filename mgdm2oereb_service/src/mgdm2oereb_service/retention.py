@@ -0,0 +1,383 @@
+import fcntl
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable
+
+from pygeoapi.util import DATETIME_FORMAT, JobStatus
+
+from mgdm2oereb_service.result_index import JOB_FILE_NAME_PATTERN, get_result_index
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_KINDS = ['working', 'results', 'outputs']
+WORKING_DIR_PATTERN = re.compile(r'^working_[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+# `<process id>-<job id>`, the output directory of the manager may be shared (e.g. /tmp)
+OUTPUT_FILE_PATTERN = re.compile(r'^[\w.-]+-[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+FINISHED_STATUSES = [JobStatus.successful.value, JobStatus.failed.value, JobStatus.dismissed.value]
+LOCK_FILE_NAME = '.retention.lock'
+
+
+@dataclass
+class RetentionPolicy:
+    # seconds, 0 keeps artifacts regardless of their age
+    max_age: float = 0
+    # bytes of all artifacts of the kind, 0 is no limit
+    max_bytes: int = 0
+
+
+@dataclass
+class Artifact:
+    kind: str
+    key: str
+    size: int
+    mtime: float
+    remove: Callable = field(repr=False)
+    protected: bool = False
+
+    def age(self, now):
+        return now - self.mtime
+
+
+def tree_usage(path):
+    """
+    Args:
+        path (str): A file or folder.
+    Returns:
+        (int, float): The bytes used by the files below `path` and their newest modification time. A file
+            with several hard links (e.g. a published result and its runtime file) counts with its share per
+            link, so the usage of all swept folders together adds up to what is used on disk.
+    """
+    stat = os.lstat(path)
+    if not os.path.isdir(path):
+        return stat.st_size // max(1, stat.st_nlink), stat.st_mtime
+    size = 0
+    mtime = stat.st_mtime
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                stat = os.lstat(os.path.join(dir_path, file_name))
+            except FileNotFoundError:
+                continue
+            size += stat.st_size // max(1, stat.st_nlink)
+            mtime = max(mtime, stat.st_mtime)
+    return size, mtime
+
+
+def remove_files(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def parse_job_datetime(value):
+    return datetime.strptime(value, DATETIME_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+
+
+class RetentionSweeper(object):
+
+    def __init__(self, job_dir, data_path, result_index, manager=None, policies=None, quota=0, grace=3600):
+        """
+        Removes old artifacts of the service: the working dirs of the jobs (`working`), the published job files
+        (`results`) and the outputs of the process manager (`outputs`). Artifacts older than the `max_age` of
+        their kind are removed, then the oldest ones until their kind fits its `max_bytes` and finally the
+        oldest ones of all kinds until everything fits `quota`. The newest successful result of every basket
+        is never removed, nor is anything younger than `grace` or the working dir of a job which is not finished
+        in the result index.
+
+        Args:
+            job_dir (str): The root of the working dirs.
+            data_path (str): The results folder.
+            result_index (mgdm2oereb_service.result_index.ResultIndex): The index of the results folder, swept
+                jobs are removed from it and from the feed.
+            manager (pygeoapi.process.manager.base.BaseManager): The process manager (default: None = its
+                outputs are not swept).
+            policies (dict): The `RetentionPolicy` of every kind in `ARTIFACT_KINDS` (default: keep).
+            quota (int): The bytes all artifacts may use together (default: 0 = no quota).
+            grace (float): Seconds an artifact is kept in any case.
+        """
+        self.job_dir = job_dir
+        self.data_path = data_path
+        self.result_index = result_index
+        self.manager = manager
+        self.policies = {kind: (policies or {}).get(kind, RetentionPolicy()) for kind in ARTIFACT_KINDS}
+        self.quota = quota
+        self.grace = grace
+
+    def collect_working(self, now):
+        artifacts = []
+        if not os.path.isdir(self.job_dir):
+            return artifacts
+        unfinished = self.result_index.get_unfinished_jobs()
+        max_age = self.policies['working'].max_age
+        with os.scandir(self.job_dir) as entries:
+            for entry in entries:
+                if not WORKING_DIR_PATTERN.match(entry.name) or not entry.is_dir(follow_symlinks=False):
+                    continue
+                try:
+                    size, mtime = tree_usage(entry.path)
+                except FileNotFoundError:
+                    continue
+                # like the outputs, the dir of an unfinished job is kept until it is older than any may get
+                running = entry.name[len('working_'):] in unfinished and (not max_age or now - mtime < max_age)
+                artifacts.append(Artifact(
+                    'working',
+                    entry.name,
+                    size,
+                    mtime,
+                    lambda path=entry.path: shutil.rmtree(path, ignore_errors=True),
+                    running
+                ))
+        return artifacts
+
+    def collect_results(self, now):
+        jobs = {}
+        if not os.path.isdir(self.data_path):
+            return []
+        with os.scandir(self.data_path) as entries:
+            for entry in entries:
+                match = JOB_FILE_NAME_PATTERN.match(entry.name)
+                if match is None or not entry.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    size, mtime = tree_usage(entry.path)
+                except FileNotFoundError:
+                    continue
+                job = jobs.setdefault(match.group('job_id'), {'paths': [], 'size': 0, 'mtime': 0})
+                job['paths'].append(entry.path)
+                job['size'] += size
+                job['mtime'] = max(job['mtime'], mtime)
+        protected = self.result_index.get_latest_successful_jobs()
+        return [
+            Artifact(
+                'results',
+                job_id,
+                job['size'],
+                job['mtime'],
+                lambda job_id=job_id, paths=job['paths']: self.remove_result(job_id, paths),
+                job_id in protected
+            )
+            for job_id, job in jobs.items()
+        ]
+
+    def remove_result(self, job_id, paths):
+        # the index goes first, so the result routes and the feed never point to removed files
+        self.result_index.remove_job(job_id)
+        remove_files(*paths)
+
+    def collect_outputs(self, now):
+        if self.manager is None:
+            return []
+        artifacts = []
+        locations = set()
+        jobs = self.manager.query_jobs()
+        latest_successful = {}
+        for job in jobs:
+            if job['status'] == JobStatus.successful.value and job.get('target_basket_id'):
+                # jobs are delivered newest first
+                latest_successful.setdefault((job.get('theme_code'), job['target_basket_id']), job['identifier'])
+        protected = set(latest_successful.values())
+        max_age = self.policies['outputs'].max_age
+        for job in jobs:
+            location = job.get('location')
+            size = 0
+            if location and os.path.isfile(location):
+                locations.add(os.path.abspath(location))
+                size = tree_usage(location)[0]
+            mtime = parse_job_datetime(job.get('job_end_datetime') or job['job_start_datetime'])
+            # an unfinished job is kept until it is older than any finished one may get
+            unfinished = job['status'] not in FINISHED_STATUSES and (not max_age or now - mtime < max_age)
+            artifacts.append(Artifact(
+                'outputs',
+                job['identifier'],
+                size,
+                mtime,
+                lambda job_id=job['identifier']: self.manager.delete_job(job_id),
+                job['identifier'] in protected or unfinished
+            ))
+        output_dir = getattr(self.manager, 'output_dir', None)
+        if output_dir is not None and os.path.isdir(output_dir):
+            # outputs of jobs the manager does not know (anymore)
+            with os.scandir(output_dir) as entries:
+                for entry in entries:
+                    if not OUTPUT_FILE_PATTERN.match(entry.name) or not entry.is_file(follow_symlinks=False) \
+                            or os.path.abspath(entry.path) in locations:
+                        continue
+                    size, mtime = tree_usage(entry.path)
+                    artifacts.append(Artifact(
+                        'outputs',
+                        entry.name,
+                        size,
+                        mtime,
+                        lambda path=entry.path: remove_files(path)
+                    ))
+        return artifacts
+
+    def plan(self, artifacts, now):
+        """
+        Args:
+            artifacts (list of Artifact): All artifacts.
+            now (float): The current timestamp.
+        Returns:
+            list of (Artifact, str): The artifacts to remove and why (`age`, `size` or `quota`).
+        """
+        removable = sorted(
+            (artifact for artifact in artifacts if not artifact.protected and artifact.age(now) >= self.grace),
+            key=lambda artifact: artifact.mtime
+        )
+        planned = []
+        planned_keys = set()
+        for kind, policy in self.policies.items():
+            used = sum(artifact.size for artifact in artifacts if artifact.kind == kind)
+            for artifact in removable:
+                if artifact.kind != kind:
+                    continue
+                if policy.max_age and artifact.age(now) > policy.max_age:
+                    reason = 'age'
+                elif policy.max_bytes and used > policy.max_bytes:
+                    reason = 'size'
+                else:
+                    continue
+                planned.append((artifact, reason))
+                planned_keys.add((artifact.kind, artifact.key))
+                used -= artifact.size
+        if self.quota:
+            used = sum(artifact.size for artifact in artifacts if (artifact.kind, artifact.key) not in planned_keys)
+            for artifact in removable:
+                if used <= self.quota:
+                    break
+                if (artifact.kind, artifact.key) in planned_keys:
+                    continue
+                planned.append((artifact, 'quota'))
+                used -= artifact.size
+        return planned
+
+    def sweep(self, now=None, dry_run=False):
+        """
+        Args:
+            now (float): The current timestamp (default: now).
+            dry_run (bool): Only report what would be removed.
+        Returns:
+            dict: Per kind the number of `removed` and `kept` artifacts and the `freed_bytes`.
+        """
+        now = now or time.time()
+        artifacts = self.collect_working(now) + self.collect_results(now) + self.collect_outputs(now)
+        stats = {kind: {'removed': 0, 'kept': 0, 'freed_bytes': 0} for kind in ARTIFACT_KINDS}
+        for artifact in artifacts:
+            stats[artifact.kind]['kept'] += 1
+        for artifact, reason in self.plan(artifacts, now):
+            if not dry_run:
+                try:
+                    artifact.remove()
+                except OSError as e:
+                    logger.warning('Could not remove {} {}: {}'.format(artifact.kind, artifact.key, e))
+                    continue
+            logger.info('{} {} {} ({}, {} bytes)'.format(
+                'Would remove' if dry_run else 'Removed',
+                artifact.kind,
+                artifact.key,
+                reason,
+                artifact.size
+            ))
+            stats[artifact.kind]['removed'] += 1
+            stats[artifact.kind]['kept'] -= 1
+            stats[artifact.kind]['freed_bytes'] += artifact.size
+        return stats
+
+    def sweep_if_due(self, interval, dry_run=False):
+        """
+        Sweeps unless another process is sweeping right now or the last sweep was less than `interval` ago.
+        The time of the last sweep is kept in a lock file in the job folder, so all workers of the service
+        and the CLI share it.
+
+        Args:
+            interval (float): Seconds between two sweeps.
+            dry_run (bool): Only report what would be removed.
+        Returns:
+            dict or None: The statistics of the sweep, None if no sweep was due.
+        """
+        os.makedirs(self.job_dir, exist_ok=True)
+        with open(os.path.join(self.job_dir, LOCK_FILE_NAME), 'a+') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            lock_file.seek(0)
+            last_sweep = lock_file.read().strip()
+            if last_sweep and time.time() - float(last_sweep) < interval:
+                return None
+            stats = self.sweep(dry_run=dry_run)
+            if not dry_run:
+                lock_file.truncate(0)
+                lock_file.write(str(time.time()))
+            return stats
+
+
+def retention_policy(kind, max_age, max_bytes):
+    prefix = 'MGDM2OEREB_RETENTION_{}'.format(kind.upper())
+    return RetentionPolicy(
+        float(os.environ.get('{}_MAX_AGE'.format(prefix), max_age)),
+        int(os.environ.get('{}_MAX_BYTES'.format(prefix), max_bytes))
+    )
+
+
+def get_retention_sweeper(manager=None):
+    """
+    Delivers the sweeper configured by the environment:
+
+    - `MGDM2OEREB_RETENTION_<KIND>_MAX_AGE` and `MGDM2OEREB_RETENTION_<KIND>_MAX_BYTES` per kind (`WORKING`:
+      one day, `RESULTS`: forever, `OUTPUTS`: 30 days, no size limits)
+    - `MGDM2OEREB_RETENTION_QUOTA` for all artifacts together (default: 0 = no quota)
+    - `MGDM2OEREB_RETENTION_GRACE` seconds during which nothing is removed (default: one hour)
+
+    Args:
+        manager (pygeoapi.process.manager.base.BaseManager): The process manager whose outputs are swept.
+    Returns:
+        RetentionSweeper: The sweeper.
+    """
+    return RetentionSweeper(
+        os.environ.get('MGDM2OEREB_JOB', '/job'),
+        os.environ.get('MGDM2OEREB_DATA', '/data'),
+        get_result_index(),
+        manager,
+        {
+            'working': retention_policy('working', str(24 * 3600), '0'),
+            'results': retention_policy('results', '0', '0'),
+            'outputs': retention_policy('outputs', str(30 * 24 * 3600), '0')
+        },
+        quota=int(os.environ.get('MGDM2OEREB_RETENTION_QUOTA', '0')),
+        grace=float(os.environ.get('MGDM2OEREB_RETENTION_GRACE', '3600'))
+    )
+
+
+def start_background_sweeper(interval, manager=None):
+    """
+    Starts a daemon thread which sweeps every `interval` seconds. Every gunicorn worker may start one, the
+    lock of `RetentionSweeper.sweep_if_due` lets only one of them sweep per interval.
+
+    Args:
+        interval (float): Seconds between two sweeps.
+        manager (pygeoapi.process.manager.base.BaseManager): The process manager whose outputs are swept.
+    Returns:
+        threading.Thread: The started thread.
+    """
+    def run():
+        sweeper = get_retention_sweeper(manager)
+        while True:
+            # checking more often than the interval keeps the sweeps close to it, whichever worker wins
+            time.sleep(min(interval, 300))
+            try:
+                sweeper.sweep_if_due(interval)
+            except Exception:
+                logger.exception('Retention sweep failed')
+
+    thread = threading.Thread(target=run, name='retention-sweeper', daemon=True)
+    thread.start()
+    return thread
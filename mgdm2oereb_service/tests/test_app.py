@@ -0,0 +1,133 @@
+import datetime
+import os
+
+import pytest
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config')
+os.environ.setdefault('PYGEOAPI_CONFIG', os.path.join(CONFIG_PATH, 'pygeoapi_config.yml'))
+os.environ.setdefault('PYGEOAPI_OPENAPI', os.path.join(CONFIG_PATH, 'pygeoapi_openapi.yml'))
+
+from mgdm2oereb_service import app as app_module  # noqa: E402
+
+FILE_NAME = '2024-01-01_000000.ch.Planungszonen.b1.48baf201-3d21-49d1-af93-01ca709dfe49.OeREBKRMtrsfr_V2_0.xtf'
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    data_path = tmp_path / 'data'
+    data_path.mkdir()
+    (data_path / FILE_NAME).write_bytes(b'<TRANSFER>0123456789</TRANSFER>')
+    monkeypatch.setattr(app_module, 'DATA_PATH', str(data_path))
+    monkeypatch.setenv('MGDM2OEREB_RESULT_INDEX', str(tmp_path / 'results.sqlite'))
+    monkeypatch.setenv('MGDM2OEREB_QUEUE', str(tmp_path / 'queue.sqlite'))
+    monkeypatch.setenv('MGDM2OEREB_QUEUE_CONCURRENCY', '2')
+    return app_module.app.test_client()
+
+
+def test_results_file_conditional_and_range(client):
+    response = client.get(f'/mgdm2oereb_results/{FILE_NAME}')
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    etag = response.headers['ETag']
+    assert client.get(f'/mgdm2oereb_results/{FILE_NAME}', headers={'If-None-Match': etag}).status_code == 304
+    partial = client.get(f'/mgdm2oereb_results/{FILE_NAME}', headers={'Range': 'bytes=10-13'})
+    assert partial.status_code == 206
+    assert partial.data == b'0123'
+
+
+def test_results_index_is_revalidated(client):
+    from mgdm2oereb_service.result_index import get_result_index
+    result_index = get_result_index()
+    result_index.register_job('job-1', 'ch.Planungszonen', 'b1', datetime.datetime(2024, 1, 1))
+    result_index.register_file('job-1', FILE_NAME)
+    result_index.finish_job('job-1', True)
+    response = client.get('/mgdm2oereb_results/job-1/index.json')
+    assert response.get_json() == [f'http://localhost/mgdm2oereb_results/{FILE_NAME}']
+    assert response.headers['Cache-Control'] == 'no-cache'
+    etag = response.headers['ETag']
+    assert client.get('/mgdm2oereb_results/job-1/index.json', headers={'If-None-Match': etag}).status_code == 304
+    # once the job is swept its index changes
+    result_index.remove_job('job-1')
+    assert client.get('/mgdm2oereb_results/job-1/index.json', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_results_file_x_accel_redirect(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'RESULTS_OFFLOAD', 'x-accel-redirect')
+    response = client.get(f'/mgdm2oereb_results/{FILE_NAME}')
+    assert response.headers['X-Accel-Redirect'] == f'/internal_results/{FILE_NAME}'
+    assert response.data == b''
+    assert client.get('/mgdm2oereb_results/missing.xtf').status_code == 404
+
+
+def test_results_file_hides_index(client):
+    assert client.get('/mgdm2oereb_results/.index/results.sqlite').status_code == 404
+    assert client.get('/mgdm2oereb_results/missing.xtf').status_code == 404
+
+
+def test_jobs_listing_pages_and_filters(client, tmp_path, monkeypatch):
+    from mgdm2oereb_service import flask_app
+    from mgdm2oereb_service.pygeoapi_plugins.process_manager.sqlite import SQLiteManager
+    manager = SQLiteManager({
+        'name': 'mgdm2oereb_service.pygeoapi_plugins.process_manager.sqlite.SQLiteManager',
+        'connection': str(tmp_path / 'jobs.sqlite'),
+        'output_dir': None
+    })
+    for i, theme_code in enumerate(['ch.Planungszonen', 'ch.Planungszonen', 'ch.Laermempfindlichkeitsstufen']):
+        manager.add_job({
+            'identifier': f'job-{i}',
+            'process_id': 'mgdm2oereb',
+            'job_start_datetime': f'2024-01-0{i + 1}T00:00:00.000000Z',
+            'job_end_datetime': f'2024-01-0{i + 1}T00:01:00.000000Z',
+            'status': 'successful',
+            'location': None,
+            'mimetype': 'application/json',
+            'message': 'Job complete',
+            'progress': 100,
+            'theme_code': theme_code,
+            'target_basket_id': 'b1',
+            'links': {'transformation_result': f'/mgdm2oereb_results/job-{i}.xtf'}
+        })
+    monkeypatch.setattr(flask_app.api_, 'manager', manager)
+
+    page = client.get('/oapi/jobs?f=json&theme_code=ch.Planungszonen&limit=1').get_json()
+    assert [job['jobID'] for job in page['jobs']] == ['job-1']
+    assert page['jobs'][0]['links'][0]['href'] == '/mgdm2oereb_results/job-1.xtf'
+    next_link = [link['href'] for link in page['links'] if link['rel'] == 'next'][0]
+    assert 'offset=1' in next_link
+    page = client.get('/oapi/jobs?f=json&theme_code=ch.Planungszonen&limit=1&offset=1').get_json()
+    assert [job['jobID'] for job in page['jobs']] == ['job-0']
+    assert not [link for link in page['links'] if link['rel'] == 'next']
+
+    page = client.get('/oapi/jobs?f=json&datetime=2024-01-02T00:00:00Z/..').get_json()
+    assert [job['jobID'] for job in page['jobs']] == ['job-2', 'job-1']
+    assert client.get('/oapi/jobs?f=json&status=unknown').status_code == 400
+
+
+def test_ready_and_queue_full(client, tmp_path, monkeypatch):
+    monkeypatch.setenv('MGDM2OEREB_QUEUE_MAX_DEPTH', '1')
+    monkeypatch.setenv('MGDM2OEREB_TRAFO_CONFIG', os.path.join(CONFIG_PATH, 'mgdm2oereb.yml'))
+    monkeypatch.setenv('MGDM2OEREB_JOB', str(tmp_path / 'job'))
+    response = client.get('/ready')
+    assert response.status_code == 200
+    assert response.get_json()['queue']['queued'] == 0
+    from mgdm2oereb_service.job_queue import get_job_queue
+    get_job_queue().enqueue('waiting', 'bulk')
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert response.get_json()['queue']['lanes']['bulk']['queued'] == 1
+    response = client.post(
+        '/oapi/processes/mgdm2oereb/execution',
+        json={'inputs': {'theme_code': 'ch.Planungszonen'}},
+        headers={'Prefer': 'respond-async'}
+    )
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '60'
+
+
+def test_metrics(client):
+    from mgdm2oereb_service.metrics import observe_task
+    observe_task('mgdm2oereb', 'OeREBKRMtrsfr_V2_0', 'task_handle_trafo', 1.5, {'task_handle_trafo_memoized': True})
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert 'mgdm2oereb_task_duration_seconds_count{model_name="OeREBKRMtrsfr_V2_0",outcome="memoized",' \
+        'process_id="mgdm2oereb",task="task_handle_trafo"} 1.0' in response.get_data(as_text=True)
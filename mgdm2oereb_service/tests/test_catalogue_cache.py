@@ -0,0 +1,119 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+from pygeoapi.process.base import ProcessorExecuteError
+
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.catalogue_cache import CatalogueCache
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.disk_cache import DiskCache
+
+URL = 'https://example.com/supplement.xml'
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.text = content.decode('utf-8')
+        self.headers = headers or {}
+
+
+class FakeSession(object):
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None):
+        self.requests.append(headers)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response() if callable(response) else response
+
+
+def read(path):
+    with open(path, mode='rb') as fh:
+        return fh.read()
+
+
+def test_fetch_hit_and_revalidation(tmp_path):
+    catalogue_cache = CatalogueCache(DiskCache(str(tmp_path)), ttl=600)
+    session = FakeSession(
+        FakeResponse(200, b'<catalogue/>', {'ETag': '"v1"'}),
+        FakeResponse(304)
+    )
+    path, status = catalogue_cache.fetch(URL, session)
+    assert status == 'miss'
+    assert read(path) == b'<catalogue/>'
+    assert catalogue_cache.fetch(URL, session)[1] == 'hit'
+    catalogue_cache.ttl = 0
+    path, status = catalogue_cache.fetch(URL, session)
+    assert status == 'revalidated'
+    assert session.requests[-1] == {'If-None-Match': '"v1"'}
+    assert read(path) == b'<catalogue/>'
+
+
+def test_fetch_entry_evicted_before_revalidation(tmp_path):
+    disk_cache = DiskCache(str(tmp_path))
+    catalogue_cache = CatalogueCache(disk_cache, ttl=0)
+
+    def evicted_meanwhile():
+        disk_cache.delete(URL)
+        return FakeResponse(304)
+
+    session = FakeSession(
+        FakeResponse(200, b'<catalogue/>', {'ETag': '"v1"'}),
+        evicted_meanwhile,
+        FakeResponse(200, b'<catalogue version="2"/>')
+    )
+    catalogue_cache.fetch(URL, session)
+    path, status = catalogue_cache.fetch(URL, session)
+    assert status == 'miss'
+    assert session.requests[-1] is None
+    assert read(path) == b'<catalogue version="2"/>'
+
+
+def test_fetch_stale_if_error(tmp_path):
+    catalogue_cache = CatalogueCache(DiskCache(str(tmp_path)), ttl=0, stale_if_error=600)
+    session = FakeSession(
+        FakeResponse(200, b'<catalogue/>'),
+        FakeResponse(503, b'unavailable'),
+        requests.exceptions.ConnectionError('reset')
+    )
+    catalogue_cache.fetch(URL, session)
+    assert catalogue_cache.fetch(URL, session)[1] == 'stale'
+    assert catalogue_cache.fetch(URL, session)[1] == 'stale'
+
+
+def test_fetch_fails_without_cached_catalogue(tmp_path):
+    catalogue_cache = CatalogueCache(DiskCache(str(tmp_path)))
+    with pytest.raises(ProcessorExecuteError):
+        catalogue_cache.fetch(URL, FakeSession(FakeResponse(503, b'unavailable')))
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=350)
+    cache.put('a', {'file': b'a' * 100})
+    cache.put('b', {'file': b'b' * 100})
+    assert cache.get('a') is not None
+    cache.put('c', {'file': b'c' * 100})
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+
+
+def test_disk_cache_concurrent_puts_of_one_key(tmp_path):
+    cache = DiskCache(str(tmp_path))
+
+    def put(index):
+        for round_index in range(50):
+            entry = cache.put('key', {'file': '{}.{}'.format(index, round_index).encode()})
+            assert entry.meta['key'] == 'key'
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(put, range(4)))
+    assert cache.get('key') is not None
+    assert [name for name in os.listdir(tmp_path) if name.startswith('.')] == []
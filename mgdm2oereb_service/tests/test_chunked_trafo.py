@@ -0,0 +1,112 @@
+from lxml import etree as ET
+
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.chunked_trafo import iter_chunks, transform_chunked
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.xslt_cache import write_result
+
+ILI = 'http://www.interlis.ch/INTERLIS2.3'
+
+TRAFO_XSL = """<?xml version="1.0" encoding="UTF-8"?>
+<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform"
+        xmlns:ili="http://www.interlis.ch/INTERLIS2.3" xmlns="http://www.interlis.ch/INTERLIS2.3">
+    <xsl:output method="xml" indent="yes" encoding="UTF-8"/>
+    <xsl:param name="target_basket_id"/>
+    <xsl:template match="/ili:TRANSFER">
+        <TRANSFER>
+            <HEADERSECTION SENDER="mgdm2oereb" VERSION="2.3"/>
+            <DATASECTION>
+                <OeREBKRMtrsfr_V2_0.Transferstruktur BID="{$target_basket_id}">
+                    <OeREBKRMtrsfr_V2_0.Transferstruktur.Amt TID="amt"><Name>Amt</Name></OeREBKRMtrsfr_V2_0.Transferstruktur.Amt>
+                    <xsl:for-each select="ili:DATASECTION/*/ili:Model.Topic.Zone">
+                        <OeREBKRMtrsfr_V2_0.Transferstruktur.Eigentumsbeschraenkung TID="eb.{@TID}">
+                            <Basket><xsl:value-of select="../@BID"/></Basket>
+                            <Zustaendig REF="amt"/>
+                        </OeREBKRMtrsfr_V2_0.Transferstruktur.Eigentumsbeschraenkung>
+                    </xsl:for-each>
+                </OeREBKRMtrsfr_V2_0.Transferstruktur>
+            </DATASECTION>
+        </TRANSFER>
+    </xsl:template>
+</xsl:stylesheet>"""
+
+
+def write_xtf(path, baskets):
+    content = ''.join(
+        '<Model.Topic BID="{}">{}</Model.Topic>'.format(bid, ''.join(
+            '<Model.Topic.Zone TID="{}"><Name>{}</Name></Model.Topic.Zone>'.format(tid, tid) for tid in tids
+        ))
+        for bid, tids in baskets.items()
+    )
+    path.write_text(
+        '<?xml version="1.0" encoding="UTF-8"?><TRANSFER xmlns="{}"><HEADERSECTION SENDER="test" VERSION="2.3"/>'
+        '<DATASECTION>{}</DATASECTION></TRANSFER>'.format(ILI, content)
+    )
+    return str(path)
+
+
+def objects(path):
+    datasection = ET.parse(path).getroot().find('{%s}DATASECTION' % ILI)
+    return [
+        (basket.get('BID'), ET.QName(obj).localname, obj.get('TID'), ''.join(obj.itertext()).split())
+        for basket in datasection for obj in basket
+    ]
+
+
+def test_iter_chunks_splits_by_basket_and_size(tmp_path):
+    xtf_path = write_xtf(tmp_path / 'input.xtf', {'b1': ['1', '2', '3', '4', '5'], 'b2': ['6'], 'b3': []})
+    chunks = list(iter_chunks(xtf_path, max_objects=2))
+    assert [
+        (chunk.getroot()[1][0].get('BID'), [obj.get('TID') for obj in chunk.getroot()[1][0]]) for chunk in chunks
+    ] == [('b1', ['1', '2']), ('b1', ['3', '4']), ('b1', ['5']), ('b2', ['6']), ('b3', [])]
+    assert all(chunk.getroot()[0].get('SENDER') == 'test' for chunk in chunks)
+
+
+def test_transform_chunked_matches_whole_transformation(tmp_path):
+    (tmp_path / 'trafo.xsl').write_text(TRAFO_XSL)
+    xtf_path = write_xtf(tmp_path / 'input.xtf', {'b1': [str(i) for i in range(7)], 'b2': ['7', '8']})
+    params = {'target_basket_id': 'target'}
+    transform = ET.XSLT(ET.parse(str(tmp_path / 'trafo.xsl')))
+    write_result(transform(ET.parse(xtf_path), **{k: ET.XSLT.strparam(v) for k, v in params.items()}),
+                 str(tmp_path / 'whole.xtf'))
+    chunks = transform_chunked(str(tmp_path / 'trafo.xsl'), xtf_path, params, str(tmp_path / 'chunked.xtf'), 3)
+    assert chunks == 4
+    assert objects(str(tmp_path / 'chunked.xtf')) == objects(str(tmp_path / 'whole.xtf'))
+    assert ET.parse(str(tmp_path / 'chunked.xtf')).getroot()[0].get('SENDER') == 'mgdm2oereb'
+    assert [path.name for path in tmp_path.iterdir() if path.name.startswith('chunks.')] == []
+
+
+BASKET_PER_TOPIC_XSL = """<?xml version="1.0" encoding="UTF-8"?>
+<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform"
+        xmlns:ili="http://www.interlis.ch/INTERLIS2.3" xmlns="http://www.interlis.ch/INTERLIS2.3">
+    <xsl:output method="xml" indent="yes" encoding="UTF-8"/>
+    <xsl:template match="/ili:TRANSFER">
+        <TRANSFER>
+            <HEADERSECTION SENDER="mgdm2oereb" VERSION="2.3"/>
+            <DATASECTION>
+                <OeREBKRMtrsfr_V2_0.Transferstruktur BID="common">
+                    <OeREBKRMtrsfr_V2_0.Transferstruktur.Amt TID="amt"><Name>Amt</Name></OeREBKRMtrsfr_V2_0.Transferstruktur.Amt>
+                </OeREBKRMtrsfr_V2_0.Transferstruktur>
+                <xsl:for-each select="ili:DATASECTION/*">
+                    <OeREBKRMtrsfr_V2_0.Transferstruktur BID="out.{@BID}">
+                        <OeREBKRMtrsfr_V2_0.Transferstruktur.Amt TID="amt.{@BID}"><Name>Amt</Name></OeREBKRMtrsfr_V2_0.Transferstruktur.Amt>
+                        <xsl:for-each select="ili:Model.Topic.Zone">
+                            <OeREBKRMtrsfr_V2_0.Transferstruktur.Eigentumsbeschraenkung TID="eb.{@TID}"/>
+                        </xsl:for-each>
+                    </OeREBKRMtrsfr_V2_0.Transferstruktur>
+                </xsl:for-each>
+            </DATASECTION>
+        </TRANSFER>
+    </xsl:template>
+</xsl:stylesheet>"""
+
+
+def test_transform_chunked_merges_baskets(tmp_path):
+    (tmp_path / 'trafo.xsl').write_text(BASKET_PER_TOPIC_XSL)
+    xtf_path = write_xtf(tmp_path / 'input.xtf', {'b1': ['1', '2', '3'], 'b2': ['4']})
+    transform_chunked(str(tmp_path / 'trafo.xsl'), xtf_path, {}, str(tmp_path / 'chunked.xtf'), 2)
+    assert [(bid, tid) for bid, _, tid, _ in objects(str(tmp_path / 'chunked.xtf'))] == [
+        ('common', 'amt'),
+        ('out.b1', 'amt.b1'), ('out.b1', 'eb.1'), ('out.b1', 'eb.2'), ('out.b1', 'eb.3'),
+        ('out.b2', 'amt.b2'), ('out.b2', 'eb.4')
+    ]
+    # objects are serialized together with their basket, they do not repeat the namespace declarations
+    assert (tmp_path / 'chunked.xtf').read_text().count('xmlns=') == 4
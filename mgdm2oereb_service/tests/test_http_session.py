@@ -0,0 +1,81 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb import http_session
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.http_session import create_session, get_session
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def handle_request(self):
+        self.server.requests.append((self.command, self.path))
+        if self.command == 'POST':
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path == '/slow':
+            time.sleep(0.5)
+        # `/unavailable` answers 503 to the first request, `/down` to every request
+        unavailable = self.path == '/down' or (self.path == '/unavailable' and len(self.server.requests) == 1)
+        self.send_response(503 if unavailable else 200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    do_GET = handle_request
+    do_POST = handle_request
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server, path):
+    return 'http://127.0.0.1:{}{}'.format(server.server_address[1], path)
+
+
+def test_default_timeout(server):
+    session = create_session(read_timeout=0.1, retries=0)
+    assert session.timeout == (10.0, 0.1)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.get(url(server, '/slow'))
+    # an explicit timeout wins
+    assert session.get(url(server, '/slow'), timeout=5).status_code == 200
+
+
+def test_get_is_retried_on_503(server):
+    session = create_session(backoff_factor=0)
+    response = session.get(url(server, '/unavailable'))
+    assert response.status_code == 200
+    assert server.requests == [('GET', '/unavailable')] * 2
+
+
+def test_post_is_not_retried(server):
+    session = create_session(read_timeout=0.1, backoff_factor=0)
+    response = session.post(url(server, '/down'), data=b'xtf')
+    assert response.status_code == 503
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        session.post(url(server, '/slow'), data=b'xtf')
+    assert server.requests == [('POST', '/down'), ('POST', '/slow')]
+
+
+def test_session_per_process(monkeypatch):
+    session = get_session()
+    assert get_session() is session
+    monkeypatch.setattr(http_session.os, 'getpid', lambda: -1)
+    forked_session = get_session()
+    assert forked_session is not session
+    assert get_session() is forked_session
@@ -0,0 +1,77 @@
+import subprocess
+import sys
+
+import pytest
+
+from mgdm2oereb_service.job_queue import JobQueue, QueueFull, QueueTimeout, get_job_queue
+
+
+def create_queue(tmp_path, concurrency=1, max_depth=3):
+    return JobQueue(str(tmp_path / 'queue.sqlite'), concurrency, max_depth, retry_after=30)
+
+
+def test_lanes_and_concurrency(tmp_path):
+    queue = create_queue(tmp_path)
+    queue.enqueue('bulk-1', 'bulk')
+    queue.enqueue('interactive-1', 'interactive')
+    queue.enqueue('interactive-2', 'interactive')
+    assert queue.try_acquire('bulk-1') is None
+    assert queue.try_acquire('interactive-2') is None
+    assert queue.try_acquire('interactive-1') is not None
+    # the only slot is taken
+    assert queue.try_acquire('interactive-2') is None
+    queue.release('interactive-1')
+    assert queue.try_acquire('interactive-2') is not None
+    queue.release('interactive-2')
+    assert queue.acquire('bulk-1') >= 0
+    stats = queue.stats()
+    assert stats['running'] == 1
+    assert stats['lanes']['interactive']['started_jobs'] == 2
+    assert stats['lanes']['bulk']['started_jobs'] == 1
+
+
+def test_queue_full(tmp_path):
+    queue = create_queue(tmp_path, max_depth=2)
+    queue.enqueue('job-1', 'interactive')
+    queue.enqueue('job-2', 'bulk')
+    # enqueuing an admitted job again does not count
+    queue.enqueue('job-1', 'interactive')
+    with pytest.raises(QueueFull) as exc_info:
+        queue.enqueue('job-3', 'interactive')
+    assert exc_info.value.retry_after == 30
+    assert queue.stats()['queued'] == 2
+
+
+def test_acquire_max_wait(tmp_path):
+    queue = create_queue(tmp_path)
+    queue.enqueue('job-1', 'interactive')
+    queue.enqueue('job-2', 'interactive')
+    assert queue.acquire('job-1', max_wait=0.1) >= 0
+    with pytest.raises(QueueTimeout) as exc_info:
+        queue.acquire('job-2', max_wait=0.1)
+    assert exc_info.value.wait >= 0.1
+    assert exc_info.value.retry_after == 30
+    # the job keeps its place in the queue
+    assert queue.stats()['queued'] == 1
+
+
+def test_slots_of_dead_processes_are_freed(tmp_path):
+    queue = create_queue(tmp_path)
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    with queue.connect() as connection:
+        connection.execute(
+            "INSERT INTO slots (job_id, lane, lane_rank, state, pid, enqueued, started) "
+            "VALUES ('dead', 'interactive', 0, 'running', ?, 0, 0)",
+            (process.pid,)
+        )
+    queue.enqueue('job-1', 'interactive')
+    assert queue.try_acquire('job-1') is not None
+
+
+def test_queue_is_disabled_by_default(tmp_path, monkeypatch):
+    monkeypatch.setenv('MGDM2OEREB_QUEUE', str(tmp_path / 'queue.sqlite'))
+    monkeypatch.delenv('MGDM2OEREB_QUEUE_CONCURRENCY', raising=False)
+    assert get_job_queue() is None
+    monkeypatch.setenv('MGDM2OEREB_QUEUE_CONCURRENCY', '8')
+    assert get_job_queue().concurrency == 8
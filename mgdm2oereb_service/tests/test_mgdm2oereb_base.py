@@ -0,0 +1,300 @@
+import base64
+import glob
+import json
+import os
+import shutil
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+import yaml
+from pygeoapi.process.base import ProcessorExecuteError
+from pygeoapi.util import JobStatus
+
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb import Mgdm2OerebTransformatorBase
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.files import PUBLISH_MODES, publish_file
+
+
+def create_zip(path, members):
+    with zipfile.ZipFile(path, mode="w", compression=zipfile.ZIP_DEFLATED) as zip_ref:
+        for name, content in members.items():
+            zip_ref.writestr(name, content)
+    return str(path)
+
+
+def test_iter_decode_input_file_matches_decode_input_file():
+    content = os.urandom(10000)
+    encoded = base64.encodebytes(content).decode('utf-8')
+    for chunk_size in [1, 3, 4, 77, 1024, 100000]:
+        decoded = b''.join(Mgdm2OerebTransformatorBase.iter_decode_input_file(encoded, chunk_size))
+        assert decoded == content
+    assert Mgdm2OerebTransformatorBase.decode_input_file(encoded) == content
+
+
+def test_iter_unzip_input_file(tmp_path):
+    content = os.urandom(5000)
+    zip_path = create_zip(tmp_path / 'input.zip', {'data.xtf': content, 'readme.txt': b'hello'})
+    assert b''.join(Mgdm2OerebTransformatorBase.iter_unzip_input_file(zip_path, chunk_size=1000)) == content
+
+
+@pytest.mark.parametrize('members', [
+    {'readme.txt': b'hello'},
+    {'a.xtf': b'a', 'b.xtf': b'b'}
+])
+def test_iter_unzip_input_file_needs_exactly_one_xtf(tmp_path, members):
+    zip_path = create_zip(tmp_path / 'input.zip', members)
+    with pytest.raises(ProcessorExecuteError):
+        list(Mgdm2OerebTransformatorBase.iter_unzip_input_file(zip_path))
+
+
+def test_iter_unzip_input_file_size_guards(tmp_path):
+    zip_path = create_zip(tmp_path / 'input.zip', {'data.xtf': b'0' * 100000})
+    with pytest.raises(ProcessorExecuteError, match='larger than'):
+        list(Mgdm2OerebTransformatorBase.iter_unzip_input_file(zip_path, max_size=1000))
+    with pytest.raises(ProcessorExecuteError, match='compression ratio'):
+        list(Mgdm2OerebTransformatorBase.iter_unzip_input_file(zip_path, max_ratio=10))
+
+
+@pytest.mark.parametrize('mode', PUBLISH_MODES)
+def test_publish_file(tmp_path, mode):
+    source = tmp_path / 'job' / 'result.xtf'
+    source.parent.mkdir()
+    source.write_bytes(b'<TRANSFER/>')
+    web_folder = tmp_path / 'data'
+    web_folder.mkdir()
+    target = publish_file(str(source), str(web_folder / 'result.xtf'), mode)
+    assert open(target, mode='rb').read() == b'<TRANSFER/>'
+    assert os.listdir(web_folder) == ['result.xtf']
+    assert source.exists() == (mode != 'rename')
+
+
+def test_poll_intervals():
+    intervals = Mgdm2OerebTransformatorBase.poll_intervals(100, 1000, factor=2)
+    assert [next(intervals) for i in range(6)] == [0.1, 0.2, 0.4, 0.8, 1.0, 1.0]
+    intervals = Mgdm2OerebTransformatorBase.poll_intervals(100, 5000, size_hint=20 * 1024 ** 2)
+    assert next(intervals) == 2.0
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, body=None, text=''):
+        self.status_code = status_code
+        self.body = body
+        self.text = text
+
+    def json(self):
+        return self.body
+
+
+class FakeValidatorSession(object):
+
+    def __init__(self, statuses, log_response):
+        self.statuses = list(statuses)
+        self.log_response = log_response
+
+    def post(self, url, files=None):
+        return FakeResponse(201, {'statusUrl': '/status/1'})
+
+    def get(self, url):
+        if url.endswith('/status/1'):
+            status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+            return FakeResponse(200, {'status': status, 'logUrl': '/log/1'})
+        return self.log_response
+
+
+def validate(tmp_path, session, **kwargs):
+    (tmp_path / 'input.xtf').write_bytes(b'<TRANSFER/>')
+    return Mgdm2OerebTransformatorBase.validate(
+        str(tmp_path / 'input.xtf'), 'http://validator', 'input.xtf', min_sleep_time_ms=1, max_sleep_time_ms=10,
+        session=session, **kwargs
+    )
+
+
+def test_validate_delivers_log(tmp_path):
+    validation_result = validate(tmp_path, FakeValidatorSession(
+        ['processing', 'completedWithErrors'],
+        FakeResponse(200, text='Error: ...validation failed')
+    ))
+    assert validation_result.failed
+    assert validation_result.cacheable
+
+
+@pytest.mark.parametrize('status_code', [404, 503])
+def test_validate_fails_without_log(tmp_path, status_code):
+    with pytest.raises(ProcessorExecuteError):
+        validate(tmp_path, FakeValidatorSession(['completed'], FakeResponse(status_code, text='Service Unavailable')))
+
+
+def test_validate_deadline(tmp_path):
+    with pytest.raises(ProcessorExecuteError, match='did not finish within 0.05s') as exc_info:
+        validate(tmp_path, FakeValidatorSession(['processing'], None), deadline_s=0.05)
+    # it waited, but did not sleep past the deadline
+    assert 0 < exc_info.value.wait_time <= 0.05
+    summary = Mgdm2OerebTransformatorBase.validation_error_summary('task_handle_output_validation', exc_info.value)
+    assert summary == {'task_handle_output_validation_validator_wait': round(exc_info.value.wait_time, 3)}
+
+
+TRAFO_XSL = """<?xml version="1.0" encoding="UTF-8"?>
+<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+    <xsl:output method="xml" indent="yes" encoding="UTF-8"/>
+    <xsl:param name="theme_code"/>
+    <xsl:template match="/">
+        <TRANSFER theme="{$theme_code}"><xsl:copy-of select="//Dokument"/></TRANSFER>
+    </xsl:template>
+</xsl:stylesheet>"""
+TRAFO_RESULT = """<?xml version="1.0" encoding="UTF-8"?>
+<TRANSFER theme="ch.Planungszonen">
+  <Dokument id="ä1"/>
+  <Dokument id="2"/>
+</TRANSFER>
+""".encode('utf-8')
+
+
+def test_transform_to_file(tmp_path):
+    (tmp_path / 'trafo.xsl').write_text(TRAFO_XSL)
+    (tmp_path / 'input.xtf').write_text('<DATA><Dokument id="ä1"/><Dokument id="2"/></DATA>', encoding='utf-8')
+    args = (str(tmp_path / 'trafo.xsl'), str(tmp_path / 'input.xtf'), {'theme_code': 'ch.Planungszonen'})
+    output_path = Mgdm2OerebTransformatorBase.transform_to_file(*args, str(tmp_path / 'result.xtf'))
+    assert open(output_path, mode='rb').read() == TRAFO_RESULT
+
+
+def test_transform_to_file_without_output_encoding(tmp_path):
+    (tmp_path / 'trafo.xsl').write_text(TRAFO_XSL.replace(' encoding="UTF-8"/>', '/>'))
+    (tmp_path / 'input.xtf').write_text('<DATA><Dokument id="1"/></DATA>')
+    args = (str(tmp_path / 'trafo.xsl'), str(tmp_path / 'input.xtf'), {'theme_code': 'ch.Planungszonen'})
+    output_path = Mgdm2OerebTransformatorBase.transform_to_file(*args, str(tmp_path / 'result.xtf'))
+    assert open(output_path, mode='rb').read() == b'<?xml version="1.0"?>\n' \
+        b'<TRANSFER theme="ch.Planungszonen">\n  <Dokument id="1"/>\n</TRANSFER>\n'
+
+
+PROCESSOR_DEF = {'name': 'mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.processors.Mgdm2OerebTransformator'}
+OEREBLEX_PROCESSOR_DEF = {
+    'name': 'mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.processors.Mgdm2OerebTransformatorOereblex'
+}
+
+
+@pytest.fixture
+def processor_env(tmp_path, monkeypatch):
+    config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config')
+    monkeypatch.setenv('PYGEOAPI_CONFIG', os.path.join(config_path, 'pygeoapi_config.yml'))
+    monkeypatch.setenv('PYGEOAPI_OPENAPI', os.path.join(config_path, 'pygeoapi_openapi.yml'))
+    trafo_config = tmp_path / 'mgdm2oereb.yml'
+    shutil.copy(os.path.join(config_path, 'mgdm2oereb.yml'), trafo_config)
+    monkeypatch.setenv('MGDM2OEREB_TRAFO_CONFIG', str(trafo_config))
+    monkeypatch.setenv('MGDM2OEREB_JOB', str(tmp_path / 'job'))
+    monkeypatch.setenv('MGDM2OEREB_DATA', str(tmp_path / 'data'))
+    monkeypatch.setenv('MGDM2OEREB_RESULT_INDEX', str(tmp_path / 'results.sqlite'))
+    (tmp_path / 'data').mkdir()
+    return trafo_config
+
+
+def test_processor_instantiation_is_cheap(tmp_path, monkeypatch, processor_env):
+    loads = []
+    safe_load = yaml.safe_load
+    monkeypatch.setattr(yaml, 'safe_load', lambda stream: loads.append(stream.name) or safe_load(stream))
+    from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.processors import Mgdm2OerebTransformator
+
+    first = Mgdm2OerebTransformator(PROCESSOR_DEF)
+    second = Mgdm2OerebTransformator(PROCESSOR_DEF)
+    assert loads == [str(processor_env)]
+    assert first.metadata == second.metadata
+    assert first.metadata is not second.metadata
+    # nothing is written before a job is executed
+    assert glob.glob(str(tmp_path / 'job' / 'working_*')) == []
+    job = first.start_job()
+    assert os.path.isdir(job.job_path)
+    assert first.start_job().job_path != job.job_path
+
+
+def test_metric_model_name(tmp_path, monkeypatch, processor_env):
+    monkeypatch.setenv('MGDM2OEREB_PATH', str(tmp_path / 'mgdm2oereb'))
+    (tmp_path / 'mgdm2oereb' / 'xsl').mkdir(parents=True)
+    (tmp_path / 'mgdm2oereb' / 'xsl' / 'Planungszonen_V1_1.trafo.xsl').write_text(TRAFO_XSL)
+    (tmp_path / 'mgdm2oereb' / 'Secret.trafo.xsl').write_text(TRAFO_XSL)
+    from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.processors import Mgdm2OerebTransformator
+    processor = Mgdm2OerebTransformator(PROCESSOR_DEF)
+    assert processor.metric_model_name('Planungszonen_V1_1') == 'Planungszonen_V1_1'
+    for model_name in ['Unknown_V1_0', '../Secret', '', None]:
+        assert processor.metric_model_name(model_name) == 'other'
+
+
+def test_processor_runs_concurrent_jobs(tmp_path, processor_env):
+    from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.processors import Mgdm2OerebTransformator, \
+        Task, TaskOrder
+    processor = Mgdm2OerebTransformator(PROCESSOR_DEF)
+    both_started = threading.Barrier(2, timeout=5)
+
+    def task_handle_json_snippet(parameters, job, result, task_name):
+        both_started.wait()
+        job.files.json_snippet_file.save_runtime_file(processor.create_json_snippet(
+            job,
+            parameters.theme_code,
+            parameters.model_name,
+            parameters.target_basket_id,
+            JobStatus.successful.value
+        ))
+        job.files.json_snippet_file.publish()
+        return {f"{task_name}_status": JobStatus.successful.value, "job_path": job.job_path}
+
+    processor.obtain_task_order = lambda: TaskOrder(tasks=[Task(task_handle_json_snippet)])
+    data = {
+        'zip_file': '', 'theme_code': 'ch.Planungszonen', 'model_name': 'Model', 'catalog': 'catalog.xml'
+    }
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(
+            lambda target_basket_id: processor.execute(dict(data, target_basket_id=target_basket_id))[1],
+            ['b1', 'b2']
+        ))
+
+    assert [result['task_handle_json_snippet_status'] for result in results] == ['successful'] * 2
+    assert results[0]['job_path'] != results[1]['job_path']
+    snippets = []
+    for path in sorted(glob.glob(str(tmp_path / 'data' / '*.job.json'))):
+        with open(path, encoding='utf-8') as fh:
+            snippets.append(json.load(fh))
+    assert sorted(snippet['target_basket_id'] for snippet in snippets) == ['b1', 'b2']
+    assert snippets[0]['job_id'] != snippets[1]['job_id']
+
+
+def test_oereblex_memoized_runs(processor_env):
+    from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.processors import Mgdm2OerebTransformatorOereblex
+    processor = Mgdm2OerebTransformatorOereblex(OEREBLEX_PROCESSOR_DEF)
+    # the geolinks of a memoized run are a day old at most
+    assert processor.memoized_run_ttl == 86400
+    assert not processor.bypasses_memoized_run(SimpleNamespace(force_rerun=False, refresh_geolinks=False))
+    assert processor.bypasses_memoized_run(SimpleNamespace(force_rerun=False, refresh_geolinks=True))
+    assert processor.bypasses_memoized_run(SimpleNamespace(force_rerun=True, refresh_geolinks=False))
+
+
+OEREBLEX_DOWNLOAD_PY = """import os
+with open(os.environ['RESULT_FILE_PATH'], mode='w') as fh:
+    fh.write('<geolinks host="{}"/>'.format(os.environ['OEREBLEX_HOST']))
+"""
+
+
+def test_oereblex_download_script_of_the_checkout(tmp_path, monkeypatch, processor_env):
+    monkeypatch.setenv('MGDM2OEREB_PATH', str(tmp_path / 'mgdm2oereb'))
+    (tmp_path / 'mgdm2oereb').mkdir()
+    (tmp_path / 'mgdm2oereb' / 'oereblex.download.py').write_text(OEREBLEX_DOWNLOAD_PY)
+    from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.processors import Mgdm2OerebTransformatorOereblex
+    processor = Mgdm2OerebTransformatorOereblex(OEREBLEX_PROCESSOR_DEF)
+    parameters = SimpleNamespace(
+        model_name='Planungszonen_V1_1',
+        theme_code='ch.Planungszonen',
+        target_basket_id=None,
+        oereblex_host='oereblex.example.ch',
+        dummy_office_name='Dummy',
+        dummy_office_url='https://dummy.ch'
+    )
+    job = processor.start_job()
+    job.files = processor.prepare_job_files(job, parameters)
+    job.files.input_xtf_file.save_runtime_file(b'<TRANSFER/>')
+    job.files.input_xtf_file.publish()
+
+    result = processor.task_handle_oereblex(parameters, job, {}, 'task_handle_oereblex')
+    assert result['task_handle_oereblex_status'] == JobStatus.successful.value
+    # the trafo reads the published result
+    with open(job.files.oereblex_trafo_result_file.result_path) as fh:
+        assert fh.read() == '<geolinks host="oereblex.example.ch"/>'
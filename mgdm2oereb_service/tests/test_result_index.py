@@ -0,0 +1,65 @@
+import datetime
+
+from mgdm2oereb_service.result_index import ResultIndex
+
+JOB_ID = '48baf201-3d21-49d1-af93-01ca709dfe49'
+
+
+def test_register_and_finish_job(tmp_path):
+    result_index = ResultIndex(str(tmp_path / 'index' / 'results.sqlite'))
+    result_index.register_job(JOB_ID, 'ch.Planungszonen', 'b1', datetime.datetime(2024, 1, 1))
+    result_index.register_file(JOB_ID, f'2024-01-01_000000.ch.Planungszonen.b1.{JOB_ID}.rss.xml')
+    result_index.register_file(JOB_ID, f'2024-01-01_000000.ch.Planungszonen.b1.{JOB_ID}.job.json')
+    assert result_index.get_job(JOB_ID)['finished'] is None
+    result_index.finish_job(JOB_ID, True)
+    job = result_index.get_job(JOB_ID)
+    assert job['finished'] is not None
+    assert job['successful'] == 1
+    assert result_index.get_files(JOB_ID) == [
+        f'2024-01-01_000000.ch.Planungszonen.b1.{JOB_ID}.job.json',
+        f'2024-01-01_000000.ch.Planungszonen.b1.{JOB_ID}.rss.xml'
+    ]
+    assert result_index.get_job('unknown') is None
+    assert result_index.get_files('unknown') == []
+
+
+def test_index_directory(tmp_path):
+    data_path = tmp_path / 'data'
+    data_path.mkdir()
+    (data_path / f'2024-01-01_000000.ch.Planungszonen.b.1.{JOB_ID}.job.json').write_text(
+        '{"theme_code": "ch.Planungszonen", "target_basket_id": "b.1", "successful": false}'
+    )
+    (data_path / f'2024-01-01_000000.ch.Planungszonen.b.1.{JOB_ID}.input.xtf').write_text('<TRANSFER/>')
+    (data_path / 'unrelated.txt').write_text('')
+    result_index = ResultIndex(str(tmp_path / 'results.sqlite'))
+    assert result_index.index_directory(str(data_path)) == 2
+    assert len(result_index.get_files(JOB_ID)) == 2
+    job = result_index.get_job(JOB_ID)
+    assert job['target_basket_id'] == 'b.1'
+    assert job['successful'] == 0
+    assert job['finished'] is not None
+
+
+def test_feed_items(tmp_path):
+    result_index = ResultIndex(str(tmp_path / 'results.sqlite'))
+    assert result_index.get_feed_state() == (0, 0, None)
+    for day in [1, 3, 2]:
+        result_index.add_feed_item(
+            f'job-{day}',
+            f'<item><link>mgdm2oereb_results/job-{day}/index.html</link></item>',
+            datetime.datetime(2024, 1, day, tzinfo=datetime.timezone.utc)
+        )
+    count, sequence, added = result_index.get_feed_state()
+    assert (count, sequence) == (3, 3)
+    # a job which started earlier but finished later still advances the state
+    result_index.add_feed_item(
+        'job-0',
+        '<item><link>mgdm2oereb_results/job-0/index.html</link></item>',
+        datetime.datetime(2023, 12, 31, tzinfo=datetime.timezone.utc)
+    )
+    assert result_index.get_feed_state()[2] >= added
+    assert added > datetime.datetime(2024, 1, 3, tzinfo=datetime.timezone.utc)
+    items = result_index.get_feed_items(2)
+    assert ['job-3' in items[0], 'job-2' in items[1]] == [True, True]
+    assert 'job-1' in result_index.get_feed_items(2, 2)[0]
+    assert 'job-0' in result_index.get_feed_items(2, 2)[1]
@@ -0,0 +1,145 @@
+import datetime
+import os
+import time
+
+import pytest
+from pygeoapi.util import JobStatus
+
+from mgdm2oereb_service.pygeoapi_plugins.process_manager.sqlite import SQLiteManager
+from mgdm2oereb_service.result_index import ResultIndex
+from mgdm2oereb_service.retention import RetentionPolicy, RetentionSweeper
+
+OLD_JOB_ID = '48baf201-3d21-49d1-af93-01ca709dfe49'
+NEW_JOB_ID = '9a0c5a3e-6d0b-4e7c-8f43-1d2b3c4d5e6f'
+WORKING_ID = 'f1e2d3c4-b5a6-4978-8695-a4b3c2d1e0f9'
+DAY = 24 * 3600
+NOW = time.time()
+
+
+@pytest.fixture(autouse=True)
+def job_queue(tmp_path, monkeypatch):
+    monkeypatch.setenv('MGDM2OEREB_QUEUE', str(tmp_path / 'queue.sqlite'))
+    monkeypatch.setenv('MGDM2OEREB_QUEUE_CONCURRENCY', '2')
+
+
+def write_file(path, size, age):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as fh:
+        fh.write(b'x' * size)
+    os.utime(path, (NOW - age, NOW - age))
+    return path
+
+
+def publish(result_index, data_path, job_id, age):
+    file_name = f'2024-01-01_000000.ch.Planungszonen.b1.{job_id}.output.xtf'
+    write_file(str(data_path / file_name), 100, age)
+    result_index.register_job(job_id, 'ch.Planungszonen', 'b1', datetime.datetime.fromtimestamp(NOW - age))
+    result_index.register_file(job_id, file_name)
+    result_index.finish_job(job_id, True, datetime.datetime.fromtimestamp(NOW - age))
+    result_index.add_feed_item(job_id, '<item/>', datetime.datetime.fromtimestamp(NOW - age).astimezone())
+    return data_path / file_name
+
+
+def create_sweeper(tmp_path, manager=None, **kwargs):
+    kwargs.setdefault('policies', {
+        'working': RetentionPolicy(max_age=DAY),
+        'results': RetentionPolicy(max_age=7 * DAY),
+        'outputs': RetentionPolicy(max_age=30 * DAY)
+    })
+    return RetentionSweeper(
+        str(tmp_path / 'job'),
+        str(tmp_path / 'data'),
+        ResultIndex(str(tmp_path / 'results.sqlite')),
+        manager,
+        **kwargs
+    )
+
+
+def test_sweep_working_dirs_and_results(tmp_path):
+    sweeper = create_sweeper(tmp_path)
+    job_dir = tmp_path / 'job'
+    old_working = write_file(str(job_dir / f'working_{OLD_JOB_ID}' / 'input.xtf'), 10, 2 * DAY)
+    os.utime(os.path.dirname(old_working), (NOW - 2 * DAY, NOW - 2 * DAY))
+    write_file(str(job_dir / f'working_{WORKING_ID}' / 'input.xtf'), 10, 60)
+    write_file(str(job_dir / 'cache' / 'entry'), 10, 100 * DAY)
+    old_result = publish(sweeper.result_index, tmp_path / 'data', OLD_JOB_ID, 20 * DAY)
+    new_result = publish(sweeper.result_index, tmp_path / 'data', NEW_JOB_ID, 10 * DAY)
+
+    stats = sweeper.sweep(now=NOW)
+
+    assert stats['working'] == {'removed': 1, 'kept': 1, 'freed_bytes': 10}
+    assert stats['results'] == {'removed': 1, 'kept': 1, 'freed_bytes': 100}
+    assert sorted(os.listdir(job_dir)) == ['cache', f'working_{WORKING_ID}']
+    assert not old_result.exists()
+    # the newest result of the basket is kept although it is too old
+    assert new_result.exists()
+    assert sweeper.result_index.get_job(OLD_JOB_ID) is None
+    assert sweeper.result_index.get_feed_state()[0] == 1
+
+
+def test_sweep_outputs(tmp_path):
+    manager = SQLiteManager({
+        'name': 'mgdm2oereb_service.pygeoapi_plugins.process_manager.sqlite.SQLiteManager',
+        'connection': str(tmp_path / 'jobs.sqlite'),
+        'output_dir': str(tmp_path / 'outputs')
+    })
+    for identifier, age, status in [
+        ('11111111-1111-4111-8111-111111111111', 40 * DAY, JobStatus.successful),
+        ('22222222-2222-4222-8222-222222222222', 35 * DAY, JobStatus.successful),
+        ('33333333-3333-4333-8333-333333333333', 40 * DAY, JobStatus.running)
+    ]:
+        location = write_file(str(tmp_path / 'outputs' / f'mgdm2oereb-{identifier}'), 10, age)
+        manager.add_job({
+            'identifier': identifier,
+            'process_id': 'mgdm2oereb',
+            'job_start_datetime': datetime.datetime.utcfromtimestamp(NOW - age).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            'status': status.value,
+            'location': location,
+            'theme_code': 'ch.Planungszonen',
+            'target_basket_id': 'b1'
+        })
+    orphan = write_file(str(tmp_path / 'outputs' / f'mgdm2oereb-{WORKING_ID}'), 10, 40 * DAY)
+    sweeper = create_sweeper(tmp_path, manager)
+
+    stats = sweeper.sweep(now=NOW)
+
+    assert stats['outputs'] == {'removed': 3, 'kept': 1, 'freed_bytes': 30}
+    assert [job['identifier'] for job in manager.query_jobs()] == ['22222222-2222-4222-8222-222222222222']
+    assert not os.path.exists(orphan)
+
+
+def test_sweep_quota_and_dry_run(tmp_path):
+    sweeper = create_sweeper(tmp_path, policies={}, quota=15, grace=60)
+    for index, age in enumerate([3 * 3600, 2 * 3600, 30]):
+        working_dir = tmp_path / 'job' / f'working_{index}{WORKING_ID[1:]}'
+        write_file(str(working_dir / 'input.xtf'), 10, age)
+        os.utime(str(working_dir), (NOW - age, NOW - age))
+
+    stats = sweeper.sweep(now=NOW, dry_run=True)
+    assert stats['working'] == {'removed': 2, 'kept': 1, 'freed_bytes': 20}
+    assert len(os.listdir(tmp_path / 'job')) == 3
+
+    # the oldest working dir is enough to fit the quota, the youngest is in its grace period anyways
+    sweeper.quota = 20
+    stats = sweeper.sweep_if_due(0)
+    assert stats['working'] == {'removed': 1, 'kept': 2, 'freed_bytes': 10}
+    assert not (tmp_path / 'job' / f'working_0{WORKING_ID[1:]}').exists()
+    assert sweeper.sweep_if_due(3600) is None
+
+
+def test_sweep_keeps_working_dirs_of_unfinished_jobs(tmp_path):
+    sweeper = create_sweeper(tmp_path, quota=5)
+    for job_id in [OLD_JOB_ID, NEW_JOB_ID]:
+        working_dir = tmp_path / 'job' / f'working_{job_id}'
+        write_file(str(working_dir / 'input.xtf'), 10, 2 * 3600)
+        os.utime(str(working_dir), (NOW - 2 * 3600, NOW - 2 * 3600))
+        sweeper.result_index.register_job(job_id, 'ch.Planungszonen', 'b1', datetime.datetime.now())
+    sweeper.result_index.finish_job(OLD_JOB_ID, True)
+
+    stats = sweeper.sweep(now=NOW)
+
+    assert stats['working'] == {'removed': 1, 'kept': 1, 'freed_bytes': 10}
+    assert os.listdir(tmp_path / 'job') == [f'working_{NEW_JOB_ID}']
+    # a job which died before it finished does not keep its working dir forever
+    stats = sweeper.sweep(now=NOW + 2 * DAY)
+    assert stats['working'] == {'removed': 1, 'kept': 0, 'freed_bytes': 10}
@@ -0,0 +1,95 @@
+import datetime
+import os
+from types import SimpleNamespace
+
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb import JobContext, JobFile
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.disk_cache import DiskCache
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.processors import Mgdm2OerebTransformator
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.run_cache import OUTPUT_LOG_FILE_NAME, RunCache, \
+    TRAFO_RESULT_FILE_NAME, directory_revision, get_directory_revision
+
+
+def write(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_fingerprint_covers_inputs_and_parameters(tmp_path):
+    xtf = write(tmp_path / 'input.xtf', b'<TRANSFER/>')
+    catalog = write(tmp_path / 'catalog.xml', b'<catalog/>')
+    parts = {'model_name': 'Planungszonen_V1_1', 'target_basket_id': 'b1'}
+    fingerprint = RunCache.create_fingerprint(xtf, catalog, parts)
+    assert fingerprint == RunCache.create_fingerprint(xtf, catalog, dict(parts))
+    assert fingerprint != RunCache.create_fingerprint(xtf, catalog, dict(parts, target_basket_id='b2'))
+    write(tmp_path / 'catalog.xml', b'<catalog version="2"/>')
+    assert fingerprint != RunCache.create_fingerprint(xtf, catalog, parts)
+
+
+def test_directory_revision_changes_with_files(tmp_path):
+    xsl_dir = tmp_path / 'xsl'
+    xsl_dir.mkdir()
+    write(xsl_dir / 'Model.trafo.xsl', b'<xsl/>')
+    revision = directory_revision(str(xsl_dir))
+    assert revision == directory_revision(str(xsl_dir))
+    write(xsl_dir / 'Other.trafo.xsl', b'<xsl/>')
+    assert revision != directory_revision(str(xsl_dir))
+
+
+def test_directory_revision_once_per_process(tmp_path):
+    xsl_dir = tmp_path / 'xsl'
+    xsl_dir.mkdir()
+    write(xsl_dir / 'Model.trafo.xsl', b'<xsl/>')
+    revision = get_directory_revision(str(xsl_dir))
+    write(xsl_dir / 'Other.trafo.xsl', b'<xsl/>')
+    assert get_directory_revision(str(xsl_dir)) == revision
+
+
+def test_run_cache_put_get_and_ttl(tmp_path):
+    run_cache = RunCache(DiskCache(str(tmp_path / 'cache')), ttl=600)
+    trafo_result = write(tmp_path / 'result.xtf', b'<TRANSFER/>')
+    output_log = write(tmp_path / 'output.ili.log', b'...validation done')
+    assert run_cache.get('fingerprint') is None
+    run_cache.put('fingerprint', trafo_result, output_log, {'job_id': 'job'})
+    entry = run_cache.get('fingerprint')
+    assert entry.meta['job_id'] == 'job'
+    assert open(entry.file_path(TRAFO_RESULT_FILE_NAME), mode='rb').read() == b'<TRANSFER/>'
+    assert os.path.exists(entry.file_path(OUTPUT_LOG_FILE_NAME))
+    # a shorter TTL of the caller wins, a longer one does not extend the TTL of the cache
+    assert run_cache.get('fingerprint', 0) is None
+    assert run_cache.get('fingerprint', 6000) is not None
+    run_cache.ttl = 0
+    assert run_cache.get('fingerprint', 6000) is None
+    assert run_cache.get('fingerprint') is None
+
+
+def test_link_memoized_run(tmp_path):
+    run_cache = RunCache(DiskCache(str(tmp_path / 'cache')))
+    run_cache.put(
+        'fingerprint',
+        write(tmp_path / 'result.xtf', b'<TRANSFER/>'),
+        write(tmp_path / 'output.ili.log', b'...validation done')
+    )
+    job_path = tmp_path / 'job'
+    job_path.mkdir()
+
+    def create_job():
+        job = JobContext('job', datetime.datetime.now(), str(job_path))
+        job.files = SimpleNamespace(**{
+            name: JobFile(name, 'job', str(job_path), str(tmp_path), 'theme', job.timestamp, None)
+            for name in ['trafo_result_file', 'output_log_file']
+        })
+        return job
+
+    job = create_job()
+    assert Mgdm2OerebTransformator.link_memoized_run(job, run_cache.get('fingerprint'))
+    assert open(job.files.trafo_result_file.runtime_path, mode='rb').read() == b'<TRANSFER/>'
+
+    # an entry evicted after the lookup is a miss, nothing of it is left in the job
+    for path in os.listdir(job_path):
+        os.remove(job_path / path)
+    memoized_run = run_cache.get('fingerprint')
+    os.remove(memoized_run.file_path(OUTPUT_LOG_FILE_NAME))
+    job = create_job()
+    assert not Mgdm2OerebTransformator.link_memoized_run(job, memoized_run)
+    assert os.listdir(job_path) == []
+    assert job.files.trafo_result_file.runtime_path is None
@@ -0,0 +1,104 @@
+import json
+
+import pytest
+from pygeoapi.util import JobStatus
+
+from mgdm2oereb_service.job_queue import QueueTimeout
+from mgdm2oereb_service.pygeoapi_plugins.process_manager.sqlite import SQLiteManager
+
+
+class FakeProcessor(object):
+    metadata = {'id': 'mgdm2oereb'}
+
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    def execute(self, data):
+        return 'application/json', self.outputs
+
+
+@pytest.fixture(autouse=True)
+def job_queue(tmp_path, monkeypatch):
+    monkeypatch.setenv('MGDM2OEREB_QUEUE', str(tmp_path / 'queue.sqlite'))
+    monkeypatch.setenv('MGDM2OEREB_QUEUE_CONCURRENCY', '2')
+
+
+def create_manager(tmp_path):
+    return SQLiteManager({
+        'name': 'mgdm2oereb_service.pygeoapi_plugins.process_manager.sqlite.SQLiteManager',
+        'connection': str(tmp_path / 'jobs.sqlite'),
+        'output_dir': str(tmp_path)
+    })
+
+
+def test_job_lifecycle(tmp_path):
+    manager = create_manager(tmp_path)
+    manager.add_job({
+        'identifier': 'job-1',
+        'process_id': 'mgdm2oereb',
+        'job_start_datetime': '2024-01-01T00:00:00.000000Z',
+        'status': JobStatus.running.value,
+        'parameters': {'theme_code': 'ch.Planungszonen'}
+    })
+    manager.add_job({
+        'identifier': 'job-2',
+        'process_id': 'mgdm2oereb',
+        'job_start_datetime': '2024-01-02T00:00:00.000000Z',
+        'status': JobStatus.successful.value
+    })
+    assert manager.update_job('job-1', {'status': JobStatus.failed.value, 'progress': 100})
+    assert not manager.update_job('unknown', {'progress': 100})
+    job = manager.get_job('job-1')
+    assert job['status'] == JobStatus.failed.value
+    assert job['parameters'] == {'theme_code': 'ch.Planungszonen'}
+    assert [job['identifier'] for job in manager.get_jobs()] == ['job-2', 'job-1']
+    assert [job['identifier'] for job in manager.get_jobs(JobStatus.failed)] == ['job-1']
+    assert manager.delete_job('job-1')
+    assert manager.get_job('job-1') is None
+
+
+def test_execute_handler_sync(tmp_path):
+    manager = create_manager(tmp_path)
+    outputs = {'status': JobStatus.failed.value, 'msg': 'Validation of input file failed.'}
+    mimetype, result, status = manager._execute_handler_sync(FakeProcessor(outputs), 'job-1', {})
+    assert status == JobStatus.failed
+    job = manager.get_job('job-1')
+    assert job['message'] == 'Validation of input file failed.'
+    assert job['progress'] == 100
+    assert job['links'] == {}
+    assert job['queue_lane'] == 'interactive'
+    assert job['queue_wait'] >= 0
+    mimetype, content = manager.get_job_result('job-1')
+    assert json.loads(content) == outputs
+
+
+def test_execute_handler_sync_max_wait(tmp_path, monkeypatch):
+    monkeypatch.setenv('MGDM2OEREB_QUEUE_CONCURRENCY', '1')
+    monkeypatch.setenv('MGDM2OEREB_QUEUE_MAX_WAIT', '0.1')
+    manager = create_manager(tmp_path)
+    manager.job_queue.enqueue('running', 'interactive')
+    assert manager.job_queue.try_acquire('running') is not None
+    with pytest.raises(QueueTimeout):
+        manager._execute_handler_sync(FakeProcessor({}), 'job-1', {})
+    job = manager.get_job('job-1')
+    assert job['status'] == JobStatus.failed.value
+    assert job['queue_wait'] >= 0.1
+    # the job left the queue
+    assert manager.job_queue.stats()['queued'] == 0
+
+
+def test_query_jobs(tmp_path):
+    manager = create_manager(tmp_path)
+    for i in range(5):
+        manager.add_job({
+            'identifier': f'job-{i}',
+            'process_id': 'mgdm2oereb-oereblex' if i % 2 else 'mgdm2oereb',
+            'job_start_datetime': f'2024-01-0{i + 1}T00:00:00.000000Z',
+            'status': JobStatus.successful.value,
+            'target_basket_id': f'b{i % 2}'
+        })
+    jobs = manager.query_jobs(process_id='mgdm2oereb', limit=2)
+    assert [job['identifier'] for job in jobs] == ['job-4', 'job-2']
+    jobs = manager.query_jobs(target_basket_id='b1', start='2024-01-03T00:00:00.000000Z')
+    assert [job['identifier'] for job in jobs] == ['job-3']
+    assert [job['identifier'] for job in manager.query_jobs(limit=2, offset=3)] == ['job-1', 'job-0']
@@ -0,0 +1,68 @@
+import threading
+
+from pygeoapi.util import JobStatus
+
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.processors import Task, TaskOrder
+
+
+def make_task(name, output, depends_on=None, started=None, wait_for=None):
+    def handler(parameters, job_files, result, task_name):
+        if started is not None:
+            started.set()
+        if wait_for is not None:
+            assert wait_for.wait(5)
+        return dict(output, **{'{}_input'.format(task_name): sorted(result)})
+    handler.__name__ = name
+    return Task(handler, depends_on or [])
+
+
+def test_task_order_passes_dependency_results():
+    task_order = TaskOrder(tasks=[
+        make_task('a', {'a': 1}),
+        make_task('b', {'b': 1}),
+        make_task('c', {'c': 1}, ['a']),
+        make_task('d', {'d': 1}, ['c'])
+    ])
+    result = task_order.execute(None, None, {'start': 1}, max_workers=2)
+    assert result['b_input'] == ['start']
+    assert result['c_input'] == ['a', 'a_input', 'start']
+    assert result['d_input'] == ['a', 'a_input', 'c', 'c_input', 'start']
+
+
+def test_task_order_runs_independent_tasks_concurrently():
+    a_started = threading.Event()
+    task_order = TaskOrder(tasks=[
+        make_task('a', {'a': 1}, started=a_started),
+        make_task('b', {'b': 1}, wait_for=a_started)
+    ])
+    result = task_order.execute(None, None, {}, max_workers=2)
+    assert result['a'] == result['b'] == 1
+
+
+def test_task_order_stops_at_first_failure():
+    failed = {'status': JobStatus.failed.value, 'msg': 'broken', 'task': 'b'}
+    task_order = TaskOrder(tasks=[
+        make_task('a', {'a': 1}),
+        make_task('b', failed, ['a']),
+        make_task('c', {'c': 1}, ['b']),
+        make_task('d', {'d': 1}, ['a'])
+    ])
+    result = task_order.execute(None, None, {}, max_workers=1)
+    assert result['status'] == JobStatus.failed.value
+    assert 'c' not in result
+    assert 'd' not in result
+    assert list(result['task_durations']) == ['a', 'b']
+
+
+def test_task_order_reports_task_durations():
+    done = []
+    task_order = TaskOrder(tasks=[
+        make_task('a', {'a': 1}),
+        make_task('b', {'b': 1}, ['a'])
+    ])
+    result = task_order.execute(
+        None, None, {}, max_workers=2,
+        on_task_done=lambda name, duration, task_result: done.append((name, duration >= 0, task_result[name]))
+    )
+    assert done == [('a', True, 1), ('b', True, 1)]
+    assert set(result['task_durations']) == {'a', 'b'}
@@ -0,0 +1,40 @@
+import datetime
+
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb import JobFile, Mgdm2OerebTransformatorBase, ValidationResult
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.disk_cache import DiskCache
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.validation_cache import ValidationCache
+
+SERVICE_URL = 'http://ilivalidator-service:8080/rest/jobs'
+
+
+def test_validation_cache_key_depends_on_content_and_flags(tmp_path):
+    first = tmp_path / 'first.xtf'
+    first.write_bytes(b'<TRANSFER>1</TRANSFER>')
+    same = tmp_path / 'same.xtf'
+    same.write_bytes(b'<TRANSFER>1</TRANSFER>')
+    other = tmp_path / 'other.xtf'
+    other.write_bytes(b'<TRANSFER>2</TRANSFER>')
+    key = ValidationCache.create_key(str(first), SERVICE_URL, True)
+    assert key == ValidationCache.create_key(str(same), SERVICE_URL, True)
+    assert key != ValidationCache.create_key(str(other), SERVICE_URL, True)
+    assert key != ValidationCache.create_key(str(first), SERVICE_URL, False)
+
+
+def test_validation_cache_get_and_ttl(tmp_path):
+    validation_cache = ValidationCache(DiskCache(str(tmp_path / 'cache')), ttl=600)
+    assert validation_cache.get('key') is None
+    log_path = validation_cache.put('key', b'...validation failed', True)
+    assert validation_cache.get('key') == (log_path, True)
+    assert open(log_path, mode='rb').read() == b'...validation failed'
+    validation_cache.ttl = 0
+    assert validation_cache.get('key') is None
+
+
+def test_evicted_validation_log_is_written_from_memory(tmp_path):
+    validation_cache = ValidationCache(DiskCache(str(tmp_path / 'cache')))
+    log_path = validation_cache.put('key', b'Info: ...validation done', False)
+    validation_result = ValidationResult(False, b'Info: ...validation done', 0.0, log_path=log_path)
+    validation_cache.cache.delete('key')
+    job_file = JobFile('output.ili.log', 'job', str(tmp_path), str(tmp_path), 'theme', datetime.datetime.now(), None)
+    Mgdm2OerebTransformatorBase.save_validation_log(job_file, validation_result)
+    assert open(job_file.runtime_path, mode='rb').read() == b'Info: ...validation done'
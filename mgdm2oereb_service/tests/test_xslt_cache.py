@@ -0,0 +1,114 @@
+import os
+import threading
+
+from lxml import etree as ET
+
+from mgdm2oereb_service.pygeoapi_plugins.process.mgdm2oereb.xslt_cache import XsltCache
+
+XSL = """<?xml version="1.0"?>
+<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+    {}<xsl:template match="/"><result>{}</result></xsl:template>
+</xsl:stylesheet>
+"""
+HELPER_XSL = """<?xml version="1.0"?>
+<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+    <xsl:template name="helper">{}</xsl:template>
+</xsl:stylesheet>
+"""
+
+
+def write_xsl(path, text, include=''):
+    with open(path, mode="w") as fh:
+        fh.write(XSL.format(include, text))
+
+
+def touch(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+
+
+def checkout(cache, path):
+    with cache.checkout(path) as transform:
+        return transform
+
+
+def test_compiled_xslt_is_reused(tmp_path):
+    xsl_path = str(tmp_path / 'Model.trafo.xsl')
+    write_xsl(xsl_path, 'a')
+    cache = XsltCache()
+    assert checkout(cache, xsl_path) is checkout(cache, xsl_path)
+    assert len(cache) == 1
+
+
+def test_changed_stylesheet_is_recompiled(tmp_path):
+    xsl_path = str(tmp_path / 'Model.trafo.xsl')
+    write_xsl(xsl_path, 'a')
+    cache = XsltCache()
+    first = checkout(cache, xsl_path)
+    write_xsl(xsl_path, 'b')
+    touch(xsl_path)
+    second = checkout(cache, xsl_path)
+    assert first is not second
+    assert len(cache) == 1
+
+
+def test_changed_include_is_recompiled(tmp_path):
+    os.mkdir(tmp_path / 'lib')
+    helper_path = str(tmp_path / 'lib' / 'helper.xsl')
+    with open(helper_path, mode="w") as fh:
+        fh.write(HELPER_XSL.format('a'))
+    xsl_path = str(tmp_path / 'Model.trafo.xsl')
+    write_xsl(xsl_path, '<xsl:call-template name="helper"/>', '<xsl:include href="lib/helper.xsl"/>')
+    cache = XsltCache()
+    first = checkout(cache, xsl_path)
+    assert checkout(cache, xsl_path) is first
+    with open(helper_path, mode="w") as fh:
+        fh.write(HELPER_XSL.format('b'))
+    touch(helper_path)
+    with cache.checkout(xsl_path) as transform:
+        assert transform is not first
+        assert str(transform(ET.XML('<a/>'))).strip().endswith('<result>b</result>')
+
+
+def test_concurrent_checkouts_get_their_own_xslt(tmp_path):
+    xsl_path = str(tmp_path / 'Model.trafo.xsl')
+    write_xsl(xsl_path, 'a')
+    cache = XsltCache()
+    both_checked_out = threading.Barrier(2, timeout=5)
+    transforms = []
+
+    def use():
+        with cache.checkout(xsl_path) as transform:
+            transforms.append(transform)
+            both_checked_out.wait()
+
+    threads = [threading.Thread(target=use) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert transforms[0] is not transforms[1]
+    # both are kept for later use
+    assert checkout(cache, xsl_path) in transforms
+
+
+def test_least_recently_used_is_evicted(tmp_path):
+    cache = XsltCache(max_size=2)
+    paths = []
+    for name in ['A', 'B', 'C']:
+        path = str(tmp_path / '{}.trafo.xsl'.format(name))
+        write_xsl(path, name)
+        paths.append(path)
+    first = checkout(cache, paths[0])
+    checkout(cache, paths[1])
+    checkout(cache, paths[2])
+    assert len(cache) == 2
+    assert checkout(cache, paths[0]) is not first
+
+
+def test_prewarm(tmp_path):
+    write_xsl(str(tmp_path / 'A.trafo.xsl'), 'a')
+    write_xsl(str(tmp_path / 'A.oereblex.geolink_list.xsl'), 'a')
+    write_xsl(str(tmp_path / 'helper.xsl'), 'a')
+    cache = XsltCache()
+    assert cache.prewarm(str(tmp_path)) == 1